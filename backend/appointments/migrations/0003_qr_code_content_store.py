@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:05
+
+import document_scanner.services.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appointments', '0002_alter_appointment_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='appointment',
+            name='qr_code',
+            field=models.ImageField(blank=True, null=True, storage=document_scanner.services.storage.get_content_store, upload_to='qr_codes/'),
+        ),
+    ]
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 
+from document_scanner.services.storage import get_content_store
+
 User = get_user_model()
 
 
@@ -49,7 +51,7 @@ class Appointment(models.Model):
 
     purpose_of_visit = models.TextField(max_length=1000, blank=True)
 
-    qr_code = models.ImageField(upload_to='qr_codes/', null=True, blank=True)
+    qr_code = models.ImageField(upload_to='qr_codes/', storage=get_content_store, null=True, blank=True)
 
     submitted_at = models.DateTimeField(auto_now_add=True)
 
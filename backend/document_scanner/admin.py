@@ -1,12 +1,18 @@
 """
 admin.py for document_scanner app
-Registers UploadedDocument model in Django admin.
+Registers UploadedDocument and CitizenshipCard models in Django admin.
 """
 from django.contrib import admin
-from .models import UploadedDocument
+from .models import CitizenshipCard, UploadedDocument
 
 @admin.register(UploadedDocument)
 class UploadedDocumentAdmin(admin.ModelAdmin):
-    list_display = ('id', 'user', 'document_type', 'created_at')
-    search_fields = ('user__username', 'document_type')
-    list_filter = ('document_type', 'created_at')
+    list_display = ('id', 'user', 'document_type', 'status', 'created_at')
+    search_fields = ('user__username', 'document_type', 'citizenship_number', 'passport_number')
+    list_filter = ('document_type', 'status', 'created_at')
+
+@admin.register(CitizenshipCard)
+class CitizenshipCardAdmin(admin.ModelAdmin):
+    list_display = ('id', 'user', 'citizenship_number', 'name', 'district', 'created_at')
+    search_fields = ('citizenship_number', 'name')
+    list_filter = ('district', 'created_at')
@@ -0,0 +1,18 @@
+from django.apps import AppConfig
+from django.conf import settings
+
+
+class DocumentScannerConfig(AppConfig):
+    name = 'document_scanner'
+
+    def ready(self):
+        # Reference counts of the shared content-addressed media store follow every field stored in it
+        from .services.storage import track_blob_references
+        track_blob_references()
+
+        # Loading the EasyOCR model costs seconds and hundreds of MB, so it is
+        # opt-in: only processes that serve scans should set OCR_WARM_ON_STARTUP.
+        if getattr(settings, 'OCR_WARM_ON_STARTUP', False):
+            import threading
+            from .services.ocr import warm_up_reader
+            threading.Thread(target=warm_up_reader, name='ocr-warm-up', daemon=True).start()
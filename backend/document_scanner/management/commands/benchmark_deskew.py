@@ -0,0 +1,57 @@
+import statistics
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from document_scanner.services import ocr
+from .benchmark_preprocess import render_synthetic
+
+
+def legacy_skew_angle(binary):
+    """The previous estimator: minAreaRect over every non-zero pixel of the full-resolution image."""
+    coords = np.column_stack(np.where(binary > 0))
+    angle = cv2.minAreaRect(coords)[-1]
+    return -(90 + angle) if angle < -45 else -angle
+
+
+def measure(func, image, repeat):
+    """Median wall time (ms) and peak traced allocation (MB) of func(image)."""
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(image)
+        timings.append(time.perf_counter() - started)
+    tracemalloc.start()
+    func(image)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, statistics.median(timings) * 1000, peak / (1024 * 1024)
+
+
+class Command(BaseCommand):
+    help = 'Compare time and peak memory of the legacy and projection-profile skew estimators'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--megapixels', type=float, nargs='*', default=[2, 8, 12])
+        parser.add_argument('--angle', type=float, default=4.0, help='Skew applied to the synthetic pages')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        repeat = max(1, options['repeat'])
+        for mp in options['megapixels']:
+            page, _ = render_synthetic(mp, 0)
+            h, w = page.shape
+            M = cv2.getRotationMatrix2D((w // 2, h // 2), options['angle'], 1.0)
+            skewed = cv2.warpAffine(page, M, (w, h), borderMode=cv2.BORDER_REPLICATE)
+            _, binary = cv2.threshold(skewed, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+
+            legacy_angle, legacy_ms, legacy_mb = measure(legacy_skew_angle, binary, repeat)
+            angle, new_ms, new_mb = measure(ocr.estimate_skew, binary, repeat)
+            self.stdout.write(
+                f'{mp:g}MP ({w}x{h}), true correction {-options["angle"]:+.1f}deg: '
+                f'legacy {legacy_angle:+.1f}deg {legacy_ms:.0f}ms {legacy_mb:.0f}MB | '
+                f'profile {angle:+.1f}deg {new_ms:.0f}ms {new_mb:.1f}MB'
+            )
@@ -0,0 +1,79 @@
+import random
+import re
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from document_scanner.services import fields
+
+EXTRACTORS = {
+    'citizenship': fields.CITIZENSHIP_FIELDS,
+    'driving_license': fields.DRIVING_LICENSE_FIELDS,
+    'citizenship_basic': fields.CITIZENSHIP_BASIC_FIELDS,
+    'passport_basic': fields.PASSPORT_BASIC_FIELDS,
+    'nid': fields.NID_FIELDS,
+    'birth_certificate': fields.BIRTH_CERTIFICATE_FIELDS,
+}
+
+FILLER = [
+    'GOVERNMENT OF NEPAL', 'नेपाल सरकार', 'Ministry of Home Affairs', 'गृह मन्त्रालय',
+    'Ward No 5', 'Signature', 'हस्ताक्षर', 'Photo', '|||', 'l1I', '0O0', 'Seal',
+]
+VALUES = ['Ram Bahadur Thapa', 'राम बहादुर थापा', '२०४५-०१-१२', '1990-01-12', '27-01-75-01234', 'KATHMANDU', 'B', 'Male', 'PA1234567']
+
+
+def legacy_extract(extractor, text):
+    """What the parsers did before: build each pattern string and re.search it, per field, per request."""
+    data = {}
+    for field, patterns in extractor.spec.items():
+        data[field] = None
+        for label, value in patterns:
+            m = re.search(f"{label}{fields.SEPARATOR}({value})", text, extractor.flags)
+            if m:
+                data[field] = m.group(1).strip()
+                break
+    return data
+
+
+def synthetic_document(extractor, rng, lines):
+    """Noisy OCR-like text: filler lines with the extractor's labels (any of its alternatives) scattered in."""
+    out = []
+    for _ in range(lines):
+        if rng.random() < 0.3:
+            field_patterns = rng.choice(list(extractor.spec.values()))
+            label = rng.choice(field_patterns)[0]
+            out.append(f'{label}{rng.choice([": ", " ", ":"])}{rng.choice(VALUES)}')
+        else:
+            out.append(' '.join(rng.choice(FILLER) for _ in range(rng.randint(1, 4))))
+    return '\n'.join(out)
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the precompiled field extractors against building and searching each pattern per request'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--docs', type=int, default=5000, help='Synthetic documents per extractor')
+        parser.add_argument('--lines', type=int, default=40, help='Lines per synthetic document')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        for name, extractor in EXTRACTORS.items():
+            rng = random.Random(options['seed'])
+            corpus = [synthetic_document(extractor, rng, options['lines']) for _ in range(options['docs'])]
+            re.purge()
+
+            started = time.perf_counter()
+            legacy = [legacy_extract(extractor, text) for text in corpus]
+            legacy_s = time.perf_counter() - started
+
+            started = time.perf_counter()
+            compiled = [extractor.extract(text) for text in corpus]
+            compiled_s = time.perf_counter() - started
+
+            mismatches = sum(1 for a, b in zip(legacy, compiled) if a != b)
+            if mismatches:
+                raise CommandError(f'{name}: {mismatches} documents extracted differently')
+            self.stdout.write(
+                f'{name}: per-request patterns {len(corpus) / legacy_s:,.0f} docs/s, '
+                f'precompiled {len(corpus) / compiled_s:,.0f} docs/s ({legacy_s / compiled_s:.1f}x), outputs identical'
+            )
@@ -0,0 +1,119 @@
+import json
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from document_scanner.services import extractors, parsers
+from document_scanner.services.fields import DEVANAGARI_DIGITS, normalise_date
+from document_scanner.services.synthetic import GENERATORS, generate_corpus
+
+# name -> (parser, synthetic document type, {parser output field: ground truth field})
+PARSERS = {
+    'parse_citizenship': (parsers.parse_citizenship, 'citizenship', {
+        'full_name': 'name', 'dob': 'date_of_birth', 'citizenship_number': 'citizenship_number', 'district': 'district',
+    }),
+    'parse_passport': (parsers.parse_passport, 'passport', {
+        field: field for field in (
+            'passport_number', 'surname', 'given_names', 'nationality', 'date_of_birth', 'date_of_issue',
+            'date_of_expiry', 'sex', 'place_of_birth', 'issuing_authority', 'country_code',
+        )
+    }),
+    'parse_driving_license': (parsers.parse_driving_license, 'driving_license', {
+        field: field for field in (
+            'license_number', 'full_name', 'date_of_birth', 'license_class', 'issued_date',
+            'validity_date', 'issuing_authority', 'gender', 'address',
+        )
+    }),
+    'extract_citizenship_data': (extractors.extract_citizenship_data, 'citizenship', {
+        'name': 'name', 'date_of_birth': 'date_of_birth', 'citizenship_number': 'citizenship_number',
+    }),
+    'extract_passport_data': (extractors.extract_passport_data, 'passport', {
+        'passport_number': 'passport_number', 'nationality': 'nationality', 'expiry_date': 'date_of_expiry',
+    }),
+    'extract_nid_data': (extractors.extract_nid_data, 'nid', {
+        'nid_number': 'nid_number', 'name': 'name', 'date_of_birth': 'date_of_birth',
+    }),
+    'extract_birth_certificate_data': (extractors.extract_birth_certificate_data, 'birth_certificate', {
+        'registration_number': 'registration_number', 'name': 'name', 'date_of_birth': 'date_of_birth',
+    }),
+}
+
+
+def canonical(value):
+    """Comparable form of a field value: ASCII digits, collapsed whitespace, upper case, ISO dates."""
+    if value is None:
+        return None
+    value = ' '.join(str(value).translate(DEVANAGARI_DIGITS).split()).upper()
+    return normalise_date(value) or value
+
+
+class Command(BaseCommand):
+    help = 'Measure throughput, latency and field accuracy of the text parsers on a synthetic OCR corpus'
+
+    def add_arguments(self, parser):
+        parser.add_argument('parsers', nargs='*', help=f'Parsers to run (default: all of {", ".join(PARSERS)})')
+        parser.add_argument('--docs', type=int, default=2000, help='Synthetic documents per parser')
+        parser.add_argument('--noise', type=float, default=0.2, help='OCR noise level, 0 for clean text')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file')
+
+    def handle(self, *args, **options):
+        names = options['parsers'] or list(PARSERS)
+        unknown = [name for name in names if name not in PARSERS]
+        if unknown:
+            raise CommandError(f'Unknown parser(s): {", ".join(unknown)}')
+
+        corpora = {}
+        results = []
+        for name in names:
+            parse, document_type, field_map = PARSERS[name]
+            if document_type not in corpora:
+                corpora[document_type] = generate_corpus(document_type, options['docs'], options['seed'], options['noise'])
+            corpus = corpora[document_type]
+
+            timings = []
+            correct = {field: 0 for field in field_map}
+            expected = {field: 0 for field in field_map}
+            for text, truth in corpus:
+                started = time.perf_counter()
+                output = parse(text)
+                timings.append(time.perf_counter() - started)
+                for field, truth_field in field_map.items():
+                    if truth.get(truth_field) is None:
+                        continue
+                    expected[field] += 1
+                    if canonical(output.get(field)) == canonical(truth[truth_field]):
+                        correct[field] += 1
+
+            total = sum(timings)
+            timings.sort()
+            row = {
+                'parser': name,
+                'document_type': document_type,
+                'docs': len(corpus),
+                'docs_per_second': round(len(corpus) / total) if total else None,
+                'p50_us': round(statistics.median(timings) * 1e6, 1),
+                'p99_us': round(timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e6, 1),
+                'accuracy': round(sum(correct.values()) / max(1, sum(expected.values())), 4),
+                'field_accuracy': {
+                    field: round(correct[field] / expected[field], 4) for field in field_map if expected[field]
+                },
+            }
+            results.append(row)
+            self.stdout.write(
+                f"{name}: {row['docs_per_second']:,} docs/s, p50 {row['p50_us']}us, p99 {row['p99_us']}us, "
+                f"accuracy {row['accuracy']:.1%}"
+            )
+            weakest = sorted(row['field_accuracy'].items(), key=lambda item: item[1])[:3]
+            self.stdout.write('  weakest fields: ' + ', '.join(f'{field} {acc:.1%}' for field, acc in weakest))
+
+        if options['json_path']:
+            report = {
+                'options': {key: options[key] for key in ('docs', 'noise', 'seed')},
+                'generators': sorted(GENERATORS),
+                'results': results,
+            }
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['json_path']}"))
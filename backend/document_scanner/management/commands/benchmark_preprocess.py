@@ -0,0 +1,105 @@
+import difflib
+import json
+import statistics
+import time
+from pathlib import Path
+
+import cv2
+import numpy as np
+from django.core.management.base import BaseCommand, CommandError
+
+from document_scanner.services import ocr
+
+SYNTHETIC_LINES = [
+    'GOVERNMENT OF NEPAL',
+    'CITIZENSHIP CERTIFICATE',
+    'Citizenship No: 27-01-75-01234',
+    'Name: RAM BAHADUR THAPA',
+    'Date of Birth: 1985-04-12',
+    'District: KATHMANDU',
+]
+
+
+def render_synthetic(megapixels, noise_sigma, seed=0):
+    """Render known text onto a page of the given size and add Gaussian noise. Returns (image, text)."""
+    height = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    width = int(height * 4 / 3)
+    page = np.full((height, width), 235, dtype=np.uint8)
+    font_scale = width / 1000
+    thickness = max(1, int(font_scale * 2))
+    line_height = int(height / (len(SYNTHETIC_LINES) + 2))
+    for i, line in enumerate(SYNTHETIC_LINES):
+        cv2.putText(page, line, (int(width * 0.05), line_height * (i + 1)), cv2.FONT_HERSHEY_SIMPLEX, font_scale, 20, thickness)
+    if noise_sigma:
+        rng = np.random.default_rng(seed)
+        page = np.clip(page + rng.normal(0, noise_sigma, page.shape), 0, 255).astype(np.uint8)
+    return page, '\n'.join(SYNTHETIC_LINES)
+
+
+def similarity(a, b):
+    return difflib.SequenceMatcher(None, a.upper().split(), b.upper().split()).ratio()
+
+
+class Command(BaseCommand):
+    help = 'Compare latency (and OCR accuracy when EasyOCR is installed) of the fixed and adaptive preprocessing pipelines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('images', nargs='*', help='Image files to benchmark; a sibling .txt file is used as ground truth')
+        parser.add_argument('--megapixels', type=float, nargs='*', default=[2, 8, 12], help='Sizes of synthetic pages to render')
+        parser.add_argument('--noise', type=float, nargs='*', default=[0, 8, 20], help='Noise sigmas for synthetic pages')
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per image and mode')
+        parser.add_argument('--no-ocr', action='store_true', help='Only time preprocessing, skip the accuracy check')
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file')
+
+    def handle(self, *args, **options):
+        cases = []
+        for path in options['images']:
+            # Full size: the fixed pipeline is the full-resolution reference
+            image = ocr.load_image(path, long_side=None)
+            truth_path = Path(path).with_suffix('.txt')
+            truth = truth_path.read_text(encoding='utf-8') if truth_path.exists() else None
+            cases.append((Path(path).name, image, truth))
+        if not options['images']:
+            for mp in options['megapixels']:
+                for sigma in options['noise']:
+                    image, truth = render_synthetic(mp, sigma)
+                    cases.append((f'synthetic {mp:g}MP noise={sigma:g}', image, truth))
+        if not cases:
+            raise CommandError('Nothing to benchmark.')
+
+        run_ocr = ocr.EASYOCR_AVAILABLE and not options['no_ocr']
+        if not run_ocr:
+            self.stdout.write('Skipping OCR accuracy (EasyOCR unavailable or --no-ocr).')
+
+        results = []
+        for name, image, truth in cases:
+            row = {'case': name, 'height': image.shape[0], 'width': image.shape[1]}
+            texts = {}
+            for mode in ocr.PREPROCESS_MODES:
+                timings = []
+                for _ in range(max(1, options['repeat'])):
+                    started = time.perf_counter()
+                    processed = ocr.preprocess_image(image, mode=mode)
+                    timings.append(time.perf_counter() - started)
+                row[f'{mode}_ms'] = round(statistics.median(timings) * 1000, 1)
+                row[f'{mode}_output'] = f'{processed.shape[1]}x{processed.shape[0]}'
+                if run_ocr:
+                    texts[mode] = ocr._result_text(ocr.get_reader().readtext(processed))
+            if run_ocr:
+                for mode, text in texts.items():
+                    # Without ground truth, report agreement with the original pipeline instead
+                    reference = truth if truth is not None else texts['fixed']
+                    row[f'{mode}_accuracy'] = round(similarity(text, reference), 3)
+                row['accuracy_reference'] = 'ground truth' if truth is not None else 'fixed pipeline'
+            row['speedup'] = round(row['fixed_ms'] / row['adaptive_ms'], 2) if row['adaptive_ms'] else None
+            results.append(row)
+
+            line = f"{name}: fixed {row['fixed_ms']}ms, adaptive {row['adaptive_ms']}ms ({row['speedup']}x)"
+            if run_ocr:
+                line += f", accuracy fixed {row['fixed_accuracy']} / adaptive {row['adaptive_accuracy']}"
+            self.stdout.write(line)
+
+        if options['json_path']:
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(results, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['json_path']}"))
@@ -0,0 +1,258 @@
+import io
+import json
+import os
+import random
+import resource
+import statistics
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+from PIL import Image, ImageDraw, ImageFont
+from rest_framework.test import APIRequestFactory
+
+from document_scanner.services import ocr
+from document_scanner.services.cache import get_scan_cache
+from document_scanner.services.synthetic import generate_corpus
+
+DOCUMENT_TYPES = ('citizenship', 'passport', 'driving_license')
+STAGES = ('decode', 'preprocess', 'ocr', 'pdf', 'view')
+# name -> (noise sigma, skew degrees, JPEG quality or None for PNG)
+VARIANTS = {
+    'clean': (0, 0.0, None),
+    'noisy': (12, 0.0, None),
+    'skewed': (0, 3.0, None),
+    'jpeg': (0, 0.0, 40),
+    'degraded': (12, 3.0, 40),
+}
+
+
+def render_document(text, megapixels, noise=0, skew=0.0, jpeg_quality=None, font_path=None, seed=0):
+    """
+    Render OCR text as a scanned page with PIL and return the encoded file bytes.
+    Without a TrueType font_path, lines the default font cannot draw (Devanagari) are left out.
+    """
+    height = int((megapixels * 1e6 * 3 / 4) ** 0.5)
+    width = int(height * 4 / 3)
+    lines = [line for line in text.splitlines() if font_path or line.isascii()]
+    line_height = height // (len(lines) + 2)
+    size = max(8, int(line_height * 0.6))
+    font = ImageFont.truetype(font_path, size) if font_path else ImageFont.load_default(size)
+
+    page = Image.new('L', (width, height), 235)
+    draw = ImageDraw.Draw(page)
+    for i, line in enumerate(lines):
+        draw.text((int(width * 0.05), line_height * (i + 1)), line, fill=20, font=font)
+    if skew:
+        page = page.rotate(skew, resample=Image.BICUBIC, fillcolor=235)
+    if noise:
+        rng = np.random.default_rng(seed)
+        pixels = np.asarray(page, dtype=np.float32) + rng.normal(0, noise, (height, width))
+        page = Image.fromarray(np.clip(pixels, 0, 255).astype(np.uint8))
+
+    buffer = io.BytesIO()
+    if jpeg_quality:
+        page.save(buffer, 'JPEG', quality=jpeg_quality)
+    else:
+        page.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+class PeakRSS:
+    """Peak resident set size (MB) while the block runs, sampled from /proc; ru_maxrss elsewhere."""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._page_mb = os.sysconf('SC_PAGE_SIZE') / (1024 * 1024) if hasattr(os, 'sysconf') else 0
+
+    def _current_mb(self):
+        try:
+            with open('/proc/self/statm') as f:
+                return int(f.read().split()[1]) * self._page_mb
+        except OSError:
+            # Lifetime peak, in KB on Linux
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak_mb = max(self.peak_mb, self._current_mb())
+
+    def __enter__(self):
+        self.peak_mb = self._current_mb()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak_mb = max(self.peak_mb, self._current_mb())
+
+
+def _percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the scan pipeline end to end on rendered document images, offline and on the CPU only'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--documents', nargs='*', choices=DOCUMENT_TYPES, default=list(DOCUMENT_TYPES))
+        parser.add_argument('--megapixels', type=float, nargs='*', default=[2, 8], help='Rendered page sizes')
+        parser.add_argument('--variants', nargs='*', choices=list(VARIANTS), default=list(VARIANTS))
+        parser.add_argument('--stages', nargs='*', choices=STAGES, default=list(STAGES))
+        parser.add_argument('--concurrency', type=int, nargs='*', default=[1, 2, 4, 8])
+        parser.add_argument('--repeat', type=int, default=3, help='Timed runs per image and stage')
+        parser.add_argument('--font', help='TrueType font to render with (one with Devanagari to include Nepali lines)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', dest='json_path', help='Write results to this JSON file')
+
+    def handle(self, *args, **options):
+        # Never touch a GPU or the network, whatever the host has
+        os.environ['CUDA_VISIBLE_DEVICES'] = ''
+        ocr.OCR_GPU = False
+        ocr.OCR_DOWNLOAD_MODELS = False
+
+        stages = list(options['stages'])
+        ocr_ready = self._load_reader() if {'ocr', 'pdf', 'view'} & set(stages) else False
+        if not ocr_ready:
+            stages = [stage for stage in stages if stage in ('decode', 'preprocess')]
+        if 'pdf' in stages and not ocr.PDF2IMAGE_AVAILABLE:
+            self.stdout.write('Skipping the pdf stage: pdf2image is not installed.')
+            stages.remove('pdf')
+        if not stages:
+            raise CommandError('No stage can run here.')
+
+        cases = self._render_cases(options)
+        self.stdout.write(f'Rendered {len(cases)} images; stages: {", ".join(stages)}')
+        repeat = max(1, options['repeat'])
+
+        with tempfile.TemporaryDirectory() as tmp, override_settings(MEDIA_ROOT=tmp, BASE_DIR=tmp):
+            rows = []
+            for case in cases:
+                row = {key: case[key] for key in ('document_type', 'megapixels', 'variant', 'bytes')}
+                for stage in stages:
+                    run = self._stage(stage, case, tmp)
+                    timings = []
+                    with PeakRSS() as rss:
+                        for _ in range(repeat):
+                            started = time.perf_counter()
+                            run()
+                            timings.append(time.perf_counter() - started)
+                    row[stage] = {
+                        'median_ms': round(statistics.median(timings) * 1000, 1),
+                        'p95_ms': round(_percentile(timings, 0.95) * 1000, 1),
+                        'peak_rss_mb': round(rss.peak_mb, 1),
+                    }
+                rows.append(row)
+                self.stdout.write(
+                    f"{case['document_type']} {case['megapixels']:g}MP {case['variant']}: "
+                    + ', '.join(f"{stage} {row[stage]['median_ms']}ms" for stage in stages)
+                )
+
+            # Throughput runs the deepest available stage, the one a scan request pays for
+            workload = stages[-1]
+            throughput = []
+            for workers in options['concurrency']:
+                jobs = [self._stage(workload, case, tmp) for case in cases for _ in range(repeat)]
+                with PeakRSS() as rss:
+                    started = time.perf_counter()
+                    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+                        list(pool.map(lambda job: job(), jobs))
+                    elapsed = time.perf_counter() - started
+                throughput.append({
+                    'concurrency': workers,
+                    'scans_per_second': round(len(jobs) / elapsed, 2),
+                    'peak_rss_mb': round(rss.peak_mb, 1),
+                })
+                self.stdout.write(
+                    f'{workload} x{workers}: {len(jobs) / elapsed:.2f} scans/s, peak RSS {rss.peak_mb:.0f}MB'
+                )
+
+        if options['json_path']:
+            report = {
+                'options': {key: options[key] for key in ('documents', 'megapixels', 'variants', 'repeat', 'seed')},
+                'stages': stages,
+                'ocr_available': ocr_ready,
+                'cases': rows,
+                'throughput_stage': workload,
+                'throughput': throughput,
+            }
+            with open(options['json_path'], 'w', encoding='utf-8') as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Results written to {options['json_path']}"))
+
+    def _load_reader(self):
+        """Load the EasyOCR model from local storage only; False (with a note) if it cannot be."""
+        if not ocr.EASYOCR_AVAILABLE:
+            self.stdout.write('EasyOCR is not installed: only the decode and preprocess stages will run.')
+            return False
+        try:
+            started = time.perf_counter()
+            ocr.get_reader()
+        except Exception as e:
+            self.stdout.write(f'EasyOCR model unavailable offline ({e}): only the decode and preprocess stages will run.')
+            return False
+        self.stdout.write(f'Loaded the EasyOCR model in {time.perf_counter() - started:.1f}s')
+        return True
+
+    def _render_cases(self, options):
+        rng = random.Random(options['seed'])
+        cases = []
+        for document_type in options['documents']:
+            text, _ = generate_corpus(document_type, 1, seed=rng.randrange(1 << 30), noise=0)[0]
+            for mp in options['megapixels']:
+                for variant in options['variants']:
+                    noise, skew, quality = VARIANTS[variant]
+                    data = render_document(text, mp, noise, skew, quality, options['font'], options['seed'])
+                    cases.append({
+                        'document_type': document_type,
+                        'megapixels': mp,
+                        'variant': variant,
+                        'bytes': len(data),
+                        'data': data,
+                        'extension': 'jpg' if quality else 'png',
+                    })
+        return cases
+
+    def _stage(self, stage, case, tmp):
+        """Return a no-argument callable that runs one stage on the case's image."""
+        data = case['data']
+        if stage == 'decode':
+            return lambda: ocr.load_image(data)
+        if stage == 'preprocess':
+            return lambda: ocr.preprocess_image(data)
+        if stage == 'ocr':
+            return lambda: ocr.extract_text_from_image(data)
+        if stage == 'pdf':
+            path = os.path.join(tmp, f"{case['document_type']}-{case['megapixels']:g}-{case['variant']}.pdf")
+            if not os.path.exists(path):
+                Image.open(io.BytesIO(data)).save(path, 'PDF', resolution=300)
+            return lambda: ocr.extract_text_from_pdf(path)
+        return lambda: self._post_scan(case)
+
+    def _post_scan(self, case):
+        from document_scanner.views import DocumentScanView
+
+        # Every request must pay for OCR, not hit the result cache
+        get_scan_cache().clear()
+        upload = SimpleUploadedFile(f"scan.{case['extension']}", case['data'])
+        request = APIRequestFactory().post(
+            '/api/documents/scan/', {'file': upload, 'document_type': case['document_type']}, format='multipart'
+        )
+        # Scans are stored as UploadedDocument rows; keep benchmark rows out of the database
+        with transaction.atomic():
+            response = DocumentScanView.as_view()(request)
+            transaction.set_rollback(True)
+        if response.status_code >= 500:
+            raise CommandError(f'Scan view failed with {response.status_code}')
+        return response
@@ -0,0 +1,57 @@
+import json
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from document_scanner.services.storage import adopt_legacy_files, collect_garbage, storage_report
+
+
+def _mb(size):
+    return f'{size / (1024 * 1024):.1f}MB'
+
+
+class Command(BaseCommand):
+    help = 'Delete unreferenced blobs from the content-addressed media store and report the space deduplication saves'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace-minutes', type=float, help='Keep unreferenced blobs stored more recently than this (default: MEDIA_BLOB_GC_GRACE_SECONDS)')
+        parser.add_argument('--adopt', action='store_true', help='First move files stored before the content store into it')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be moved and deleted without changing anything')
+        parser.add_argument('--report', action='store_true', help='Only print the space report')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        results = {}
+        if not options['report']:
+            if options['adopt']:
+                results['adopted'] = adopt_legacy_files(dry_run=options['dry_run'])
+            grace = None if options['grace_minutes'] is None else timedelta(minutes=options['grace_minutes'])
+            results['collected'] = collect_garbage(grace=grace, dry_run=options['dry_run'])
+        results['report'] = storage_report()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+
+        verb = 'Would' if options['dry_run'] else 'Did'
+        if 'adopted' in results:
+            adopted = results['adopted']
+            self.stdout.write(
+                f"{verb} move {adopted['files']} legacy file(s) ({_mb(adopted['bytes'])}) into the store; "
+                f"{adopted['missing']} missing from disk"
+            )
+        if 'collected' in results:
+            collected = results['collected']
+            self.stdout.write(
+                f"{verb} delete {collected['blobs']} unreferenced blob(s) ({_mb(collected['bytes'])}) and "
+                f"{collected['orphans']} stray file(s) ({_mb(collected['orphan_bytes'])}); "
+                f"{collected['recounted']} reference count(s) corrected"
+            )
+        report = results['report']
+        self.stdout.write(
+            f"{report['blobs']} blob(s), {report['references']} reference(s): "
+            f"{_mb(report['stored_bytes'])} stored for {_mb(report['logical_bytes'])} referenced, "
+            f"{_mb(report['saved_bytes'])} saved ({report['saved_ratio']:.1%}); "
+            f"{_mb(report['written_bytes_avoided'])} of repeat saves never written"
+        )
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from document_scanner.services.ocr import EASYOCR_AVAILABLE, resolve_languages
+from document_scanner.services.ocr_workers import parse_address, serve, service_address
+
+
+class Command(BaseCommand):
+    help = 'Run the OCR service: a fixed pool of processes holding the EasyOCR models, fed images over shared memory'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, help='OCR worker processes to start (default: OCR_SERVICE_WORKERS)')
+        parser.add_argument('--address', help='Unix socket path or host:port to listen on (default: OCR_SERVICE_ADDRESS)')
+        parser.add_argument('--languages', nargs='*', default=[None], help='Language sets each worker loads at startup, e.g. en ne,en')
+
+    def handle(self, *args, **options):
+        if not EASYOCR_AVAILABLE:
+            raise CommandError('EasyOCR is not installed.')
+        address = parse_address(options['address']) if options['address'] else service_address()
+        if not address:
+            raise CommandError('Set OCR_SERVICE_ADDRESS or pass --address.')
+        try:
+            warm_languages = [resolve_languages(languages) for languages in options['languages']]
+        except ValueError as e:
+            raise CommandError(str(e))
+        workers = max(1, options['workers'] or getattr(settings, 'OCR_SERVICE_WORKERS', 2))
+
+        self.stdout.write(f'Starting {workers} OCR worker(s) on {address}...')
+        try:
+            serve(workers, warm_languages, address=address)
+        except (KeyboardInterrupt, SystemExit):
+            pass
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS('OCR service stopped.'))
@@ -0,0 +1,47 @@
+import multiprocessing
+from datetime import timedelta
+
+from django import db
+from django.core.management.base import BaseCommand
+
+from document_scanner.services.jobs import run_worker
+
+
+class Command(BaseCommand):
+    help = 'Run OCR worker processes that pull queued scan jobs from the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Number of worker processes to start')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to wait when the queue is empty')
+        parser.add_argument('--stale-after', type=int, default=15, help='Minutes after which a running job is assumed abandoned and requeued')
+        parser.add_argument('--once', action='store_true', help='Exit once the queue is empty instead of polling forever')
+
+    def handle(self, *args, **options):
+        worker_options = {
+            'poll_interval': options['poll_interval'],
+            'stale_after': timedelta(minutes=options['stale_after']),
+            'stop_when_idle': options['once'],
+        }
+        workers = max(1, options['workers'])
+        self.stdout.write(f'Starting {workers} scan worker(s)...')
+
+        if workers == 1:
+            run_worker(**worker_options)
+            return
+
+        # Forked children must not share the parent's database connection
+        db.connections.close_all()
+        context = multiprocessing.get_context('fork')
+        processes = [
+            context.Process(target=run_worker, kwargs=worker_options, name=f'scan-worker-{i}')
+            for i in range(workers)
+        ]
+        for process in processes:
+            process.start()
+        try:
+            for process in processes:
+                process.join()
+        except KeyboardInterrupt:
+            for process in processes:
+                process.terminate()
+        self.stdout.write(self.style.SUCCESS('Scan workers stopped.'))
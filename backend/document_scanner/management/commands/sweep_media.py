@@ -0,0 +1,46 @@
+import json
+
+from django.core.management.base import BaseCommand
+
+from document_scanner.services.retention import media_usage_report, sweep_media
+
+
+def _mb(size):
+    return f'{size / (1024 * 1024):.1f}MB'
+
+
+class Command(BaseCommand):
+    help = 'Delete orphaned and expired media artefacts by retention policy and report disk use per category'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help='Sweep at most this many files per storage root, resuming from the saved cursor (default: to the end of the pass)')
+        parser.add_argument('--dry-run', action='store_true', help='Report what would be deleted without deleting or moving the cursor')
+        parser.add_argument('--report', action='store_true', help='Only print disk use and reclaimed space per category')
+        parser.add_argument('--json', action='store_true', help='Print the results as JSON')
+
+    def handle(self, *args, **options):
+        results = {}
+        if not options['report']:
+            results['steps'] = sweep_media(limit=options['limit'], dry_run=options['dry_run'])
+        results['report'] = media_usage_report()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, default=str))
+            return
+
+        verb = 'Would reclaim' if options['dry_run'] else 'Reclaimed'
+        for step in results.get('steps', []):
+            reclaimed = ', '.join(
+                f"{category} {entry['files']} file(s) {_mb(entry['bytes'])}" for category, entry in step['reclaimed'].items()
+            ) or 'nothing'
+            state = 'pass finished' if step['finished_pass'] else 'pass continues next run'
+            self.stdout.write(f"{step['root']}: swept {step['swept']} file(s), {state}. {verb}: {reclaimed}")
+
+        for root_key, root in results['report'].items():
+            self.stdout.write(f"\n{root_key} ({root['path']}), {root['passes']} completed pass(es):")
+            for category, entry in root['categories'].items():
+                self.stdout.write(
+                    f"  {category:<18} {entry['files']:>7} file(s) {_mb(entry['bytes']):>10} used"
+                    f"   {entry['reclaimed_files']:>7} file(s) {_mb(entry['reclaimed_bytes']):>10} reclaimed"
+                )
+        self.stdout.write(self.style.SUCCESS('Done.'))
@@ -0,0 +1,30 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from document_scanner.services.ocr import EASYOCR_AVAILABLE, resolve_languages, warm_up_reader
+
+
+class Command(BaseCommand):
+    help = 'Load the EasyOCR models (downloading weights if needed) and report how long each took'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--languages', nargs='*', default=[None],
+            help='Language sets to load, e.g. en ne,en (default: OCR_LANGUAGES); at most OCR_READER_POOL_SIZE stay loaded',
+        )
+
+    def handle(self, *args, **options):
+        if not EASYOCR_AVAILABLE:
+            raise CommandError('EasyOCR is not installed.')
+
+        for languages in options['languages']:
+            try:
+                languages = resolve_languages(languages)
+            except ValueError as e:
+                raise CommandError(str(e))
+            self.stdout.write(f"Loading EasyOCR reader for {'+'.join(languages)}...")
+            started = time.perf_counter()
+            warm_up_reader(languages)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(self.style.SUCCESS(f"EasyOCR reader for {'+'.join(languages)} ready in {elapsed:.1f}s"))
@@ -0,0 +1,82 @@
+# Generated by Django 6.0.2 on 2026-10-18 08:29
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_existing_documents(apps, schema_editor):
+    # Rows from before scan jobs were synchronous scans: give each its own
+    # job_id and mark them done so workers never pick them up.
+    UploadedDocument = apps.get_model('document_scanner', 'UploadedDocument')
+    for document in UploadedDocument.objects.all():
+        document.job_id = uuid.uuid4()
+        document.status = 'done'
+        document.save(update_fields=['job_id', 'status'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_scanner', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadeddocument',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='uploadeddocument',
+            name='error',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AddField(
+            model_name='uploadeddocument',
+            name='finished_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadeddocument',
+            name='job_id',
+            field=models.UUIDField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadeddocument',
+            name='started_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='uploadeddocument',
+            name='status',
+            field=models.CharField(choices=[('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')], default='queued', max_length=16),
+        ),
+        migrations.RunPython(backfill_existing_documents, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='uploadeddocument',
+            name='job_id',
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='uploadeddocument',
+            name='extracted_data',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.AlterField(
+            model_name='uploadeddocument',
+            name='extracted_text',
+            field=models.TextField(blank=True, default=''),
+        ),
+        migrations.AlterField(
+            model_name='uploadeddocument',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='uploaded_documents', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='uploadeddocument',
+            index=models.Index(fields=['status', 'created_at'], name='uploaded_doc_status_idx'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 6.0.2 on 2026-10-18 09:02
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_identifiers(apps, schema_editor):
+    # Copy the key identifiers of existing results into their indexed columns
+    UploadedDocument = apps.get_model('document_scanner', 'UploadedDocument')
+    for document in UploadedDocument.objects.exclude(extracted_data={}).iterator():
+        data = document.extracted_data if isinstance(document.extracted_data, dict) else {}
+        document.citizenship_number = (data.get('citizenship_number') or '')[:64]
+        document.passport_number = (data.get('passport_number') or '')[:64]
+        if document.citizenship_number or document.passport_number:
+            document.save(update_fields=['citizenship_number', 'passport_number'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_scanner', '0002_scan_jobs'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadeddocument',
+            name='citizenship_number',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='uploadeddocument',
+            name='passport_number',
+            field=models.CharField(blank=True, default='', max_length=64),
+        ),
+        migrations.RunPython(backfill_identifiers, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='citizenshipcard',
+            name='user',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='citizenship_cards', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='uploadeddocument',
+            index=models.Index(fields=['document_type', '-created_at'], name='uploaded_doc_type_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadeddocument',
+            index=models.Index(fields=['user', '-created_at'], name='uploaded_doc_user_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadeddocument',
+            index=models.Index(fields=['-created_at'], name='uploaded_doc_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadeddocument',
+            index=models.Index(fields=['content_hash'], name='uploaded_doc_hash_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadeddocument',
+            index=models.Index(fields=['citizenship_number'], name='uploaded_doc_citizenship_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='uploadeddocument',
+            index=models.Index(fields=['passport_number'], name='uploaded_doc_passport_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='citizenshipcard',
+            index=models.Index(fields=['citizenship_number'], name='citizenship_card_number_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='citizenshipcard',
+            index=models.Index(fields=['user', '-created_at'], name='citizenship_card_user_idx'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 09:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_scanner', '0003_scan_result_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadeddocument',
+            name='file',
+            field=models.FileField(max_length=255, upload_to='documents/'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:05
+
+import document_scanner.services.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_scanner', '0004_scan_upload_path'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='uploadeddocument',
+            name='file',
+            field=models.FileField(max_length=255, storage=document_scanner.services.storage.get_content_store, upload_to='documents/'),
+        ),
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('content_hash', models.CharField(max_length=64)),
+                ('size', models.BigIntegerField()),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('stored_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_stored_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'last_stored_at'], name='stored_blob_gc_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 6.0.2 on 2026-10-18 11:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_scanner', '0005_stored_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaSweepCursor',
+            fields=[
+                ('id', models.AutoField(primary_key=True, serialize=False)),
+                ('root', models.CharField(max_length=32, unique=True)),
+                ('position', models.TextField(blank=True, default='')),
+                ('pass_started_at', models.DateTimeField(blank=True, null=True)),
+                ('pass_usage', models.JSONField(blank=True, default=dict)),
+                ('last_usage', models.JSONField(blank=True, default=dict)),
+                ('last_pass_finished_at', models.DateTimeField(blank=True, null=True)),
+                ('reclaimed', models.JSONField(blank=True, default=dict)),
+                ('passes', models.PositiveIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+        ),
+    ]
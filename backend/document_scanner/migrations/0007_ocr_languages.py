@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 12:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_scanner', '0006_media_sweep_cursor'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadeddocument',
+            name='ocr_languages',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-18 16:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('document_scanner', '0007_ocr_languages'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='uploadeddocument',
+            name='field_confidence',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
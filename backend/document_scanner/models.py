@@ -1,26 +1,86 @@
 """
 models.py for document_scanner app
-Defines UploadedDocument model for storing uploaded documents and extracted data.
+Defines UploadedDocument model for storing uploaded documents and extracted data,
+CitizenshipCard for the fields parsed from citizenship scans, StoredBlob for the
+files in the shared content-addressed media store, and MediaSweepCursor for retention sweeps.
 """
+import uuid
+
 from django.db import models
+from django.utils import timezone
 from django.contrib.auth import get_user_model
 
+from .services.storage import get_content_store
+
+
 class UploadedDocument(models.Model):
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_QUEUED, 'Queued'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
     id = models.AutoField(primary_key=True)
-    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="uploaded_documents")
-    file = models.FileField(upload_to="documents/")
+    # Public handle for scan jobs; sequential ids would let anyone enumerate other people's documents
+    job_id = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="uploaded_documents", blank=True, null=True)
+    # The content store saves every file as blobs/ab/cd/<sha256><ext> whatever upload_to says;
+    # documents/ only still holds files uploaded before it
+    file = models.FileField(upload_to='documents/', storage=get_content_store, max_length=255)
+    content_hash = models.CharField(max_length=64, blank=True, default='')
     document_type = models.CharField(max_length=64)
-    extracted_text = models.TextField()
-    extracted_data = models.JSONField()
+    # Comma-separated OCR language set, e.g. "ne,en"; empty means the document type's default
+    ocr_languages = models.CharField(max_length=32, blank=True, default='')
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default=STATUS_QUEUED)
+    error = models.TextField(blank=True, default='')
+    extracted_text = models.TextField(blank=True, default='')
+    extracted_data = models.JSONField(blank=True, default=dict)
+    # {field: OCR confidence} for the parsed fields located on the page; None where the value
+    # was reformatted past matching its detections
+    field_confidence = models.JSONField(blank=True, default=dict)
+    # Key identifiers copied out of extracted_data so earlier scans can be found with an index
+    citizenship_number = models.CharField(max_length=64, blank=True, default='')
+    passport_number = models.CharField(max_length=64, blank=True, default='')
     created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            # Workers poll for the oldest queued job
+            models.Index(fields=['status', 'created_at'], name='uploaded_doc_status_idx'),
+            models.Index(fields=['document_type', '-created_at'], name='uploaded_doc_type_idx'),
+            models.Index(fields=['user', '-created_at'], name='uploaded_doc_user_idx'),
+            models.Index(fields=['-created_at'], name='uploaded_doc_created_idx'),
+            models.Index(fields=['content_hash'], name='uploaded_doc_hash_idx'),
+            models.Index(fields=['citizenship_number'], name='uploaded_doc_citizenship_idx'),
+            models.Index(fields=['passport_number'], name='uploaded_doc_passport_idx'),
+        ]
 
     def __str__(self):
         return f"{self.document_type} uploaded by {self.user}"
 
+    def set_result(self, text, extracted_data, field_confidence=None):
+        """Record a successful scan: OCR text, parsed fields, their confidence and the identifiers indexed for lookups."""
+        extracted_data = extracted_data or {}
+        self.status = self.STATUS_DONE
+        self.error = ''
+        self.extracted_text = text
+        self.extracted_data = extracted_data
+        self.field_confidence = field_confidence or {}
+        for field in ('citizenship_number', 'passport_number'):
+            max_length = self._meta.get_field(field).max_length
+            setattr(self, field, (extracted_data.get(field) or '')[:max_length])
+
 # New model for citizenship card data
 class CitizenshipCard(models.Model):
     id = models.AutoField(primary_key=True)
-    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="citizenship_cards")
+    user = models.ForeignKey(get_user_model(), on_delete=models.CASCADE, related_name="citizenship_cards", blank=True, null=True)
     uploaded_document = models.OneToOneField(UploadedDocument, on_delete=models.CASCADE, related_name="citizenship_card")
     name = models.CharField(max_length=128)
     address = models.CharField(max_length=256)
@@ -33,5 +93,54 @@ class CitizenshipCard(models.Model):
     date_of_birth = models.CharField(max_length=64, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['citizenship_number'], name='citizenship_card_number_idx'),
+            models.Index(fields=['user', '-created_at'], name='citizenship_card_user_idx'),
+        ]
+
+    def __str__(self):
+        return f"CitizenshipCard {self.citizenship_number} for {self.name}"
+
+
+class StoredBlob(models.Model):
+    """A file in the content-addressed media store and how many file fields point at it."""
+    id = models.AutoField(primary_key=True)
+    name = models.CharField(max_length=255, unique=True)
+    content_hash = models.CharField(max_length=64)
+    size = models.BigIntegerField()
+    # Rows across all content-store file fields that point at this blob
+    ref_count = models.PositiveIntegerField(default=0)
+    # Times this content was saved, the first write included
+    stored_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_stored_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # The garbage collector looks for unreferenced blobs past their grace period
+            models.Index(fields=['ref_count', 'last_stored_at'], name='stored_blob_gc_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count} references)"
+
+
+class MediaSweepCursor(models.Model):
+    """How far the retention sweep of one storage root has got, and what it has counted there."""
+    id = models.AutoField(primary_key=True)
+    root = models.CharField(max_length=32, unique=True)
+    # '/'-joined path of the last file swept; empty at the start of a pass
+    position = models.TextField(blank=True, default='')
+    pass_started_at = models.DateTimeField(blank=True, null=True)
+    # {category: {'files': n, 'bytes': n}} kept so far in the current pass, and in the last completed one
+    pass_usage = models.JSONField(blank=True, default=dict)
+    last_usage = models.JSONField(blank=True, default=dict)
+    last_pass_finished_at = models.DateTimeField(blank=True, null=True)
+    # {category: {'files': n, 'bytes': n}} deleted over all passes
+    reclaimed = models.JSONField(blank=True, default=dict)
+    passes = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
     def __str__(self):
-        return f"CitizenshipCard {self.citizenship_number} for {self.name}"
\ No newline at end of file
+        return f"Media sweep of {self.root} at {self.position or 'start'}"
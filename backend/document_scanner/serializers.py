@@ -8,5 +8,11 @@ from .models import UploadedDocument
 class UploadedDocumentSerializer(serializers.ModelSerializer):
     class Meta:
         model = UploadedDocument
-        fields = ['id', 'user', 'file', 'document_type', 'extracted_text', 'extracted_data', 'created_at']
-        read_only_fields = ['id', 'user', 'document_type', 'extracted_text', 'extracted_data', 'created_at']
+        fields = ['id', 'user', 'file', 'document_type', 'extracted_text', 'extracted_data', 'field_confidence', 'created_at']
+        read_only_fields = ['id', 'user', 'document_type', 'extracted_text', 'extracted_data', 'field_confidence', 'created_at']
+
+class ScanJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = UploadedDocument
+        fields = ['job_id', 'status', 'document_type', 'ocr_languages', 'extracted_text', 'extracted_data', 'field_confidence', 'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = fields
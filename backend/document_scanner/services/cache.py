@@ -0,0 +1,96 @@
+"""
+services/cache.py for document_scanner app
+Content-addressed, in-process cache of OCR results with LRU eviction under a byte budget.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+
+def hash_upload(upload):
+    """SHA-256 hex digest of an uploaded file, read in chunks and rewound afterwards."""
+    digest = hashlib.sha256()
+    for chunk in upload.chunks():
+        digest.update(chunk)
+    upload.seek(0)
+    return digest.hexdigest()
+
+
+def _entry_size(text, parsed, confidence):
+    return len(text.encode('utf-8')) + sum(
+        len(json.dumps(fields, ensure_ascii=False).encode('utf-8'))
+        for fields in list(parsed.values()) + list(confidence.values())
+    )
+
+
+class ScanResultCache:
+    """
+    Maps (content hash, pipeline version) to the OCR text of a document and the
+    fields parsed from it per document type, with their OCR confidence where the
+    parse had the detections to hand. Least recently used entries are
+    dropped once the stored text and fields exceed max_bytes.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.current_bytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, content_hash, version):
+        """Return (text, parsed, confidence) for a cached document, or None on a miss."""
+        key = (content_hash, version)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            self._entries.move_to_end(key)
+            text, parsed, confidence, _ = entry
+            return text, dict(parsed), dict(confidence)
+
+    def set(self, content_hash, version, text, document_type=None, fields=None, field_confidence=None):
+        """Store OCR text, and optionally the fields parsed for one document type and their confidence."""
+        key = (content_hash, version)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None and entry[0] == text:
+                parsed, confidence = entry[1], entry[2]
+            else:
+                parsed, confidence = {}, {}
+            if entry is not None:
+                self.current_bytes -= entry[3]
+            if document_type is not None:
+                parsed[document_type] = fields or {}
+                confidence[document_type] = field_confidence or {}
+            size = _entry_size(text, parsed, confidence)
+            if size > self.max_bytes:
+                return
+            self._entries[key] = (text, parsed, confidence, size)
+            self.current_bytes += size
+            while self.current_bytes > self.max_bytes:
+                _, (_, _, _, evicted_size) = self._entries.popitem(last=False)
+                self.current_bytes -= evicted_size
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.current_bytes = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+
+_scan_cache = None
+_scan_cache_lock = threading.Lock()
+
+
+def get_scan_cache():
+    """Return the process-wide scan cache, sized by settings.OCR_CACHE_MAX_BYTES."""
+    global _scan_cache
+    if _scan_cache is None:
+        from django.conf import settings
+        with _scan_cache_lock:
+            if _scan_cache is None:
+                _scan_cache = ScanResultCache(getattr(settings, 'OCR_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+    return _scan_cache
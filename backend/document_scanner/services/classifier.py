@@ -0,0 +1,126 @@
+"""
+services/classifier.py for document_scanner app
+Keyword-based document classification: one Aho-Corasick automaton over the English and
+Nepali keywords of every supported document type, matched on word boundaries in a single
+pass over the OCR text, so the cost does not grow with the number of types or keywords.
+"""
+import unicodedata
+from collections import deque
+
+# document type -> [(keyword, weight)]; keywords are matched case-insensitively as whole words
+DOCUMENT_KEYWORDS = {
+    'citizenship': [
+        ('citizenship', 2),
+        ('citizenship certificate', 3),
+        ('citizenship no', 1),
+        ('nagrita', 2),
+        ('nagarikta', 2),
+        ('नागरिकता', 3),
+        ('नागरिकता प्रमाणपत्र', 3),
+        ('नागरिकताको प्रमाणपत्र', 3),
+        ('नागरिकता नं', 1),
+    ],
+    'passport': [
+        ('passport', 2),
+        ('passport no', 1),
+        ('date of expiry', 1),
+        ('राहदानी', 3),
+    ],
+    'driving_license': [
+        ('driving licence', 3),
+        ('driving license', 3),
+        ('license no', 1),
+        ('लाइसेन्स', 3),
+        ('सवारी चालक अनुमतिपत्र', 3),
+        ('सवारी चालक अनुमति पत्र', 3),
+    ],
+    'birth_certificate': [
+        ('birth certificate', 3),
+        ('birth registration', 2),
+        ('जन्म दर्ता', 3),
+    ],
+    'nid': [
+        ('national id', 3),
+        ('national identity', 3),
+        ('nid', 2),
+        ('राष्ट्रिय परिचयपत्र', 3),
+        ('राष्ट्रिय परिचय पत्र', 3),
+    ],
+}
+
+
+def _is_word_char(ch):
+    # Devanagari vowel signs and viramas are combining marks, not alphanumerics, but are part of the word
+    return ch.isalnum() or ch == '_' or unicodedata.category(ch)[0] == 'M'
+
+
+class KeywordAutomaton:
+    """
+    Aho-Corasick automaton over {label: [(keyword, weight)]}.
+    scores() sums the weights of every whole-word keyword occurrence per label.
+    """
+
+    def __init__(self, keywords):
+        self.labels = list(keywords)
+        self._goto = [{}]
+        self._fail = [0]
+        # Per state: (keyword length, label index, weight) for every keyword ending there
+        self._out = [[]]
+        for index, label in enumerate(self.labels):
+            for keyword, weight in keywords[label]:
+                keyword = keyword.casefold()
+                state = 0
+                for ch in keyword:
+                    nxt = self._goto[state].get(ch)
+                    if nxt is None:
+                        nxt = len(self._goto)
+                        self._goto[state][ch] = nxt
+                        self._goto.append({})
+                        self._fail.append(0)
+                        self._out.append([])
+                    state = nxt
+                self._out[state].append((len(keyword), index, weight))
+
+        # Breadth-first so every fail target is final before its dependants
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[nxt] = self._goto[fallback].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+                queue.append(nxt)
+
+    def scores(self, text):
+        """Return {label: score} for every label with at least one whole-word match."""
+        text = text.casefold()
+        goto, fail, out = self._goto, self._fail, self._out
+        totals = [0] * len(self.labels)
+        state = 0
+        for end, ch in enumerate(text, 1):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, index, weight in out[state]:
+                start = end - length
+                if start > 0 and _is_word_char(text[start - 1]):
+                    continue
+                if end < len(text) and _is_word_char(text[end]):
+                    continue
+                totals[index] += weight
+        return {self.labels[i]: total for i, total in enumerate(totals) if total}
+
+
+DOCUMENT_AUTOMATON = KeywordAutomaton(DOCUMENT_KEYWORDS)
+
+
+def rank_document_types(text):
+    """
+    Return [(document_type, score), ...] best first, for every type whose keywords occur in the text.
+    Ties keep the order of DOCUMENT_KEYWORDS.
+    """
+    scores = DOCUMENT_AUTOMATON.scores(text)
+    order = {label: i for i, label in enumerate(DOCUMENT_AUTOMATON.labels)}
+    return sorted(scores.items(), key=lambda item: (-item[1], order[item[0]]))
@@ -0,0 +1,150 @@
+"""
+services/fields.py for document_scanner app
+Table-driven field extraction: each document type declares its fields as (label, value) regex pairs,
+compiled once at import and shared by services/parsers.py and services/extractors.py.
+"""
+import re
+from datetime import datetime
+
+# Every label in the specs is followed by this separator before the value
+SEPARATOR = r"[:\s]+"
+
+DEVANAGARI_DIGITS = str.maketrans('०१२३४५६७८९', '0123456789')
+DATE_FORMATS = ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d")
+
+
+def normalise_date(value):
+    """Convert Devanagari digits and reformat to YYYY-MM-DD when the date matches a known format."""
+    value = value.translate(DEVANAGARI_DIGITS)
+    for fmt in DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    return None
+
+
+class FieldExtractor:
+    """
+    Extracts fields declared as {field: [(label_regex, value_regex), ...]}, patterns in priority order:
+    for every field the first occurrence of its highest-priority pattern wins.
+
+    Every pattern is compiled once, here. A single alternation over all labels was measured
+    2-7x slower under CPython's re (it must scan to the end of the text and surface every
+    label hit to Python), whereas separate searches stop at their first match and skip
+    ahead on the label's literal prefix; see the benchmark_field_extraction command.
+    """
+
+    def __init__(self, spec, flags=0):
+        self.spec = spec
+        self.flags = flags
+        self.fields = list(spec)
+        self._patterns = [
+            (field, [re.compile(f"{label}{SEPARATOR}({value})", flags) for label, value in patterns])
+            for field, patterns in spec.items()
+        ]
+        # The label patterns alone, to find where on a page a field is printed
+        self.labels = {field: [re.compile(label, flags) for label, _ in patterns] for field, patterns in spec.items()}
+
+    def extract(self, text):
+        """Return {field: stripped value or None} for every declared field."""
+        data = {}
+        for field, patterns in self._patterns:
+            data[field] = None
+            for pattern in patterns:
+                m = pattern.search(text)
+                if m:
+                    data[field] = m.group(1).strip()
+                    break
+        return data
+
+
+CITIZENSHIP_FIELDS = FieldExtractor({
+    'full_name': [
+        (r"नाम", r"[\u0900-\u097F A-Za-z.]+"),
+        (r"Name", r"[A-Za-z .]+"),
+    ],
+    'dob': [
+        (r"जन्म मिति", r"[\d\-/०१२३४५६७८९]+"),
+        (r"Date of Birth", r"[\d\-/]+"),
+    ],
+    'citizenship_number': [
+        (r"नागरिकता नं", r"[\w\d\-/]+"),
+        (r"Citizenship No", r"[A-Za-z0-9-]+"),
+    ],
+    'district': [
+        (r"जिल्ला", r"[\u0900-\u097F A-Za-z.]+"),
+        (r"District", r"[A-Za-z .]+"),
+    ],
+})
+
+DRIVING_LICENSE_FIELDS = FieldExtractor({
+    'license_number': [
+        (r"License No", r"[A-Za-z0-9\-/]+"),
+        (r"License Number", r"[A-Za-z0-9\-/]+"),
+        (r"लाइसेन्स नं", r"[\w\d\-/]+"),
+    ],
+    'full_name': [
+        (r"Name", r"[A-Za-z .]+"),
+        (r"नाम", r"[\u0900-\u097F A-Za-z.]+"),
+    ],
+    'date_of_birth': [
+        (r"Date of Birth", r"[\d\-/०१२३४५६७८९]+"),
+        (r"जन्म मिति", r"[\d\-/०१२३४५६७८९]+"),
+        (r"DOB", r"[\d\-/०१२३४५६७८९]+"),
+    ],
+    'license_class': [
+        (r"Class", r"[A-Za-z0-9/\-]+"),
+        (r"License Class", r"[A-Za-z0-9/\-]+"),
+        (r"वर्ग", r"[\u0900-\u097F A-Za-z0-9/\-]+"),
+    ],
+    'issued_date': [
+        (r"Issued Date", r"[\d\-/०१२३४५६७८९]+"),
+        (r"Issued", r"[\d\-/०१२३४५६७८९]+"),
+        (r"जारी मिति", r"[\d\-/०१२३४५६७८९]+"),
+    ],
+    'validity_date': [
+        (r"Validity", r"[\d\-/०१२३४५६७८९]+"),
+        (r"Valid Till", r"[\d\-/०१२३४५६७८९]+"),
+        (r"Expiry", r"[\d\-/०१२३४५६७८९]+"),
+        (r"वैधता", r"[\d\-/०१२३४५६७८९]+"),
+    ],
+    'issuing_authority': [
+        (r"Issued By", r"[A-Za-z\s]+"),
+        (r"Issuing Authority", r"[A-Za-z\s]+"),
+    ],
+    'gender': [
+        (r"Gender", r"Male|Female|Other|M|F"),
+        (r"लिङ्ग", r"पुरुष|महिला|अन्य"),
+    ],
+    'address': [
+        (r"Address", r"[A-Za-z0-9\s\-,]+"),
+        (r"पता", r"[\u0900-\u097F A-Za-z0-9\s\-,]+"),
+    ],
+}, flags=re.I)
+
+# Simpler English-only layouts used by services/extractors.py
+CITIZENSHIP_BASIC_FIELDS = FieldExtractor({
+    'name': [(r"Name", r"[A-Za-z .]+")],
+    'date_of_birth': [(r"Date of Birth", r"[0-9\-/]+")],
+    'citizenship_number': [(r"Citizenship No", r"[A-Za-z0-9-]+")],
+})
+
+PASSPORT_BASIC_FIELDS = FieldExtractor({
+    'passport_number': [(r"Passport No", r"[A-Z0-9]+")],
+    'name': [(r"Name", r"[A-Za-z .]+")],
+    'nationality': [(r"Nationality", r"[A-Za-z ]+")],
+    'expiry_date': [(r"Date of Expiry", r"[0-9\-/]+")],
+})
+
+NID_FIELDS = FieldExtractor({
+    'nid_number': [(r"NID", r"[0-9]+")],
+    'name': [(r"Name", r"[A-Za-z .]+")],
+    'date_of_birth': [(r"Date of Birth", r"[0-9\-/]+")],
+})
+
+BIRTH_CERTIFICATE_FIELDS = FieldExtractor({
+    'name': [(r"Name", r"[A-Za-z .]+")],
+    'date_of_birth': [(r"Date of Birth", r"[0-9\-/]+")],
+    'registration_number': [(r"Registration No", r"[A-Za-z0-9-]+")],
+})
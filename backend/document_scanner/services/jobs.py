@@ -0,0 +1,138 @@
+"""
+services/jobs.py for document_scanner app
+DB-backed queue of scan jobs: UploadedDocument rows move queued -> running -> done/failed.
+Workers (see the scan_worker management command) claim jobs with a conditional UPDATE,
+so any number of worker processes can poll the same table without double-processing.
+Idle workers also run the media retention sweep when it is due.
+"""
+import logging
+import time
+from datetime import timedelta
+
+from django.db import close_old_connections
+from django.utils import timezone
+
+from ..models import UploadedDocument
+from .cache import get_scan_cache
+from .ocr import check_document_type, pipeline_version, read_document
+from .ocr_workers import OCRServiceUnavailable
+from .parsers import DOCUMENT_PARSERS, parse_result
+from .results import save_scan_failure, save_scan_result
+from .retention import sweep_media_if_due
+from .timing import collect_timings, record_scan, timed
+
+logger = logging.getLogger(__name__)
+
+
+def claim_next_job():
+    """Atomically move the oldest queued document to running and return it, or None."""
+    candidates = (
+        UploadedDocument.objects
+        .filter(status=UploadedDocument.STATUS_QUEUED)
+        .order_by('created_at')
+        .values_list('pk', flat=True)[:10]
+    )
+    for pk in candidates:
+        claimed = UploadedDocument.objects.filter(pk=pk, status=UploadedDocument.STATUS_QUEUED).update(
+            status=UploadedDocument.STATUS_RUNNING,
+            started_at=timezone.now(),
+        )
+        if claimed:
+            return UploadedDocument.objects.get(pk=pk)
+    return None
+
+
+def requeue_stale_jobs(older_than):
+    """Put jobs left running by a crashed worker back on the queue. Returns how many were requeued."""
+    cutoff = timezone.now() - older_than
+    return UploadedDocument.objects.filter(
+        status=UploadedDocument.STATUS_RUNNING,
+        started_at__lt=cutoff,
+    ).update(status=UploadedDocument.STATUS_QUEUED, started_at=None)
+
+
+def release_job(document):
+    """Put a claimed job back on the queue untouched, for another attempt once OCR is available."""
+    document.status = UploadedDocument.STATUS_QUEUED
+    document.started_at = None
+    document.save(update_fields=['status', 'started_at'])
+    return document
+
+
+def process_job(document):
+    """
+    OCR and parse a claimed document, recording the outcome on the row. A job the OCR service
+    could not take is released back to the queue rather than failed.
+    """
+    with collect_timings() as timings:
+        _process_job(document)
+    record_scan(timings, document_type=document.document_type, job_id=document.job_id, status=document.status)
+    return document
+
+
+def _process_job(document):
+    try:
+        parser = DOCUMENT_PARSERS[document.document_type]
+        scan_cache = get_scan_cache()
+        languages = document.ocr_languages or None
+        version = pipeline_version(document.document_type, languages)
+        cached = scan_cache.get(document.content_hash, version) if document.content_hash else None
+        if cached is not None:
+            text, parsed, confidence = cached
+            extracted_data = parsed.get(document.document_type)
+            field_confidence = confidence.get(document.document_type, {})
+            check_document_type(text, document.document_type)
+        else:
+            result = read_document(document.file.path, document.document_type, languages)
+            text = result.text
+            extracted_data = None
+        if extracted_data is None:
+            with timed('parse'):
+                if cached is not None:
+                    extracted_data, field_confidence = parser(text), {}
+                else:
+                    extracted_data, field_confidence = parse_result(document.document_type, result)
+            if document.content_hash:
+                scan_cache.set(document.content_hash, version, text, document.document_type, extracted_data, field_confidence)
+    except OCRServiceUnavailable as e:
+        logger.warning("Scan job %s requeued: %s", document.job_id, e)
+        release_job(document)
+    except Exception as e:
+        logger.exception("Scan job %s failed", document.job_id)
+        with timed('persist'):
+            save_scan_failure(document, e)
+    else:
+        with timed('persist'):
+            save_scan_result(document, text, extracted_data, field_confidence)
+
+
+def _sweep_when_idle():
+    """Run a due batch of the media retention sweep; a failing sweep must not stop the worker."""
+    try:
+        for result in sweep_media_if_due():
+            if result['reclaimed']:
+                logger.info("Media sweep of %s reclaimed %s", result['root'], result['reclaimed'])
+    except Exception:
+        logger.exception("Media retention sweep failed")
+
+
+def run_worker(poll_interval=1.0, stale_after=timedelta(minutes=15), stop_when_idle=False):
+    """Process jobs until interrupted (or until the queue is empty if stop_when_idle)."""
+    requeued = requeue_stale_jobs(stale_after)
+    if requeued:
+        logger.warning("Requeued %d stale scan job(s)", requeued)
+    while True:
+        close_old_connections()
+        document = claim_next_job()
+        if document is None:
+            if stop_when_idle:
+                return
+            _sweep_when_idle()
+            time.sleep(poll_interval)
+            continue
+        process_job(document)
+        if document.status == UploadedDocument.STATUS_QUEUED:
+            # Released because the OCR service is down or saturated; don't spin on it
+            if stop_when_idle:
+                return
+            time.sleep(poll_interval)
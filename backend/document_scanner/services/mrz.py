@@ -0,0 +1,155 @@
+"""
+services/mrz.py for document_scanner app
+ICAO 9303 TD3 (passport) machine-readable zone decoder. Every check digit is validated,
+and characters OCR commonly confuses (O/0, I/1, S/5, ...) are repaired where the field
+type or its check digit makes the right reading unambiguous.
+"""
+import itertools
+import re
+from datetime import date
+
+TD3_LINE_LENGTH = 44
+
+# OCR confusions between letters and digits, in both directions
+LETTER_TO_DIGIT = str.maketrans("OQDIJLSZBG", "0001115286")
+DIGIT_TO_LETTER = str.maketrans("012568", "OIZSGB")
+_AMBIGUOUS = {}
+for _letters, _digit in (("OQD", "0"), ("IL", "1"), ("S", "5"), ("Z", "2"), ("B", "8"), ("G", "6")):
+    for _letter in _letters:
+        _AMBIGUOUS.setdefault(_letter, set()).add(_digit)
+        _AMBIGUOUS.setdefault(_digit, set()).add(_letter)
+
+# Most characters changed while searching for a reading that satisfies a check digit. A check
+# digit is mod 10, so every extra change multiplies the readings that pass by chance
+MAX_REPAIRS = 1
+
+_MRZ_LINE = re.compile(r"[A-Z0-9<]{20,}")
+
+
+def check_digit(value):
+    """ICAO 9303 check digit: weights 7, 3, 1 over digits, A-Z as 10-35 and '<' as 0."""
+    total = 0
+    for i, ch in enumerate(value):
+        if ch.isdigit():
+            n = int(ch)
+        elif "A" <= ch <= "Z":
+            n = ord(ch) - 55
+        else:
+            n = 0
+        total += n * (7, 3, 1)[i % 3]
+    return str(total % 10)
+
+
+def _repair(value, check):
+    """
+    Return value, or the unique reading of it with the fewest letter/digit swaps (at most
+    MAX_REPAIRS) whose check digit matches; None when no reading, or more than one, fits.
+    """
+    if check_digit(value) == check:
+        return value
+    positions = [i for i, ch in enumerate(value) if ch in _AMBIGUOUS]
+    for changes in range(1, MAX_REPAIRS + 1):
+        found = set()
+        for chosen in itertools.combinations(positions, changes):
+            for replacements in itertools.product(*(sorted(_AMBIGUOUS[value[i]]) for i in chosen)):
+                candidate = list(value)
+                for i, ch in zip(chosen, replacements):
+                    candidate[i] = ch
+                candidate = "".join(candidate)
+                if check_digit(candidate) == check:
+                    found.add(candidate)
+        if len(found) == 1:
+            return found.pop()
+        if found:
+            return None
+    return None
+
+
+def _digits(value):
+    """Numeric field: read letters as the digits they resemble."""
+    return value.translate(LETTER_TO_DIGIT)
+
+
+def _checked(value, check):
+    """value if its check digit matches, else None (no search: every character is already a digit)."""
+    return value if check_digit(value) == check else None
+
+
+def _mrz_date(value, expiry=False):
+    """YYMMDD to YYYY-MM-DD. Expiry dates are in this century; birth dates are not in the future."""
+    if not re.fullmatch(r"\d{6}", value):
+        return None
+    yy, mm, dd = int(value[:2]), int(value[2:4]), int(value[4:])
+    year = 2000 + yy
+    if not expiry and year > date.today().year:
+        year -= 100
+    try:
+        return date(year, mm, dd).strftime("%Y-%m-%d")
+    except ValueError:
+        return None
+
+
+def _alpha(value):
+    """Letters-only field (names, country codes): read digits as the letters they resemble."""
+    return value.translate(DIGIT_TO_LETTER)
+
+
+def _filler_to_none(value):
+    return value.replace("<", " ").strip() or None
+
+
+def decode_td3(line1, line2):
+    """
+    Decode a TD3 MRZ. Returns (fields, valid): fields protected by a check digit are only
+    included when it (possibly after repair) passes; valid is True when every check digit
+    including the composite one passes.
+    """
+    line1 = line1.ljust(TD3_LINE_LENGTH, "<")[:TD3_LINE_LENGTH]
+    line2 = line2.ljust(TD3_LINE_LENGTH, "<")[:TD3_LINE_LENGTH]
+    country_code = _alpha(line1[2:5])
+    names = _alpha(line1[5:]).split("<<", 1)
+    nationality = _alpha(line2[10:13])
+    sex = line2[20]
+
+    number_check, birth_check, expiry_check = _digits(line2[9]), _digits(line2[19]), _digits(line2[27])
+    # An empty personal number may carry '<' instead of a 0 check digit
+    personal_check = _digits(line2[42]) if line2[42] != "<" else "0"
+    number = _repair(line2[0:9], number_check)
+    birth = _checked(_digits(line2[13:19]), birth_check)
+    expiry = _checked(_digits(line2[21:27]), expiry_check)
+    personal = _repair(line2[28:42], personal_check)
+
+    valid = None not in (number, birth, expiry, personal)
+    if valid:
+        composite = number + number_check + birth + birth_check + expiry + expiry_check + personal + personal_check
+        valid = check_digit(composite) == _digits(line2[43])
+
+    personal_value = _filler_to_none(personal) if personal else None
+    fields = {
+        "country_code": country_code if re.fullmatch(r"[A-Z]{3}", country_code) else None,
+        "surname": _filler_to_none(names[0]),
+        "given_names": _filler_to_none(names[1]) if len(names) > 1 else None,
+        "passport_number": _filler_to_none(number) if number else None,
+        "nationality": nationality if re.fullmatch(r"[A-Z]{3}", nationality) else None,
+        "date_of_birth": _mrz_date(birth) if birth else None,
+        "sex": sex if sex in ("M", "F") else None,
+        "date_of_expiry": _mrz_date(expiry, expiry=True) if expiry else None,
+        "personal_number": personal_value.replace(" ", "") if personal_value else None,
+    }
+    return fields, valid
+
+
+def find_td3_lines(text):
+    """The last (line1, line2) pair of MRZ-looking lines in OCR text, preferring a 'P' document line."""
+    lines = [re.sub(r"\s+", "", line).upper() for line in text.splitlines()]
+    # Filler-heavy lines, or long ones with any filler (line 2 may hold only a few '<')
+    lines = [
+        line for line in lines
+        if _MRZ_LINE.fullmatch(line) and (line.count("<") > 5 or (len(line) >= 30 and "<" in line))
+    ]
+    if len(lines) < 2:
+        return None
+    for i in range(len(lines) - 2, -1, -1):
+        if lines[i].startswith("P"):
+            return lines[i], lines[i + 1]
+    return lines[-2], lines[-1]
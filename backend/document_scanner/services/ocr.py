@@ -1,17 +1,28 @@
-
-
 """
 services/ocr.py for document_scanner app
 Provides OCR utilities for extracting text from images and PDFs, and document type detection, using EasyOCR.
+EasyOCR runs in this process, or in the ocr_server worker processes when OCR_SERVICE_ADDRESS is set.
 """
-try:
-    import easyocr
-    EASYOCR_AVAILABLE = True
-except ImportError:
-    EASYOCR_AVAILABLE = False
+import importlib.util
+import io
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .classifier import rank_document_types
+from .ocr_results import OCRResult
+from .parsers import DOCUMENT_PARSERS, FIELD_LABELS, REQUIRED_FIELDS, parse_mrz
+from .ocr_workers import OCRServiceUnavailable, remote_loaded, remote_readtext, remote_readtext_batched, use_service
+from .readers import ReaderPool
+from .timing import annotate, in_scan, timed
+
+# EasyOCR pulls in torch, so only probe for it here; the import itself happens
+# in get_reader() the first time a scan actually needs the model.
+EASYOCR_AVAILABLE = importlib.util.find_spec("easyocr") is not None
 
 try:
-    from pdf2image import convert_from_path
+    from pdf2image import convert_from_path, pdfinfo_from_path
     PDF2IMAGE_AVAILABLE = True
 except ImportError:
     PDF2IMAGE_AVAILABLE = False
@@ -29,93 +40,727 @@ try:
 except ImportError:
     CV2_AVAILABLE = False
 
-# Nepali: 'ne', English: 'en'
-reader = easyocr.Reader(['en']) if EASYOCR_AVAILABLE else None
+# Nepali: 'ne', English: 'en'. OCR_LANGUAGES is read unless the request or document type says otherwise
+OCR_SUPPORTED_LANGUAGES = ('ne', 'en')
+OCR_LANGUAGES = ['en']
+# Documents printed largely in Devanagari; the Nepali model reads their English text too
+DOCUMENT_LANGUAGES = {
+    'citizenship': ('ne', 'en'),
+    'driving_license': ('ne', 'en'),
+}
+# The MRZ is Latin capitals and digits whatever the passport
+MRZ_LANGUAGES = ('en',)
+
+# Bump whenever preprocessing or recognition changes so cached OCR results are not reused
+OCR_PIPELINE_VERSION = "easyocr-en-5"
+
+# "fixed" is the original full-resolution pipeline; "adaptive" measures the image first
+PREPROCESS_MODES = ("fixed", "adaptive")
+DEFAULT_PREPROCESS_MODE = "adaptive"
+
+# Adaptive preprocessing: scale so the median glyph is this tall, never past EasyOCR's
+# default detector canvas, and only denoise as hard as the estimated noise requires.
+TARGET_TEXT_HEIGHT = 32
+MAX_UPSCALE = 2.0
+MAX_LONG_SIDE = 2560
+NOISE_MEDIAN_SIGMA = 4.0
+NOISE_NLM_SIGMA = 12.0
+
+# Uploads are decoded straight to grayscale at the smallest 1/2, 1/4 or 1/8 scale whose longer side
+# is still DECODE_LONG_SIDE or more: the adaptive pipeline never works above MAX_LONG_SIDE, and
+# JPEG decoders produce these scales from the DCT coefficients at a fraction of the time and memory.
+DECODE_LONG_SIDE = MAX_LONG_SIDE
+# EXIF tag saying how a photo must be turned for display; phone cameras rarely store pixels upright
+EXIF_ORIENTATION = 0x0112
 
-def preprocess_image(path):
-    """Preprocess image for OCR: grayscale, binarize, denoise, deskew."""
+# Deskew: skew is searched within +/-DESKEW_MAX_ANGLE degrees on a copy no larger than
+# DESKEW_SAMPLE_SIDE, and the full image is only rotated when it is off by DESKEW_MIN_ANGLE or more.
+DESKEW_SAMPLE_SIDE = 800
+DESKEW_MAX_ANGLE = 15.0
+DESKEW_MIN_ANGLE = 0.5
+
+# Selective re-OCR: a detection where a required field is printed that was read with less than
+# settings.OCR_REOCR_CONFIDENCE is cropped from the page and read again with its text about
+# REOCR_TEXT_HEIGHT tall; at most settings.OCR_REOCR_MAX_REGIONS detections per page.
+DEFAULT_REOCR_CONFIDENCE = 0.6
+DEFAULT_REOCR_MAX_REGIONS = 8
+REOCR_TEXT_HEIGHT = 2 * TARGET_TEXT_HEIGHT
+REOCR_MAX_UPSCALE = 4.0
+
+# Characters that can appear in an ICAO machine-readable zone
+MRZ_ALLOWLIST = "ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789<"
+# The MRZ strip is OCR'd at roughly this height per line, whatever the photo resolution
+MRZ_LINE_HEIGHT = 48
+
+# Longer side of the thumbnail OCR'd to classify an upload of undeclared type before choosing a pipeline
+THUMBNAIL_SIDE = 640
+# A declared document type is only overruled when none of its keywords were read and another
+# type scores at least this much: one strong keyword ("driving licence") or several weaker ones
+MISMATCH_MIN_SCORE = 3
+
+# Upper bound on images (PDF pages, batch uploads) preprocessed/OCR'd at once; also bounds peak memory
+OCR_WORKERS = min(4, os.cpu_count() or 1)
+
+# EasyOCR reader options; benchmark_scan turns both off so it runs offline on the CPU
+OCR_GPU = True
+OCR_DOWNLOAD_MODELS = True
+
+_reader_pool = None
+_reader_pool_lock = threading.Lock()
+
+def resolve_languages(languages=None, document_type=None):
+    """
+    Canonical language tuple for a scan: the requested languages (a list or a comma-separated
+    string), else the document type's default, else OCR_LANGUAGES. Other languages come before
+    'en', in sorted order, so each set maps to one pooled reader. ValueError on an unsupported code.
+    """
+    if isinstance(languages, str):
+        languages = [code for code in languages.replace(' ', '').split(',') if code]
+    if not languages:
+        languages = DOCUMENT_LANGUAGES.get(document_type, OCR_LANGUAGES)
+    codes = {code.lower() for code in languages}
+    unsupported = codes.difference(OCR_SUPPORTED_LANGUAGES)
+    if unsupported:
+        raise ValueError(f"Unsupported OCR language(s): {', '.join(sorted(unsupported))}.")
+    return tuple(sorted(codes - {'en'})) + (('en',) if 'en' in codes else ())
+
+# What easyocr.Reader(detector=True) sets up for text detection: the model, and the network name and
+# functions getDetectorPath() picks for it, which detect() and readtext_batched() call
+DETECTOR_ATTRIBUTES = ('detector', 'detect_network', 'get_textbox', 'get_detector')
+
+def _detector_parts(reader):
+    """{attribute: value} of a reader's text detection set-up, or None if it has none to share."""
+    if not all(hasattr(reader, attribute) for attribute in DETECTOR_ATTRIBUTES):
+        return None
+    return {attribute: getattr(reader, attribute) for attribute in DETECTOR_ATTRIBUTES}
+
+def _load_reader(languages, detector):
+    import easyocr
+    if detector is None:
+        return easyocr.Reader(list(languages), gpu=OCR_GPU, download_enabled=OCR_DOWNLOAD_MODELS)
+    # Text detection does not depend on the language: reuse the CRAFT weights already in memory
+    reader = easyocr.Reader(list(languages), gpu=OCR_GPU, download_enabled=OCR_DOWNLOAD_MODELS, detector=False)
+    for attribute, value in detector.items():
+        setattr(reader, attribute, value)
+    return reader
+
+def get_reader_pool():
+    """Return the process-wide reader pool, holding at most settings.OCR_READER_POOL_SIZE models."""
+    global _reader_pool
+    if _reader_pool is None:
+        from django.conf import settings
+        with _reader_pool_lock:
+            if _reader_pool is None:
+                _reader_pool = ReaderPool(
+                    _load_reader, getattr(settings, 'OCR_READER_POOL_SIZE', 2), detector_of=_detector_parts,
+                )
+    return _reader_pool
+
+def _require_ocr():
+    """Raise ImportError unless OCR can run here or in the OCR service."""
+    if not EASYOCR_AVAILABLE and not use_service():
+        raise ImportError("EasyOCR is not installed. Please install it to use OCR features.")
+
+def get_reader(languages=None):
+    """Return the EasyOCR reader for a language set (OCR_LANGUAGES by default), loading the model on first use."""
+    if not EASYOCR_AVAILABLE:
+        raise ImportError("EasyOCR is not installed. Please install it to use OCR features.")
+    return get_reader_pool().get(resolve_languages(languages))
+
+def is_reader_ready(languages=None):
+    """True once the reader for this language set (any set if None) has been loaded here, or in the OCR service."""
+    if use_service():
+        loaded = [tuple(languages) for languages in remote_loaded() or ()]
+    else:
+        loaded = get_reader_pool().loaded()
+    return bool(loaded) if languages is None else resolve_languages(languages) in loaded
+
+def warm_up_reader(languages=None):
+    """Load the EasyOCR model for a language set (OCR_LANGUAGES by default) ahead of the first scan."""
+    get_reader(languages)
+
+def _read_header(source):
+    """(width, height, EXIF orientation) from an encoded image's header alone, or None if PIL cannot read it."""
+    if not PIL_AVAILABLE:
+        return None
+    try:
+        with Image.open(io.BytesIO(source) if isinstance(source, (bytes, bytearray, memoryview)) else source) as image:
+            # Only EXIF found in the header: getexif() would otherwise decode a whole PNG to look for it
+            orientation = image.getexif().get(EXIF_ORIENTATION, 1) if 'exif' in image.info else 1
+            return image.width, image.height, orientation
+    except Exception:
+        return None
+
+def decode_factor(width, height, long_side=DECODE_LONG_SIDE):
+    """The largest of 1, 2, 4 and 8 that keeps the longer side at long_side or more."""
+    factor = 1
+    while factor < 8 and max(width, height) // (factor * 2) >= long_side:
+        factor *= 2
+    return factor
+
+def _orient(gray, orientation):
+    """Turn decoded pixels the way an EXIF orientation tag (1-8) says they are displayed."""
+    if orientation == 2:
+        return cv2.flip(gray, 1)
+    if orientation == 3:
+        return cv2.rotate(gray, cv2.ROTATE_180)
+    if orientation == 4:
+        return cv2.flip(gray, 0)
+    if orientation == 5:
+        return cv2.transpose(gray)
+    if orientation == 6:
+        return cv2.rotate(gray, cv2.ROTATE_90_CLOCKWISE)
+    if orientation == 7:
+        return cv2.rotate(cv2.transpose(gray), cv2.ROTATE_180)
+    if orientation == 8:
+        return cv2.rotate(gray, cv2.ROTATE_90_COUNTERCLOCKWISE)
+    return gray
+
+def load_image(source, long_side=DECODE_LONG_SIDE):
+    """
+    Decode an image into a grayscale NumPy array, upright as its EXIF orientation says, without
+    touching the filesystem beyond the read. Accepts a file path, raw encoded bytes, a PIL image
+    or an already decoded array. Encoded images are decoded at a reduced scale when their header
+    says they are much larger than long_side (see decode_factor()); None decodes at full size.
+    """
     if not CV2_AVAILABLE:
         raise ImportError("OpenCV is not installed. Please install it to use OCR features.")
-    img = cv2.imread(path)
+    if isinstance(source, np.ndarray):
+        return source
+    if PIL_AVAILABLE and isinstance(source, Image.Image):
+        # Grayscale is all the pipeline needs, so skip the RGB->BGR copy
+        return np.asarray(source.convert('L'))
+    with timed("decode"):
+        if not isinstance(source, (bytes, bytearray, memoryview)):
+            source = str(source)
+        header = _read_header(source)
+        if header is None:
+            # Unknown size: let OpenCV read it whole, orientation included
+            factor, orientation, flags = 1, 1, cv2.IMREAD_GRAYSCALE
+        else:
+            width, height, orientation = header
+            factor = decode_factor(width, height, long_side) if long_side else 1
+            flags = {
+                1: cv2.IMREAD_GRAYSCALE,
+                2: cv2.IMREAD_REDUCED_GRAYSCALE_2,
+                4: cv2.IMREAD_REDUCED_GRAYSCALE_4,
+                8: cv2.IMREAD_REDUCED_GRAYSCALE_8,
+            }[factor] | cv2.IMREAD_IGNORE_ORIENTATION
+        if isinstance(source, str):
+            img = cv2.imread(source, flags)
+        else:
+            img = cv2.imdecode(np.frombuffer(source, dtype=np.uint8), flags)
+        if img is not None:
+            # Applied here rather than left to OpenCV, whose imdecode has not always honoured it
+            img = _orient(img, orientation)
     if img is None:
         raise ValueError("Image not found or unreadable.")
-    gray = cv2.cvtColor(img, cv2.COLOR_BGR2GRAY)
+    annotate(width=img.shape[1] * factor, height=img.shape[0] * factor, decode_factor=factor)
+    return img
+
+def _to_gray(img):
+    return cv2.cvtColor(img, cv2.COLOR_BGR2GRAY) if img.ndim == 3 else img
+
+def _downsample(gray, long_side):
+    """Return a copy of gray whose longer side is at most long_side, and the scale applied."""
+    scale = min(1.0, long_side / max(gray.shape[:2]))
+    if scale == 1.0:
+        return gray, scale
+    return cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA), scale
+
+def estimate_noise(gray):
+    """
+    Estimate the standard deviation of additive noise in a grayscale image.
+    Uses the median absolute Laplacian response (robust to text edges) on a strided
+    subsample; averaging down would smooth away the very noise being measured.
+    """
+    step = max(1, int(np.ceil(max(gray.shape[:2]) / 1024)))
+    sample = gray[::step, ::step]
+    kernel = np.array([[1, -2, 1], [-2, 4, -2], [1, -2, 1]], dtype=np.float32)
+    response = cv2.filter2D(sample.astype(np.float32), -1, kernel)[1:-1, 1:-1]
+    # The kernel's L2 norm is 6; 0.6745 converts MAD to sigma for Gaussian noise
+    return float(np.median(np.abs(response)) / (0.6745 * 6))
+
+def estimate_text_height(gray):
+    """Median height in pixels of glyph-sized connected components, or None if too few are found."""
+    sample, scale = _downsample(gray, 1024)
+    _, binary = cv2.threshold(sample, 0, 255, cv2.THRESH_BINARY_INV | cv2.THRESH_OTSU)
+    count, _, stats, _ = cv2.connectedComponentsWithStats(binary, connectivity=8)
+    h, w = sample.shape
+    heights = stats[1:, cv2.CC_STAT_HEIGHT]
+    widths = stats[1:, cv2.CC_STAT_WIDTH]
+    areas = stats[1:, cv2.CC_STAT_AREA]
+    glyphs = (heights >= 3) & (heights < h / 4) & (widths < w / 4) & (areas >= 6) & (widths < heights * 5)
+    if np.count_nonzero(glyphs) < 10:
+        return None
+    return float(np.median(heights[glyphs])) / scale
+
+def _profile_sharpness(ys, xs, angle):
+    """Sum of squared row counts after rotating ink coordinates by angle; peaks when text lines are level."""
+    theta = np.deg2rad(angle)
+    rows = np.round(ys * np.cos(theta) - xs * np.sin(theta)).astype(np.int64)
+    counts = np.bincount(rows - rows.min())
+    return float(np.dot(counts, counts))
+
+def estimate_skew(binary):
+    """
+    Estimate text skew in degrees (in cv2.getRotationMatrix2D's convention) with a projection profile.
+    Works on a downsampled copy, so the cost does not grow with the input resolution.
+    """
+    sample, _ = _downsample(binary, DESKEW_SAMPLE_SIDE)
+    ink = sample < 128
+    if np.count_nonzero(ink) > ink.size // 2:
+        # White-on-dark binarisation: ink is the minority class
+        ink = ~ink
+    ys, xs = np.nonzero(ink)
+    if len(ys) < 50:
+        return 0.0
+    ys = ys.astype(np.float32)
+    xs = xs.astype(np.float32)
+    coarse = np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + 0.5, 1.0)
+    best = max(coarse, key=lambda a: _profile_sharpness(ys, xs, a))
+    fine = np.arange(best - 1.0, best + 1.05, 0.1)
+    return float(max(fine, key=lambda a: _profile_sharpness(ys, xs, a)))
+
+def _deskew(binary):
+    """
+    Rotate a binarised image so its text lines are level, if they are noticeably skewed.
+    Returns the image and the 2x3 rotation matrix applied (the identity if it was not rotated).
+    """
+    angle = estimate_skew(binary)
+    if abs(angle) < DESKEW_MIN_ANGLE:
+        return binary, np.eye(2, 3)
+    (h, w) = binary.shape
+    M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
+    return cv2.warpAffine(binary, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE), M
+
+def _preprocess_fixed(gray):
+    """
+    Original pipeline: Otsu binarisation, heavy NL-means denoise and deskew at full resolution.
+    Returns the image and the 2x3 affine matrix from page to image coordinates.
+    """
     # Binarization
     _, thresh = cv2.threshold(gray, 127, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
     # Denoising
     denoised = cv2.fastNlMeansDenoising(thresh, None, 30, 7, 21)
     # Deskew (optional, simple)
-    coords = np.column_stack(np.where(denoised > 0))
-    angle = cv2.minAreaRect(coords)[-1]
-    if angle < -45:
-        angle = -(90 + angle)
+    return _deskew(denoised)
+
+def _preprocess_adaptive(gray):
+    """
+    Normalise resolution to the text size, denoise only as needed (before binarising), then deskew.
+    Returns the image and the 2x3 affine matrix from page to image coordinates.
+    """
+    text_height = estimate_text_height(gray)
+    scale = min(TARGET_TEXT_HEIGHT / text_height, MAX_UPSCALE) if text_height else 1.0
+    scale = min(scale, MAX_LONG_SIDE / max(gray.shape[:2]))
+    if abs(scale - 1.0) > 0.1:
+        interpolation = cv2.INTER_AREA if scale < 1.0 else cv2.INTER_CUBIC
+        gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=interpolation)
     else:
-        angle = -angle
-    (h, w) = denoised.shape
-    M = cv2.getRotationMatrix2D((w // 2, h // 2), angle, 1.0)
-    deskewed = cv2.warpAffine(denoised, M, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
-    return deskewed
+        scale = 1.0
+
+    sigma = estimate_noise(gray)
+    if sigma >= NOISE_NLM_SIGMA:
+        # A smaller search window than the fixed pipeline: ~4x cheaper, and enough once text is normalised
+        gray = cv2.fastNlMeansDenoising(gray, None, min(sigma * 1.5, 30), 7, 11)
+    elif sigma >= NOISE_MEDIAN_SIGMA:
+        gray = cv2.medianBlur(gray, 3)
+
+    _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    deskewed, rotation = _deskew(thresh)
+    return deskewed, rotation @ np.diag([scale, scale, 1.0])
+
+def preprocess_image(image, mode=DEFAULT_PREPROCESS_MODE, with_transform=False):
+    """
+    Preprocess image for OCR: grayscale, binarize, denoise, deskew. Accepts anything load_image() does.
+    mode is "adaptive" (scale to text size, denoise by estimated noise) or the original "fixed" pipeline.
+    with_transform returns (image, 2x3 affine matrix mapping page coordinates onto it) instead.
+    """
+    if mode not in PREPROCESS_MODES:
+        raise ValueError(f"Unknown preprocessing mode: {mode}")
+    # The fixed pipeline is the full-resolution reference, so it decodes at full size
+    gray = _to_gray(load_image(image, long_side=None if mode == "fixed" else DECODE_LONG_SIDE))
+    if mode == "fixed":
+        processed, transform = _preprocess_fixed(gray)
+    else:
+        processed, transform = _preprocess_adaptive(gray)
+    return (processed, transform) if with_transform else processed
+
+def _result_text(result):
+    """Join the text of EasyOCR readtext() results, one detection per line."""
+    text_lines = []
+    for item in result:
+        if isinstance(item, (list, tuple)) and len(item) > 1 and isinstance(item[1], str):
+            text_lines.append(item[1])
+        elif isinstance(item, dict) and 'text' in item and isinstance(item['text'], str):
+            text_lines.append(item['text'])
+    return '\n'.join(text_lines)
+
+def _readtext(image, languages=None, **kwargs):
+    """
+    reader.readtext() split into its detection and recognition passes, so each is timed as a stage.
+    With OCR_SERVICE_ADDRESS set, both run in an OCR worker process instead.
+    """
+    if use_service():
+        return remote_readtext(image, resolve_languages(languages), **kwargs)
+    reader = get_reader(languages)
+    with timed("detection"):
+        horizontal_list, free_list = reader.detect(image)
+    with timed("recognition"):
+        return reader.recognize(image, horizontal_list[0], free_list[0], **kwargs)
+
+def ocr_result(image, languages=None):
+    """Preprocess a decoded image and OCR it, keeping each detection's page box and confidence."""
+    with timed("preprocess"):
+        processed, transform = preprocess_image(image, with_transform=True)
+    return OCRResult.from_easyocr(_readtext(processed, languages), transform)
+
+def ocr_array(image, languages=None):
+    """Preprocess a decoded image and run EasyOCR on the resulting array."""
+    return ocr_result(image, languages).text
+
+def _reocr_region(gray, box, languages=None):
+    """
+    Read one detection again from the grayscale page, upscaled further than the full-page pass
+    and with local contrast equalisation in place of a global threshold, which drops faint strokes.
+    Returns (text, confidence), or None if nothing was read.
+    """
+    x0, y0, x1, y1 = (float(v) for v in box)
+    pad = 0.3 * (y1 - y0)
+    h, w = gray.shape
+    left, top = max(0, int(x0 - pad)), max(0, int(y0 - pad))
+    right, bottom = min(w, int(np.ceil(x1 + pad))), min(h, int(np.ceil(y1 + pad)))
+    if right - left < 2 or bottom - top < 2:
+        return None
+    with timed("preprocess"):
+        crop = gray[top:bottom, left:right]
+        scale = min(REOCR_TEXT_HEIGHT / max(y1 - y0, 1.0), REOCR_MAX_UPSCALE)
+        if scale > 1.0:
+            crop = cv2.resize(crop, None, fx=scale, fy=scale, interpolation=cv2.INTER_CUBIC)
+        crop = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(4, 4)).apply(crop)
+        # Smooths paper texture without softening stroke edges
+        crop = cv2.bilateralFilter(crop, 5, 40, 5)
+    detections = [item for item in _readtext(crop, languages) if item[1].strip()]
+    if not detections:
+        return None
+    detections.sort(key=lambda item: min(point[0] for point in item[0]))
+    # Weighted by length, so a stray one-character detection cannot carry the score
+    confidence = np.average([item[2] for item in detections], weights=[len(item[1]) for item in detections])
+    return ' '.join(item[1] for item in detections), float(confidence)
+
+def refine_weak_fields(result, image, document_type, languages=None):
+    """
+    Selective re-OCR of an OCRResult of `image`: only the low-confidence detections where one of
+    the document type's REQUIRED_FIELDS is printed are read again (see _reocr_region()), and a
+    reading replaces the original when it is more confident. A field is located by its parsed
+    value, or next to its label when the value is missing. Returns result, updated in place.
+    """
+    from django.conf import settings
+    threshold = getattr(settings, 'OCR_REOCR_CONFIDENCE', DEFAULT_REOCR_CONFIDENCE)
+    limit = getattr(settings, 'OCR_REOCR_MAX_REGIONS', DEFAULT_REOCR_MAX_REGIONS)
+    required = REQUIRED_FIELDS.get(document_type, ())
+    weak = set(result.weak(threshold)) if threshold else set()
+    if not (weak and required and limit):
+        return result
+
+    data = DOCUMENT_PARSERS[document_type](result.text)
+    labels = FIELD_LABELS.get(document_type, {})
+    targets = set()
+    for field in required:
+        indexes = result.find(data[field]) if data.get(field) else []
+        if not indexes:
+            # Missing, or normalised past recognition: look where the field's label is printed
+            indexes = [
+                near
+                for index, text in enumerate(result.texts)
+                if any(pattern.search(text) for pattern in labels.get(field, ()))
+                for near in result.near(index)
+            ]
+        targets.update(weak.intersection(indexes))
+    targets = sorted(targets, key=lambda index: result.confidence[index])[:limit]
+    if not targets:
+        return result
+
+    gray = _to_gray(load_image(image))
+    for index in targets:
+        reading = _reocr_region(gray, result.boxes[index], languages)
+        if reading and reading[1] > result.confidence[index]:
+            result.replace(index, *reading)
+    annotate(reocr_regions=len(targets), reocr_improved=len(result.revised))
+    return result
+
+def extract_text_from_image(source, languages=None):
+    """Extract text from an image (path or bytes) using EasyOCR after preprocessing, entirely in memory."""
+    try:
+        _require_ocr()
+        return ocr_array(load_image(source), languages)
+    except Exception as e:
+        raise ValueError(f"Failed to process image: {e}")
+
+def _pad_to(image, height, width):
+    """Pad a binarised image on the bottom/right with background so it fills height x width."""
+    h, w = image.shape[:2]
+    return cv2.copyMakeBorder(image, 0, height - h, 0, width - w, cv2.BORDER_CONSTANT, value=255)
+
+def _preprocess_or_error(source):
+    try:
+        image = load_image(source)
+        with timed("preprocess"):
+            return preprocess_image(image)
+    except Exception as e:
+        return e
 
-def extract_text_from_image(path):
-    """Extract text from an image file using EasyOCR after preprocessing."""
+def extract_text_batch(sources, batch_size=8, max_workers=None, languages=None):
+    """
+    Extract text from several images with a single batched EasyOCR call, all read in one language set.
+    Images are preprocessed in parallel, padded to a common size and passed to
+    readtext_batched. Returns a list aligned with sources holding either the
+    text of that image or the exception that stopped it.
+    """
+    _require_ocr()
+    if not sources:
+        return []
+    workers = max(1, min(max_workers or OCR_WORKERS, len(sources)))
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="batch-ocr") as pool:
+        results = list(pool.map(in_scan(_preprocess_or_error), sources))
+
+    ready = [i for i, item in enumerate(results) if not isinstance(item, Exception)]
+    if ready:
+        height = max(results[i].shape[0] for i in ready)
+        width = max(results[i].shape[1] for i in ready)
+        batch = [_pad_to(results[i], height, width) for i in ready]
+        try:
+            if use_service():
+                outputs = remote_readtext_batched(batch, resolve_languages(languages), batch_size)
+            else:
+                reader = get_reader(languages)
+                with timed("recognition"):
+                    outputs = reader.readtext_batched(batch, batch_size=batch_size)
+        except Exception as e:
+            outputs = [e] * len(ready)
+        for i, output in zip(ready, outputs):
+            results[i] = output if isinstance(output, Exception) else _result_text(output)
+    return results
+
+def find_mrz_band(gray):
+    """
+    Locate a passport's machine-readable zone: two dense lines of text spanning most of the
+    page width in its lower half. Returns (x, y, w, h) in gray's coordinates, or None.
+    """
+    sample, scale = _downsample(gray, 800)
+    h, w = sample.shape
+    sample = cv2.GaussianBlur(sample, (3, 3), 0)
+    line_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (13, 5))
+    block_kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (21, 21))
+    # Dark characters on a light background, then horizontal gradients to favour text rows
+    blackhat = cv2.morphologyEx(sample, cv2.MORPH_BLACKHAT, line_kernel)
+    grad = np.absolute(cv2.Sobel(blackhat, cv2.CV_32F, 1, 0, ksize=-1))
+    grad = cv2.normalize(grad, None, 0, 255, cv2.NORM_MINMAX).astype(np.uint8)
+    grad = cv2.morphologyEx(grad, cv2.MORPH_CLOSE, line_kernel)
+    _, thresh = cv2.threshold(grad, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    # Merge the two MRZ lines into one block and drop thin noise
+    thresh = cv2.morphologyEx(thresh, cv2.MORPH_CLOSE, block_kernel)
+    thresh = cv2.erode(thresh, None, iterations=2)
+    contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    for contour in sorted(contours, key=cv2.contourArea, reverse=True):
+        x, y, cw, ch = cv2.boundingRect(contour)
+        if cw > 0.6 * w and cw > 5 * ch and y + ch / 2 > h / 2:
+            pad_x, pad_y = int(0.03 * w), int(0.3 * ch)
+            x0, y0 = max(0, x - pad_x), max(0, y - pad_y)
+            x1, y1 = min(w, x + cw + pad_x), min(h, y + ch + pad_y)
+            return (int(x0 / scale), int(y0 / scale), int((x1 - x0) / scale), int((y1 - y0) / scale))
+    return None
+
+def _join_lines(result):
+    """Group EasyOCR detections into text lines by vertical position, left to right within a line."""
+    boxes = []
+    for box, text, _ in result:
+        ys = [point[1] for point in box]
+        boxes.append(((min(ys) + max(ys)) / 2, max(ys) - min(ys), min(point[0] for point in box), text))
+    boxes.sort()
+    lines = []
+    for center, height, left, text in boxes:
+        if lines and abs(center - lines[-1][0]) < height / 2:
+            lines[-1][1].append((left, text))
+        else:
+            lines.append((center, [(left, text)]))
+    return '\n'.join(''.join(text for _, text in sorted(parts)).replace(' ', '') for _, parts in lines)
+
+def read_mrz(image):
+    """OCR only the MRZ strip of a passport image with an MRZ character allowlist. Returns '' if no band is found."""
+    gray = _to_gray(load_image(image))
+    with timed("preprocess"):
+        band = find_mrz_band(gray)
+        if band is None:
+            return ''
+        x, y, w, h = band
+        strip = gray[y:y + h, x:x + w]
+        # The band holds two lines plus spacing and padding, about 3.2 line heights
+        scale = min(MAX_UPSCALE, 3.2 * MRZ_LINE_HEIGHT / max(h, 1))
+        strip = cv2.resize(strip, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA if scale < 1 else cv2.INTER_CUBIC)
+        _, strip = cv2.threshold(strip, 0, 255, cv2.THRESH_BINARY | cv2.THRESH_OTSU)
+    return _join_lines(_readtext(strip, MRZ_LANGUAGES, allowlist=MRZ_ALLOWLIST))
+
+def _valid_mrz_text(image):
+    """MRZ strip text if the strip decodes as a passport MRZ with every check digit valid, else None."""
+    mrz_text = read_mrz(image)
+    if mrz_text and parse_mrz(mrz_text).get("valid"):
+        return mrz_text
+    return None
+
+def extract_passport_text(source, languages=None):
+    """
+    Passport fast path: OCR just the MRZ strip and return it if it parses,
+    otherwise fall back to full-page OCR.
+    """
     try:
-        if not EASYOCR_AVAILABLE:
-            raise ImportError("EasyOCR is not installed. Please install it to use OCR features.")
-        processed = preprocess_image(path)
-        temp_path = path + "_processed.png"
-        cv2.imwrite(temp_path, processed)
-        result = reader.readtext(temp_path)
-        text_lines = []
-        for item in result:
-            if isinstance(item, (list, tuple)) and len(item) > 1 and isinstance(item[1], str):
-                text_lines.append(item[1])
-            elif isinstance(item, dict) and 'text' in item and isinstance(item['text'], str):
-                text_lines.append(item['text'])
-        text = '\n'.join(text_lines)
-        return text
+        _require_ocr()
+        image = load_image(source)
+        return _valid_mrz_text(image) or ocr_array(image, languages)
     except Exception as e:
         raise ValueError(f"Failed to process image: {e}")
 
-def extract_text_from_pdf(path):
-    """Extract text from a PDF file by converting each page to image and running OCR with EasyOCR."""
+class DocumentTypeMismatch(ValueError):
+    """Raised when the OCR text clearly shows an upload is not the declared document type."""
+
+    def __init__(self, declared_type, detected_type):
+        self.declared_type = declared_type
+        self.detected_type = detected_type
+        super().__init__(f"Uploaded document looks like {detected_type}, not {declared_type}.")
+
+def _thumbnail_text(image, languages=None):
+    """OCR text of a low-resolution thumbnail: enough for headings and keywords, at a fraction of the cost."""
+    image = load_image(image)
+    with timed("preprocess"):
+        thumbnail, _ = _downsample(_to_gray(image), THUMBNAIL_SIDE)
+    return _result_text(_readtext(thumbnail, languages))
+
+def classify_image(image, languages=None):
+    """Cheap first stage for undeclared uploads: OCR a low-resolution thumbnail and classify it by its keywords."""
+    return detect_document_type(_thumbnail_text(image, languages))
+
+def screen_document_type(image, declared_type, languages=None):
+    """
+    Cheap first stage for declared uploads: raise DocumentTypeMismatch if a thumbnail already reads
+    clearly as another type (see check_document_type()), before the page is read at full resolution.
+    """
+    check_document_type(_thumbnail_text(image, languages), declared_type)
+
+def check_document_type(text, declared_type):
+    """
+    Compare the declared document type with the keywords in OCR text. Returns the other type the
+    text reads more like, to report as a warning, or None. Raises DocumentTypeMismatch only when
+    none of the declared type's keywords were read and another type scores MISMATCH_MIN_SCORE or more.
+    """
+    ranked = rank_document_types(text)
+    if not ranked:
+        return None
+    detected_type, score = ranked[0]
+    declared_score = dict(ranked).get(declared_type, 0)
+    if declared_score == 0 and score >= MISMATCH_MIN_SCORE:
+        raise DocumentTypeMismatch(declared_type, detected_type)
+    # A tie is no evidence against the declared type; rank order alone would break it arbitrarily
+    return detected_type if score > declared_score else None
+
+def pipeline_version(document_type, languages=None):
+    """Cache version for OCR text produced by extract_document_text() for this document type and languages."""
+    languages = resolve_languages(languages, document_type)
+    version = OCR_PIPELINE_VERSION
+    if languages != ("en",):
+        version = f"{version}+{'-'.join(languages)}"
+    if document_type == "passport":
+        # Passport text may be just the MRZ strip, which is no use to other parsers
+        version = f"{version}+mrz"
+    return version
+
+def read_document(source, document_type, languages=None):
+    """
+    Run the cheapest OCR pipeline that serves the given document type and return its OCRResult.
+    An upload of undeclared type (None) is classified from a thumbnail to choose its pipeline.
+    A passport whose MRZ parses is returned from the MRZ strip alone. Otherwise a declared type
+    is checked on a thumbnail before the full-resolution pass and again on the page text, and
+    DocumentTypeMismatch is raised when either clearly belongs to another type (see
+    check_document_type()); weak reads of required fields are then read again (see
+    refine_weak_fields()).
+    Text is read in `languages`, by default the document type's (see resolve_languages()).
+    OCRServiceUnavailable passes through so callers can tell a busy OCR service from a bad image.
+    """
+    try:
+        _require_ocr()
+        languages = resolve_languages(languages, document_type)
+        image = load_image(source)
+        annotate(pages=1)
+        declared_type = document_type
+        if document_type is None:
+            document_type = classify_image(image, languages)
+        if document_type == "passport":
+            mrz_text = _valid_mrz_text(image)
+            if mrz_text:
+                # Every check digit matched, which is worth more than the recogniser's own score
+                return OCRResult.from_text(mrz_text)
+        if declared_type is not None:
+            # A wrong document is turned away before the expensive full-resolution pass
+            screen_document_type(image, declared_type, languages)
+        result = ocr_result(image, languages)
+        if declared_type is not None:
+            check_document_type(result.text, declared_type)
+        return refine_weak_fields(result, image, document_type, languages)
+    except (DocumentTypeMismatch, OCRServiceUnavailable):
+        raise
+    except Exception as e:
+        raise ValueError(f"Failed to process image: {e}")
+
+def extract_document_text(source, document_type, languages=None):
+    """The text of read_document(), one detection per line."""
+    return read_document(source, document_type, languages).text
+
+def _ocr_pdf_page(path, page_number, languages=None):
+    """Rasterise a single PDF page and OCR it."""
+    pages = convert_from_path(path, first_page=page_number, last_page=page_number, thread_count=1)
+    return ocr_array(load_image(pages[0]), languages) if pages else ''
+
+def iter_pdf_pages(path, max_workers=None, languages=None):
+    """
+    Yield the OCR text of each PDF page, in page order, as soon as it is ready.
+    Pages are rasterised one at a time and at most max_workers are in flight,
+    so memory stays at a handful of pages regardless of document length.
+    """
+    page_count = pdfinfo_from_path(path).get("Pages", 0)
+    annotate(pages=page_count)
+    if not page_count:
+        return
+    workers = max(1, min(max_workers or OCR_WORKERS, page_count))
+    ocr_page = in_scan(_ocr_pdf_page)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-ocr") as pool:
+        pending = deque()
+        next_page = 1
+        try:
+            while next_page <= page_count and len(pending) < workers:
+                pending.append(pool.submit(ocr_page, path, next_page, languages))
+                next_page += 1
+            while pending:
+                text = pending.popleft().result()
+                # Keep the pool full while the caller consumes this page
+                if next_page <= page_count:
+                    pending.append(pool.submit(ocr_page, path, next_page, languages))
+                    next_page += 1
+                yield text
+        finally:
+            for future in pending:
+                future.cancel()
+
+def extract_text_from_pdf(path, max_workers=None, languages=None):
+    """Extract text from a PDF file by rasterising pages one at a time and running OCR over a bounded worker pool."""
     try:
-        if not EASYOCR_AVAILABLE:
-            raise ImportError("EasyOCR is not installed. Please install it to use OCR features.")
+        _require_ocr()
         if not PDF2IMAGE_AVAILABLE:
             raise ImportError("pdf2image is not installed. Please install it to process PDFs.")
-        images = convert_from_path(path)
-        all_text = []
-        for i, img in enumerate(images):
-            img_path = f"{path}_page_{i}.png"
-            img.save(img_path)
-            processed = preprocess_image(img_path)
-            temp_path = img_path + "_processed.png"
-            cv2.imwrite(temp_path, processed)
-            result = reader.readtext(temp_path)
-            text_lines = []
-            for item in result:
-                if isinstance(item, (list, tuple)) and len(item) > 1 and isinstance(item[1], str):
-                    text_lines.append(item[1])
-                elif isinstance(item, dict) and 'text' in item and isinstance(item['text'], str):
-                    text_lines.append(item['text'])
-            all_text.append('\n'.join(text_lines))
-        text = '\n'.join(all_text)
-        return text
+        return '\n'.join(iter_pdf_pages(path, max_workers=max_workers, languages=languages))
     except Exception as e:
         raise ValueError(f"Failed to process PDF: {e}")
 
 def detect_document_type(text):
-    """Detect document type based on keywords in the text."""
-    text_lower = text.lower()
-    if "citizenship" in text_lower or "nagrita" in text_lower:
-        return "citizenship"
-    elif "passport" in text_lower:
-        return "passport"
-    elif "driving licence" in text_lower or "driving license" in text_lower:
-        return "driving_license"
-    elif "birth certificate" in text_lower:
-        return "birth_certificate"
-    elif "national id" in text_lower or "nid" in text_lower:
-        return "nid"
-    else:
-        return "unknown"
+    """Detect document type based on keywords in the text; the best-scoring type or "unknown"."""
+    ranked = rank_document_types(text)
+    return ranked[0][0] if ranked else "unknown"
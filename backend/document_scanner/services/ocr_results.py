@@ -0,0 +1,118 @@
+"""
+services/ocr_results.py for document_scanner app
+OCR output kept as parallel arrays: one axis-aligned box, text and confidence per detection.
+Boxes are in the coordinates of the decoded page, so a weak detection can be cropped and read
+again without OCR'ing the page twice.
+"""
+import numpy as np
+
+
+class OCRResult:
+    """
+    Detections of one page, in reading order. boxes is an (n, 4) float32 array of
+    [x0, y0, x1, y1] page coordinates and confidence an (n,) float32 array in [0, 1].
+    """
+
+    def __init__(self, boxes, texts, confidence):
+        self.boxes = np.asarray(boxes, dtype=np.float32).reshape(-1, 4)
+        self.texts = list(texts)
+        self.confidence = np.asarray(confidence, dtype=np.float32).reshape(-1)
+        if not len(self.boxes) == len(self.texts) == len(self.confidence):
+            raise ValueError("OCR result boxes, texts and confidences must have the same length.")
+        # Replaced detections, {index: confidence before}
+        self.revised = {}
+
+    @classmethod
+    def from_easyocr(cls, result, transform=None):
+        """
+        Build from readtext()/recognize() output, [(four corner points, text, confidence), ...].
+        transform is the 2x3 affine matrix that mapped the page onto the image that was read;
+        corners are mapped back through its inverse.
+        """
+        items = [item for item in result if isinstance(item, (list, tuple)) and len(item) > 2]
+        if not items:
+            return cls.empty()
+        corners = np.array([np.asarray(item[0], dtype=np.float32).reshape(4, 2) for item in items])
+        if transform is not None:
+            inverse = np.linalg.inv(np.vstack([np.asarray(transform, dtype=np.float32), [0, 0, 1]]))[:2]
+            corners = corners @ inverse[:, :2].T + inverse[:, 2]
+        boxes = np.concatenate([corners.min(axis=1), corners.max(axis=1)], axis=1)
+        return cls(boxes, [item[1] for item in items], [float(item[2]) for item in items])
+
+    @classmethod
+    def from_text(cls, text, confidence=1.0):
+        """Lines of text with no position, e.g. an MRZ whose check digits already vouch for it."""
+        lines = text.split('\n') if text else []
+        return cls(np.zeros((len(lines), 4)), lines, [confidence] * len(lines))
+
+    @classmethod
+    def empty(cls):
+        return cls(np.zeros((0, 4)), [], [])
+
+    def __len__(self):
+        return len(self.texts)
+
+    @property
+    def text(self):
+        """The detections one per line, the form parsers read."""
+        return '\n'.join(self.texts)
+
+    def weak(self, threshold):
+        """Indexes of the detections read with confidence below threshold, least confident first."""
+        indexes = np.flatnonzero(self.confidence < threshold)
+        return indexes[np.argsort(self.confidence[indexes], kind='stable')].tolist()
+
+    def find(self, value):
+        """Indexes of the detections holding part of value, or all of it (after a label, say)."""
+        needle = _squash(value)
+        if not needle:
+            return []
+        found = []
+        for index, text in enumerate(self.texts):
+            text = _squash(text)
+            # Very short values ("M") only count where they end a detection, not anywhere inside one
+            if text and (text.endswith(needle) or (len(needle) >= 3 and needle in text) or (len(text) >= 3 and text in needle)):
+                found.append(index)
+        return found
+
+    def near(self, index):
+        """
+        Where a label's value is printed: the detection itself, the ones after it on the same
+        line and the closest one below it that overlaps it horizontally.
+        """
+        x0, y0, x1, y1 = self.boxes[index]
+        height = max(y1 - y0, 1.0)
+        centers = (self.boxes[:, 1] + self.boxes[:, 3]) / 2
+        same_line = np.abs(centers - (y0 + y1) / 2) < height / 2
+        right = np.flatnonzero(same_line & (self.boxes[:, 0] >= x0))
+        below = np.flatnonzero(
+            (self.boxes[:, 1] >= y1 - height / 2) & (self.boxes[:, 1] < y1 + 1.5 * height)
+            & (self.boxes[:, 0] < x1) & (self.boxes[:, 2] > x0)
+        )
+        indexes = set(right.tolist()) | {index}
+        if len(below):
+            indexes.add(int(below[np.argmin(self.boxes[below, 1])]))
+        return sorted(indexes)
+
+    def replace(self, index, text, confidence):
+        """Swap in a better reading of one detection; its box stays the same."""
+        self.revised.setdefault(index, float(self.confidence[index]))
+        self.texts[index] = text
+        self.confidence[index] = confidence
+
+    def field_confidence(self, data):
+        """
+        {field: confidence} for each parsed value: the lowest confidence among the detections
+        holding it, or None when its text was normalised past recognition (e.g. a reformatted date).
+        """
+        scores = {}
+        for field, value in data.items():
+            if not isinstance(value, str) or not value:
+                continue
+            indexes = self.find(value)
+            scores[field] = round(float(self.confidence[indexes].min()), 3) if indexes else None
+        return scores
+
+
+def _squash(text):
+    return ''.join(str(text).split()).casefold()
@@ -0,0 +1,253 @@
+"""
+services/ocr_workers.py for document_scanner app
+Out-of-process OCR. The ocr_server command starts a fixed pool of processes that hold the
+EasyOCR models. Web processes write each preprocessed image into a multiprocessing.shared_memory
+block and send only its name, shape and dtype over a multiprocessing.connection socket; the
+worker maps the block, runs detection and recognition on it in place and sends back the results.
+Model memory is then set by the number of OCR workers, not by how many web workers there are.
+"""
+import hashlib
+import logging
+import os
+import signal
+import sys
+import time
+from multiprocessing import connection, get_context, resource_tracker, shared_memory
+
+import numpy as np
+from django.conf import settings
+
+from .timing import collect_timings, record_stage
+
+logger = logging.getLogger(__name__)
+
+# Set in OCR worker processes, which must run OCR themselves rather than call the service
+SERVING = False
+
+# Seconds a web process waits for an OCR worker to take its request, and again for the reply
+DEFAULT_SERVICE_TIMEOUT = 60
+# The same for a readiness ping, which only reports status and must not hold a web worker
+DEFAULT_PING_TIMEOUT = 1
+
+
+class OCRServiceUnavailable(ValueError):
+    """Raised when OCR_SERVICE_ADDRESS is set but no OCR worker answers there in time."""
+
+
+def parse_address(address):
+    """A Unix socket path as is, "host:port" as a (host, port) tuple."""
+    if ':' in address and not address.startswith('/'):
+        host, port = address.rsplit(':', 1)
+        return host, int(port)
+    return address
+
+
+def service_address():
+    """Address of the OCR service from settings.OCR_SERVICE_ADDRESS; None runs OCR in-process."""
+    address = getattr(settings, 'OCR_SERVICE_ADDRESS', None)
+    return parse_address(address) if address else None
+
+
+def use_service():
+    return not SERVING and service_address() is not None
+
+
+def service_timeout():
+    """settings.OCR_SERVICE_TIMEOUT; None waits for ever."""
+    return getattr(settings, 'OCR_SERVICE_TIMEOUT', DEFAULT_SERVICE_TIMEOUT)
+
+
+def ping_timeout():
+    """settings.OCR_SERVICE_PING_TIMEOUT."""
+    return getattr(settings, 'OCR_SERVICE_PING_TIMEOUT', DEFAULT_PING_TIMEOUT)
+
+
+def _authkey():
+    key = getattr(settings, 'OCR_SERVICE_AUTHKEY', None) or settings.SECRET_KEY
+    return hashlib.sha256(f'ocr-service:{key}'.encode('utf-8')).digest()
+
+
+class SharedFrame:
+    """A copy of a numpy array in a new shared memory block, unlinked when the block exits."""
+
+    def __init__(self, array):
+        self.shm = shared_memory.SharedMemory(create=True, size=max(1, array.nbytes))
+        np.ndarray(array.shape, array.dtype, buffer=self.shm.buf)[...] = array
+        self.descriptor = {'name': self.shm.name, 'shape': array.shape, 'dtype': array.dtype.str}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.shm.close()
+        self.shm.unlink()
+
+
+def attach_frame(descriptor):
+    """(shm, array) viewing a SharedFrame made by another process; close shm once done with the array."""
+    shm = shared_memory.SharedMemory(name=descriptor['name'])
+    # The client owns the block; without this the worker's resource tracker would unlink it at exit
+    resource_tracker.unregister(shm._name, 'shared_memory')
+    array = np.ndarray(descriptor['shape'], np.dtype(descriptor['dtype']), buffer=shm.buf)
+    return shm, array
+
+
+def _wait(conn, timeout, address, waiting_for):
+    if timeout is not None and not conn.poll(timeout):
+        raise OCRServiceUnavailable(f"OCR service at {address} did not {waiting_for} within {timeout}s")
+
+
+def call(request, timeout=None):
+    """
+    Send one request to an OCR worker and return its reply; errors raised in the worker are re-raised
+    as ValueError. OCRServiceUnavailable if no worker takes the request, or answers it, within
+    timeout seconds each (OCR_SERVICE_TIMEOUT if None).
+    """
+    address = service_address()
+    if timeout is None:
+        timeout = service_timeout()
+    try:
+        # Connecting only queues on the listening socket; a worker speaks first once it accepts,
+        # so the handshake is done here, after waiting for that, rather than inside Client()
+        conn = connection.Client(address)
+    except OSError as e:
+        raise OCRServiceUnavailable(f"OCR service unavailable at {address}: {e}")
+    with conn:
+        try:
+            _wait(conn, timeout, address, 'take the request')
+            connection.answer_challenge(conn, _authkey())
+            connection.deliver_challenge(conn, _authkey())
+            conn.send(request)
+            _wait(conn, timeout, address, 'answer')
+            reply = conn.recv()
+        except (EOFError, ConnectionError) as e:
+            raise OCRServiceUnavailable(f"OCR worker at {address} closed the connection: {e}")
+    if 'error' in reply:
+        raise ValueError(reply['error'])
+    for stage, seconds in reply.get('stages', {}).items():
+        record_stage(stage, seconds)
+    return reply
+
+
+def remote_readtext(image, languages, **kwargs):
+    """EasyOCR detection and recognition of one image in an OCR worker."""
+    with SharedFrame(image) as frame:
+        return call({'op': 'readtext', 'frame': frame.descriptor, 'languages': languages, 'kwargs': kwargs})['result']
+
+
+def remote_readtext_batched(images, languages, batch_size):
+    """readtext_batched() in an OCR worker; images must share one shape and travel as one stacked block."""
+    with SharedFrame(np.stack(images)) as frame:
+        return call({'op': 'readtext_batched', 'frame': frame.descriptor, 'languages': languages, 'batch_size': batch_size})['result']
+
+
+def remote_loaded():
+    """Language sets loaded by the OCR worker that answers within OCR_SERVICE_PING_TIMEOUT, or None if none does."""
+    try:
+        return call({'op': 'ping'}, timeout=ping_timeout())['loaded']
+    except OCRServiceUnavailable:
+        return None
+
+
+def _handle(request):
+    from . import ocr
+
+    op = request.get('op')
+    if op == 'ping':
+        return {'loaded': ocr.get_reader_pool().loaded(), 'pid': os.getpid()}
+    if op not in ('readtext', 'readtext_batched'):
+        return {'error': f"Unknown OCR service request {op!r}."}
+    shm, array = attach_frame(request['frame'])
+    try:
+        with collect_timings() as timings:
+            if op == 'readtext':
+                result = ocr._readtext(array, request['languages'], **request.get('kwargs', {}))
+            else:
+                with timings.stage('recognition'):
+                    result = ocr.get_reader(request['languages']).readtext_batched(list(array), batch_size=request['batch_size'])
+        return {'result': result, 'stages': timings.stages}
+    finally:
+        # The result holds no views of the frame, so the mapping can go before the reply is sent
+        del array
+        shm.close()
+
+
+def _serve_forever(listener, warm_languages):
+    """Body of one OCR worker process: load the models, then answer requests one connection at a time."""
+    global SERVING
+    from . import ocr
+
+    SERVING = True
+    # The parent stops the workers; Ctrl-C reaches the whole process group
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    for languages in warm_languages:
+        ocr.warm_up_reader(languages)
+    logger.info("OCR worker %d ready", os.getpid())
+    while True:
+        try:
+            conn = listener.accept()
+        # EOFError: over TCP, a client that gave up while queued in the backlog
+        except (connection.AuthenticationError, OSError, EOFError) as e:
+            logger.warning("OCR worker %d refused a connection: %s", os.getpid(), e)
+            continue
+        with conn:
+            try:
+                request = conn.recv()
+            except EOFError:
+                continue
+            try:
+                reply = _handle(request)
+            except Exception as e:
+                logger.exception("OCR request failed")
+                reply = {'error': str(e)}
+            try:
+                conn.send(reply)
+            except OSError:
+                pass
+
+
+def _open_listener(address):
+    if isinstance(address, str) and os.path.exists(address):
+        # A socket file left by a server that did not shut down cleanly
+        try:
+            connection.Client(address, authkey=_authkey()).close()
+        except OSError:
+            os.unlink(address)
+        else:
+            raise OSError(f"An OCR service is already listening at {address}")
+    return connection.Listener(address, authkey=_authkey(), backlog=64)
+
+
+def serve(workers, warm_languages=(None,), address=None, poll_interval=1.0):
+    """
+    Run the OCR service until interrupted: `workers` processes share one listening socket and
+    the kernel hands each connection to an idle one. Workers that die are restarted.
+    """
+    address = address or service_address()
+    if address is None:
+        raise ValueError("Set OCR_SERVICE_ADDRESS (or pass an address) to run the OCR service.")
+    listener = _open_listener(address)
+    context = get_context('fork')
+
+    def start(index):
+        process = context.Process(target=_serve_forever, args=(listener, warm_languages), name=f'ocr-worker-{index}', daemon=True)
+        process.start()
+        return process
+
+    # SIGTERM (e.g. from systemd) shuts down like Ctrl-C, stopping the workers
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    processes = [start(i) for i in range(workers)]
+    try:
+        while True:
+            time.sleep(poll_interval)
+            for i, process in enumerate(processes):
+                if not process.is_alive():
+                    logger.warning("OCR worker %s exited with %s; restarting it", process.pid, process.exitcode)
+                    processes[i] = start(i)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.join()
+        listener.close()
@@ -6,149 +6,164 @@ Handles Nepali (Devanagari) and English mixed text.
 import re
 from datetime import datetime
 
+from .fields import CITIZENSHIP_FIELDS, DRIVING_LICENSE_FIELDS, normalise_date
+from .mrz import decode_td3, find_td3_lines
+
 def parse_citizenship(text):
     """
     Parse Nepali citizenship card text for required fields.
     Returns dict with full_name, dob, citizenship_number, district.
     """
-    data = {}
-    # Nepali and English keywords
-    name_patterns = [r"नाम[:\s]+([\u0900-\u097F A-Za-z.]+)", r"Name[:\s]+([A-Za-z .]+)"]
-    dob_patterns = [r"जन्म मिति[:\s]+([\d\-/०१२३४५६७८९]+)", r"Date of Birth[:\s]+([\d\-/]+)"]
-    number_patterns = [r"नागरिकता नं[:\s]+([\w\d\-/]+)", r"Citizenship No[:\s]+([A-Za-z0-9-]+)"]
-    district_patterns = [r"जिल्ला[:\s]+([\u0900-\u097F A-Za-z.]+)", r"District[:\s]+([A-Za-z .]+)"]
-
-    def search_patterns(patterns):
-        for pat in patterns:
-            m = re.search(pat, text)
-            if m:
-                return m.group(1).strip()
-        return None
-
-    data['full_name'] = search_patterns(name_patterns)
-    data['dob'] = search_patterns(dob_patterns)
-    data['citizenship_number'] = search_patterns(number_patterns)
-    data['district'] = search_patterns(district_patterns)
+    # Nepali and English keywords, see CITIZENSHIP_FIELDS
+    data = CITIZENSHIP_FIELDS.extract(text)
 
     # Basic validation
     if data['dob']:
         # Try to normalize Nepali/English numerals and date format
-        nepali_to_eng = str.maketrans('०१२३४५६७८९', '0123456789')
-        dob = data['dob'].translate(nepali_to_eng)
-        for fmt in ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d"):
-            try:
-                data['dob'] = datetime.strptime(dob, fmt).strftime("%Y-%m-%d")
-                break
-            except Exception:
-                continue
+        data['dob'] = normalise_date(data['dob']) or data['dob']
     return data
 
-def parse_passport(text):
-    import re
-    from datetime import datetime
-
-    def clean(val):
-        if val is None:
-            return None
-        return val.replace('<', ' ').replace('\n', ' ').strip() or None
+def _clean_passport_value(val):
+    if val is None:
+        return None
+    return val.replace('<', ' ').replace('\n', ' ').strip() or None
 
-    def parse_date(val):
-        if not val or not isinstance(val, str):
+def _parse_passport_date(val):
+    if not val or not isinstance(val, str):
+        return None
+    val = val.strip()
+    # YYMMDD
+    m1 = re.match(r'^(\d{2})(\d{2})(\d{2})$', val)
+    if m1:
+        yy, mm, dd = m1.groups()
+        year = int(yy)
+        if year < 30:
+            year += 2000
+        else:
+            year += 1900
+        try:
+            return datetime(year, int(mm), int(dd)).strftime('%Y-%m-%d')
+        except Exception:
             return None
-        val = val.strip()
-        # YYMMDD
-        m1 = re.match(r'^(\d{2})(\d{2})(\d{2})$', val)
-        if m1:
-            yy, mm, dd = m1.groups()
-            year = int(yy)
-            if year < 30:
-                year += 2000
-            else:
-                year += 1900
-            try:
-                return datetime(year, int(mm), int(dd)).strftime('%Y-%m-%d')
-            except Exception:
-                return None
-        # 13 OCT 2005
-        m2 = re.match(r'^(\d{1,2})\s*([A-Z]{3,})\s*(\d{2,4})$', val, re.I)
-        if m2:
-            day, mon, year = m2.groups()
+    # 13 OCT 2005
+    m2 = re.match(r'^(\d{1,2})\s*([A-Z]{3,})\s*(\d{2,4})$', val, re.I)
+    if m2:
+        day, mon, year = m2.groups()
+        try:
+            dt = datetime.strptime(f"{day} {mon} {year}", "%d %b %Y")
+            return dt.strftime('%Y-%m-%d')
+        except Exception:
             try:
-                dt = datetime.strptime(f"{day} {mon} {year}", "%d %b %Y")
+                dt = datetime.strptime(f"{day} {mon} {year}", "%d %B %Y")
                 return dt.strftime('%Y-%m-%d')
             except Exception:
-                try:
-                    dt = datetime.strptime(f"{day} {mon} {year}", "%d %B %Y")
-                    return dt.strftime('%Y-%m-%d')
-                except Exception:
-                    return None
-        return None
+                return None
+    return None
+
+def parse_mrz(text):
+    """
+    Parse the machine-readable zone of a passport out of OCR text.
+    Returns a dict of MRZ fields plus "valid" (every ICAO check digit passed),
+    or {} when no two MRZ-looking lines are present.
+    """
+    lines = find_td3_lines(text)
+    if lines is None:
+        return {}
+    mrz_data, valid = decode_td3(*lines)
+    mrz_data["valid"] = valid
+    return mrz_data
+
+# Printed only on the data page, never in the MRZ
+VISUAL_ONLY_FIELDS = ("date_of_issue", "place_of_birth", "issuing_authority")
+
+PASSPORT_LABELS = {
+    "surname": ["SURNAME"],
+    "given_names": ["GIVEN NAMES", "GIVEN NAME"],
+    "passport_number": ["PASSPORT NO", "PASSPORT NUMBER"],
+    "nationality": ["NATIONALITY"],
+    "date_of_birth": ["DATE OF BIRTH", "DOB"],
+    "date_of_issue": ["DATE OF ISSUE"],
+    "date_of_expiry": ["DATE OF EXPIRY"],
+    "place_of_birth": ["PLACE OF BIRTH"],
+    "issuing_authority": ["ISSUING AUTHORITY", "AUTHORITY"],
+    "personal_number": ["PERSONAL NO", "PERSONAL NUMBER"],
+    "sex": ["SEX"],
+    "country_code": ["COUNTRY CODE"]
+}
 
+def _build_label_trie(label_map):
+    """Prefix trie of every label; a node's None key holds the indexes of the fields whose label ends there."""
+    trie = {}
+    for index, labels in enumerate(label_map.values()):
+        for label in labels:
+            node = trie
+            for ch in label:
+                node = node.setdefault(ch, {})
+            node.setdefault(None, set()).add(index)
+    return trie
+
+_PASSPORT_FIELDS = list(PASSPORT_LABELS)
+_PASSPORT_LABEL_TRIE = _build_label_trie(PASSPORT_LABELS)
+
+def _passport_label_fields(upper_line):
+    """Fields (in PASSPORT_LABELS order) with a label that upper_line starts with; () for value lines."""
+    node = _PASSPORT_LABEL_TRIE
+    found = set()
+    for ch in upper_line:
+        node = node.get(ch)
+        if node is None:
+            break
+        found.update(node.get(None, ()))
+    return tuple(_PASSPORT_FIELDS[i] for i in sorted(found))
+
+def _passport_label_data(lines, wanted=None):
+    """
+    {field: value} from labelled passport lines: each label takes the first following line that
+    is not itself a label, and a later label for the same field wins. Only fields in wanted if given.
+    """
+    clean = _clean_passport_value
+    parse_date = _parse_passport_date
+
+    upper_lines = [line.upper() for line in lines]
+    line_fields = [_passport_label_fields(line) for line in upper_lines]
+
+    # next_values[i] is the first line after i that does not start with a label
+    next_values = [None] * len(lines)
+    for idx in range(len(lines) - 2, -1, -1):
+        next_values[idx] = next_values[idx + 1] if line_fields[idx + 1] else lines[idx + 1]
+
+    label_data = {}
+    for idx, matched in enumerate(line_fields):
+        next_val = next_values[idx]
+        if not next_val:
+            continue
+        for field in matched:
+            if wanted is not None and field not in wanted:
+                continue
+            if 'date' in field:
+                label_data[field] = parse_date(next_val)
+            elif field == 'sex':
+                label_data[field] = next_val if next_val in ['M', 'F'] else None
+            elif field == 'country_code':
+                label_data[field] = next_val if re.match(r'^[A-Z]{3}$', next_val) else None
+            elif field == 'passport_number':
+                label_data[field] = next_val if re.match(r'\b[A-Z]{1,2}\d{6,8}\b', next_val) else None
+            elif field == 'personal_number':
+                label_data[field] = next_val if next_val.isdigit() else None
+            else:
+                label_data[field] = clean(next_val)
+    return label_data
+
+def parse_passport(text):
     # Defensive line splitting
     lines = [line.strip() for line in text.splitlines() if line.strip()]
 
-    # MRZ detection
-    mrz_lines = [l for l in lines if l.count('<') > 5 and len(l) >= 20 and re.match(r'^[A-Z0-9<]{20,}$', l)]
-    mrz_data = {}
-    if len(mrz_lines) >= 2:
-        mrz1, mrz2 = mrz_lines[-2], mrz_lines[-1]
-        try:
-            mrz1 = mrz1[:44]
-            mrz2 = mrz2[:44]
-            mrz_data["country_code"] = clean(mrz1[2:5]) if re.match(r'^[A-Z]{3}$', mrz1[2:5]) else None
-            names = mrz1[5:].split('<<')
-            mrz_data["surname"] = clean(names[0]) if names else None
-            mrz_data["given_names"] = clean(names[1]) if len(names) > 1 else None
-            mrz_data["passport_number"] = clean(mrz2[0:9]) if re.match(r'\b[A-Z]{1,2}\d{6,8}\b', mrz2[0:9]) else None
-            mrz_data["nationality"] = clean(mrz2[10:13]) if mrz2[10:13].isalpha() and len(mrz2[10:13]) == 3 else None
-            mrz_data["date_of_birth"] = parse_date(mrz2[13:19])
-            mrz_data["sex"] = mrz2[20] if mrz2[20] in ['M', 'F'] else None
-            mrz_data["date_of_expiry"] = parse_date(mrz2[21:27])
-            personal_number = mrz2[28:42]
-            mrz_data["personal_number"] = personal_number if personal_number.isdigit() else None
-        except Exception:
-            pass
+    # MRZ detection; a fully validated MRZ is authoritative for every field it carries
+    mrz_data = parse_mrz(text)
+    wanted = VISUAL_ONLY_FIELDS if mrz_data.get("valid") else None
 
     # Label-based extraction (only next meaningful line)
-    label_map = {
-        "surname": ["SURNAME"],
-        "given_names": ["GIVEN NAMES", "GIVEN NAME"],
-        "passport_number": ["PASSPORT NO", "PASSPORT NUMBER"],
-        "nationality": ["NATIONALITY"],
-        "date_of_birth": ["DATE OF BIRTH", "DOB"],
-        "date_of_issue": ["DATE OF ISSUE"],
-        "date_of_expiry": ["DATE OF EXPIRY"],
-        "place_of_birth": ["PLACE OF BIRTH"],
-        "issuing_authority": ["ISSUING AUTHORITY", "AUTHORITY"],
-        "personal_number": ["PERSONAL NO", "PERSONAL NUMBER"],
-        "sex": ["SEX"],
-        "country_code": ["COUNTRY CODE"]
-    }
-    label_data = {}
-    for idx, line in enumerate(lines):
-        for field, labels in label_map.items():
-            for label in labels:
-                if line.upper().startswith(label):
-                    # Only take the next meaningful line
-                    next_val = None
-                    for j in range(idx+1, len(lines)):
-                        candidate = lines[j]
-                        if candidate and not any(candidate.upper().startswith(l) for l in sum(label_map.values(), [])):
-                            next_val = candidate
-                            break
-                    if next_val:
-                        if 'date' in field:
-                            label_data[field] = parse_date(next_val)
-                        elif field == 'sex':
-                            label_data[field] = next_val if next_val in ['M', 'F'] else None
-                        elif field == 'country_code':
-                            label_data[field] = next_val if re.match(r'^[A-Z]{3}$', next_val) else None
-                        elif field == 'passport_number':
-                            label_data[field] = next_val if re.match(r'\b[A-Z]{1,2}\d{6,8}\b', next_val) else None
-                        elif field == 'personal_number':
-                            label_data[field] = next_val if next_val.isdigit() else None
-                        else:
-                            label_data[field] = clean(next_val)
+    label_data = _passport_label_data(lines, wanted)
 
     # Defensive merge: prefer MRZ, fallback to label
     result = {
@@ -180,96 +195,48 @@ def parse_driving_license(text):
     Parse Nepali driving license text for required fields.
     Returns dict with license_number, full_name, dob, license_class, validity_date, etc.
     """
-    data = {}
-    
-    # License Number patterns
-    license_patterns = [
-        r"License No[:\s]+([A-Za-z0-9\-/]+)",
-        r"License Number[:\s]+([A-Za-z0-9\-/]+)",
-        r"लाइसेन्स नं[:\s]+([\w\d\-/]+)"
-    ]
-    
-    # Name patterns
-    name_patterns = [
-        r"Name[:\s]+([A-Za-z .]+)",
-        r"नाम[:\s]+([\u0900-\u097F A-Za-z.]+)"
-    ]
-    
-    # Date of Birth patterns
-    dob_patterns = [
-        r"Date of Birth[:\s]+([\d\-/०१२३४५६७८९]+)",
-        r"जन्म मिति[:\s]+([\d\-/०१२३४५६७८९]+)",
-        r"DOB[:\s]+([\d\-/०१२३४५६७८९]+)"
-    ]
-    
-    # License Class/Type patterns
-    class_patterns = [
-        r"Class[:\s]+([A-Za-z0-9/\-]+)",
-        r"License Class[:\s]+([A-Za-z0-9/\-]+)",
-        r"वर्ग[:\s]+([\u0900-\u097F A-Za-z0-9/\-]+)"
-    ]
-    
-    # Issued Date patterns
-    issued_patterns = [
-        r"Issued Date[:\s]+([\d\-/०१२३४५६७८९]+)",
-        r"Issued[:\s]+([\d\-/०१२३४५६७८९]+)",
-        r"जारी मिति[:\s]+([\d\-/०१२३४५६७८९]+)"
-    ]
-    
-    # Validity/Expiry Date patterns
-    validity_patterns = [
-        r"Validity[:\s]+([\d\-/०१२३४५६७८९]+)",
-        r"Valid Till[:\s]+([\d\-/०१२३४५६७८९]+)",
-        r"Expiry[:\s]+([\d\-/०१२३४५६७८९]+)",
-        r"वैधता[:\s]+([\d\-/०१२३४५६७८९]+)"
-    ]
-    
-    # Issuing Authority patterns
-    issuer_patterns = [
-        r"Issued By[:\s]+([A-Za-z\s]+)",
-        r"Issuing Authority[:\s]+([A-Za-z\s]+)"
-    ]
-    
-    # Gender patterns
-    gender_patterns = [
-        r"Gender[:\s]+(Male|Female|Other|M|F)",
-        r"लिङ्ग[:\s]+(पुरुष|महिला|अन्य)"
-    ]
-    
-    # Address patterns
-    address_patterns = [
-        r"Address[:\s]+([A-Za-z0-9\s\-,]+)",
-        r"पता[:\s]+([\u0900-\u097F A-Za-z0-9\s\-,]+)"
-    ]
-    
-    def search_patterns(patterns):
-        for pat in patterns:
-            m = re.search(pat, text, re.I)
-            if m:
-                return m.group(1).strip()
-        return None
-    
-    data['license_number'] = search_patterns(license_patterns)
-    data['full_name'] = search_patterns(name_patterns)
-    data['date_of_birth'] = search_patterns(dob_patterns)
-    data['license_class'] = search_patterns(class_patterns)
-    data['issued_date'] = search_patterns(issued_patterns)
-    data['validity_date'] = search_patterns(validity_patterns)
-    data['issuing_authority'] = search_patterns(issuer_patterns)
-    data['gender'] = search_patterns(gender_patterns)
-    data['address'] = search_patterns(address_patterns)
+    # License number, name, dates, class, issuer, gender and address; see DRIVING_LICENSE_FIELDS
+    data = DRIVING_LICENSE_FIELDS.extract(text)
     data['document_type'] = 'driving_license'
-    
+
     # Normalize dates
-    nepali_to_eng = str.maketrans('०१२३४५६७८९', '0123456789')
     for date_field in ['date_of_birth', 'issued_date', 'validity_date']:
         if data[date_field]:
-            dob = data[date_field].translate(nepali_to_eng)
-            for fmt in ("%Y-%m-%d", "%d-%m-%Y", "%d/%m/%Y", "%Y/%m/%d"):
-                try:
-                    data[date_field] = datetime.strptime(dob, fmt).strftime("%Y-%m-%d")
-                    break
-                except Exception:
-                    continue
-    
+            data[date_field] = normalise_date(data[date_field]) or data[date_field]
+
     return data
+
+# document_type accepted by the scan API -> parser for its OCR text
+DOCUMENT_PARSERS = {
+    'passport': parse_passport,
+    'citizenship': parse_citizenship,
+    'pan': parse_pan,
+    'driving_license': parse_driving_license,
+}
+
+# Fields a scan of each type is incomplete without; weak OCR where they are printed is read again
+REQUIRED_FIELDS = {
+    'passport': ('passport_number', 'surname', 'given_names', 'date_of_birth', 'date_of_expiry'),
+    'citizenship': ('full_name', 'dob', 'citizenship_number'),
+    'driving_license': ('license_number', 'full_name', 'date_of_birth', 'validity_date'),
+}
+
+# document_type -> {field: [compiled label patterns]}
+FIELD_LABELS = {
+    'passport': {
+        # As in parse_passport(), a label only counts at the start of a line
+        field: [re.compile(rf"^{re.escape(label)}", re.I) for label in labels]
+        for field, labels in PASSPORT_LABELS.items()
+    },
+    'citizenship': CITIZENSHIP_FIELDS.labels,
+    'driving_license': DRIVING_LICENSE_FIELDS.labels,
+}
+
+def parse_result(document_type, result):
+    """
+    Parse an OCRResult with the document type's parser. Returns (data, field_confidence), the
+    latter {field: OCR confidence} for the labelled fields found, so callers can flag weak values.
+    """
+    data = DOCUMENT_PARSERS[document_type](result.text)
+    labelled = FIELD_LABELS.get(document_type, {})
+    return data, result.field_confidence({field: value for field, value in data.items() if field in labelled})
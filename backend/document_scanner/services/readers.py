@@ -0,0 +1,71 @@
+"""
+services/readers.py for document_scanner app
+Pool of OCR readers keyed by language set, e.g. ('en',) or ('ne', 'en'). At most `capacity`
+readers stay loaded and the least recently used one is evicted first. They all share one text
+detector: only the recognition model depends on the language.
+"""
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+class ReaderPool:
+    """
+    Thread-safe LRU pool of readers. factory(languages, detector) builds the reader for a language
+    set; detector is detector_of(reader) of an earlier reader, or None for the first. detector_of
+    must return only what the factory shares (not the reader itself), so evicting that reader
+    still frees its recognition model. A model is loaded at most once at a time per language set,
+    without blocking lookups of other sets. An evicted reader is freed when the last scan still
+    using it finishes.
+    """
+
+    def __init__(self, factory, capacity=2, detector_of=None):
+        self.factory = factory
+        self.capacity = max(1, capacity)
+        self.detector_of = detector_of or (lambda reader: getattr(reader, 'detector', None))
+        self.detector = None
+        self._readers = OrderedDict()
+        self._loading = {}
+        self._lock = threading.Lock()
+
+    def _cached(self, languages):
+        reader = self._readers.get(languages)
+        if reader is not None:
+            self._readers.move_to_end(languages)
+        return reader
+
+    def get(self, languages):
+        """Return the reader for a language tuple, loading it (and evicting the LRU one) if needed."""
+        with self._lock:
+            reader = self._cached(languages)
+            if reader is not None:
+                return reader
+            load_lock = self._loading.setdefault(languages, threading.Lock())
+        with load_lock:
+            with self._lock:
+                reader = self._cached(languages)
+                if reader is not None:
+                    return reader
+                detector = self.detector
+            reader = self.factory(languages, detector)
+            with self._lock:
+                if self.detector is None:
+                    self.detector = self.detector_of(reader)
+                self._readers[languages] = reader
+                self._loading.pop(languages, None)
+                while len(self._readers) > self.capacity:
+                    evicted, _ = self._readers.popitem(last=False)
+                    logger.info("Evicted the OCR reader for %s to load %s", '+'.join(evicted), '+'.join(languages))
+        return reader
+
+    def loaded(self):
+        """Language sets with a loaded reader, least recently used first."""
+        with self._lock:
+            return list(self._readers)
+
+    def clear(self):
+        with self._lock:
+            self._readers.clear()
+            self.detector = None
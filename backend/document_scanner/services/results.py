@@ -0,0 +1,63 @@
+"""
+services/results.py for document_scanner app
+Stores scan results on UploadedDocument rows and keeps the CitizenshipCard parsed from a
+citizenship scan in step with it, so earlier scans are found with indexed queries.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from ..models import CitizenshipCard, UploadedDocument
+
+# CitizenshipCard field -> keys parse_citizenship() (or the basic extractor) may use for it
+CITIZENSHIP_CARD_FIELDS = {
+    'name': ('full_name', 'name'),
+    'citizenship_number': ('citizenship_number',),
+    'district': ('district',),
+    'date_of_birth': ('dob', 'date_of_birth'),
+    'address': ('address',),
+    'date_of_issue': ('date_of_issue',),
+    'gender': ('gender',),
+}
+
+
+def _fit(model, field, value):
+    """value as a string cut to the column's max_length; missing values are NULL, or '' if the column is NOT NULL."""
+    model_field = model._meta.get_field(field)
+    if not value:
+        return None if model_field.null else ''
+    return str(value)[:model_field.max_length]
+
+
+def sync_citizenship_card(document):
+    """Create or update the CitizenshipCard for a citizenship scan; drop it if no citizenship number was read."""
+    data = document.extracted_data or {}
+    if not data.get('citizenship_number'):
+        CitizenshipCard.objects.filter(uploaded_document=document).delete()
+        return None
+    values = {}
+    for field, keys in CITIZENSHIP_CARD_FIELDS.items():
+        value = next((data[key] for key in keys if data.get(key)), None)
+        values[field] = _fit(CitizenshipCard, field, value)
+    values['user'] = document.user
+    card, _ = CitizenshipCard.objects.update_or_create(uploaded_document=document, defaults=values)
+    return card
+
+
+def save_scan_result(document, text, extracted_data, field_confidence=None):
+    """Mark document done with its OCR text, parsed fields and their confidence, and save it with any derived CitizenshipCard."""
+    document.set_result(text, extracted_data, field_confidence)
+    document.finished_at = timezone.now()
+    with transaction.atomic():
+        document.save()
+        if document.document_type == 'citizenship':
+            sync_citizenship_card(document)
+    return document
+
+
+def save_scan_failure(document, error):
+    """Mark document failed with the error message."""
+    document.status = UploadedDocument.STATUS_FAILED
+    document.error = str(error)
+    document.finished_at = timezone.now()
+    document.save(update_fields=['status', 'error', 'finished_at'])
+    return document
@@ -0,0 +1,290 @@
+"""
+services/retention.py for document_scanner app
+Retention sweeps over media storage. Each file is put in a category by its path and counted
+towards that category's disk usage. It is deleted once the category's policy finds it orphaned
+(no row points at it) or expired, and older than the category's retention period.
+A sweep walks a storage root in sorted path order a batch at a time. Its position is kept in a
+MediaSweepCursor row, so the sweep_media command and idle scan workers resume where the last
+step stopped.
+"""
+import logging
+import os
+import re
+import time
+from datetime import timedelta
+from itertools import islice
+
+from django.apps import apps
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import MediaSweepCursor
+from .storage import collect_garbage
+
+logger = logging.getLogger(__name__)
+
+# Days an orphaned or expired file is kept before a sweep deletes it; None keeps the category forever
+DEFAULT_RETENTION_DAYS = {
+    'ocr_intermediates': 1,
+    'scan_json': 1,
+    'qr_codes': 7,
+    'form_uploads': 7,
+    'scan_uploads': 7,
+}
+DEFAULT_SWEEP_INTERVAL_SECONDS = 15 * 60
+DEFAULT_SWEEP_BATCH_FILES = 5000
+
+
+class Category:
+    """
+    A kind of media file, recognised by path prefix and/or file name pattern.
+    With references, [('app_label.Model', 'field'), ...], files some row points at are never
+    deleted; without any, every file in the category is an artefact that expires. Categories
+    that are not deletable are only counted.
+    """
+
+    def __init__(self, name, prefix='', pattern=None, references=(), deletable=True):
+        self.name = name
+        self.prefix = prefix
+        self.pattern = re.compile(pattern) if pattern else None
+        self.references = tuple(references)
+        self.deletable = deletable
+
+    def matches(self, relative_path):
+        if not relative_path.startswith(self.prefix):
+            return False
+        return self.pattern is None or bool(self.pattern.search(relative_path))
+
+    def referenced(self, names):
+        """The subset of names (relative to MEDIA_ROOT) that some row points at."""
+        found = set()
+        if not names:
+            return found
+        for label, field in self.references:
+            model = apps.get_model(label)
+            found.update(model._default_manager.filter(**{f'{field}__in': names}).values_list(field, flat=True))
+        return found
+
+
+# Rows that point at files under MEDIA_ROOT
+QR_CODE_REFERENCE = ('appointments.Appointment', 'qr_code')
+FORM_UPLOAD_REFERENCE = ('guided_forms.Answer', 'file')
+SCAN_UPLOAD_REFERENCE = ('document_scanner.UploadedDocument', 'file')
+
+# Files the OCR pipeline used to leave next to each upload: rendered PDF pages and preprocessed copies
+OCR_INTERMEDIATES_PATTERN = r'(_page_\d+\.png|_processed\.png)$'
+OTHER = Category('other', deletable=False)
+
+# Storage root -> its categories, first match wins
+ROOT_CATEGORIES = {
+    'media': (
+        # The content store is swept by collect_garbage() at the end of each pass
+        Category('blobs', prefix='blobs/', deletable=False),
+        # Uploads may be named like intermediates too (form_uploads/id_page_1.png), so these are
+        # checked against every reference before they expire
+        Category(
+            'ocr_intermediates',
+            pattern=OCR_INTERMEDIATES_PATTERN,
+            references=(QR_CODE_REFERENCE, FORM_UPLOAD_REFERENCE, SCAN_UPLOAD_REFERENCE),
+        ),
+        Category('qr_codes', prefix='qr_codes/', references=(QR_CODE_REFERENCE,)),
+        Category('form_uploads', prefix='form_uploads/', references=(FORM_UPLOAD_REFERENCE,)),
+        Category('scan_uploads', prefix='documents/', references=(SCAN_UPLOAD_REFERENCE,)),
+        OTHER,
+    ),
+    # BASE_DIR/documents, where scan results used to be written as JSON files
+    'scan_output': (
+        # Nothing points at this root
+        Category('ocr_intermediates', pattern=OCR_INTERMEDIATES_PATTERN),
+        Category('scan_json', pattern=r'_scan\.json$'),
+        OTHER,
+    ),
+}
+
+
+def sweep_roots():
+    """{root key: directory} of the storage roots a sweep walks."""
+    return {
+        'media': str(settings.MEDIA_ROOT),
+        'scan_output': os.path.join(settings.BASE_DIR, 'documents'),
+    }
+
+
+def retention_days(category):
+    policy = {**DEFAULT_RETENTION_DAYS, **getattr(settings, 'MEDIA_RETENTION_DAYS', {})}
+    return policy.get(category.name)
+
+
+def classify(root_key, relative_path):
+    return next(category for category in ROOT_CATEGORIES[root_key] if category.matches(relative_path))
+
+
+def iter_files(root, after=()):
+    """
+    Yield (path parts, DirEntry) for the files under root in sorted order, starting after the
+    path parts `after`. Parts are compared as tuples, so the order matches the tree walk.
+    """
+    def walk(directory, parts):
+        try:
+            with os.scandir(directory) as it:
+                entries = sorted(it, key=lambda entry: entry.name)
+        except (FileNotFoundError, NotADirectoryError):
+            return
+        for entry in entries:
+            path = parts + (entry.name,)
+            if entry.is_dir(follow_symlinks=False):
+                # Subtrees wholly before the cursor were swept already
+                if path < after[:len(path)]:
+                    continue
+                yield from walk(entry.path, path)
+            elif entry.is_file(follow_symlinks=False) and path > after:
+                yield path, entry
+
+    yield from walk(root, ())
+
+
+def _add(totals, category, size, files=1):
+    entry = totals.setdefault(category, {'files': 0, 'bytes': 0})
+    entry['files'] += files
+    entry['bytes'] += size
+
+
+def sweep_root(root_key, limit=None, dry_run=False):
+    """
+    Sweep up to limit files (all remaining if None) of one root from its cursor onwards.
+    Returns {'root', 'swept', 'usage', 'reclaimed', 'finished_pass'}; usage and reclaimed are
+    {category: {'files': n, 'bytes': n}} for this step. A dry run deletes nothing and leaves the cursor.
+    """
+    root = sweep_roots()[root_key]
+    cursor, _ = MediaSweepCursor.objects.get_or_create(root=root_key)
+    after = tuple(cursor.position.split('/')) if cursor.position else ()
+    files = iter_files(root, after)
+    batch = list(files if limit is None else islice(files, limit))
+    finished = limit is None or len(batch) < limit
+
+    now = time.time()
+    usage, reclaimed, expired = {}, {}, {}
+    for parts, entry in batch:
+        relative_path = '/'.join(parts)
+        category = classify(root_key, relative_path)
+        try:
+            stat = entry.stat(follow_symlinks=False)
+        except FileNotFoundError:
+            continue
+        days = retention_days(category)
+        if category.deletable and days is not None and stat.st_mtime < now - days * 86400:
+            expired.setdefault(category, []).append((relative_path, entry.path, stat.st_size))
+        else:
+            _add(usage, category.name, stat.st_size)
+
+    for category, candidates in expired.items():
+        # Reference names are relative to MEDIA_ROOT, the only root with referenced categories
+        kept = category.referenced([relative_path for relative_path, _, _ in candidates])
+        for relative_path, path, size in candidates:
+            if relative_path in kept:
+                _add(usage, category.name, size)
+                continue
+            if not dry_run:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    continue
+            _add(reclaimed, category.name, size)
+
+    if finished and root_key == 'media':
+        # Blobs are shared, so they are deleted by reference count rather than by age alone
+        collected = collect_garbage(dry_run=dry_run)
+        freed = collected['bytes'] + collected['orphan_bytes']
+        if freed:
+            _add(reclaimed, 'blobs', freed, files=collected['blobs'] + collected['orphans'])
+    result = {
+        'root': root_key,
+        'swept': len(batch),
+        'usage': usage,
+        'reclaimed': reclaimed,
+        'finished_pass': finished,
+    }
+    if not dry_run:
+        _advance(cursor, batch[-1][0] if batch else None, usage, reclaimed, finished)
+    return result
+
+
+def _advance(cursor, last_parts, usage, reclaimed, finished):
+    """Persist a step's position and counts; a conditional UPDATE drops them if another sweeper moved first."""
+    pass_usage = {} if not cursor.position else {key: dict(value) for key, value in cursor.pass_usage.items()}
+    for category, entry in usage.items():
+        _add(pass_usage, category, entry['bytes'], entry['files'])
+    total_reclaimed = {key: dict(value) for key, value in cursor.reclaimed.items()}
+    for category, entry in reclaimed.items():
+        _add(total_reclaimed, category, entry['bytes'], entry['files'])
+    if 'blobs' in reclaimed and 'blobs' in pass_usage:
+        # Collected blobs were counted as used earlier in the pass
+        for key in ('files', 'bytes'):
+            pass_usage['blobs'][key] = max(0, pass_usage['blobs'][key] - reclaimed['blobs'][key])
+
+    now = timezone.now()
+    values = {'reclaimed': total_reclaimed, 'updated_at': now}
+    if finished:
+        values.update(position='', pass_usage={}, last_usage=pass_usage, last_pass_finished_at=now, passes=cursor.passes + 1)
+    else:
+        values.update(position='/'.join(last_parts), pass_usage=pass_usage)
+    if not cursor.position:
+        values['pass_started_at'] = now
+    moved = MediaSweepCursor.objects.filter(pk=cursor.pk, position=cursor.position).update(**values)
+    if not moved:
+        logger.warning("Media sweep of %s raced another sweeper; this step's counts were dropped", cursor.root)
+
+
+def sweep_media(limit=None, dry_run=False):
+    """Sweep every storage root; returns the per-root results of sweep_root()."""
+    return [sweep_root(root_key, limit=limit, dry_run=dry_run) for root_key in ROOT_CATEGORIES]
+
+
+def sweep_media_if_due():
+    """
+    Run one batch of the sweep on each root not swept for MEDIA_SWEEP_INTERVAL_SECONDS.
+    Roots are claimed with a conditional UPDATE, so any number of idle workers can call this.
+    """
+    interval = getattr(settings, 'MEDIA_SWEEP_INTERVAL_SECONDS', DEFAULT_SWEEP_INTERVAL_SECONDS)
+    if not interval:
+        return []
+    limit = getattr(settings, 'MEDIA_SWEEP_BATCH_FILES', DEFAULT_SWEEP_BATCH_FILES)
+    now = timezone.now()
+    results = []
+    for root_key in ROOT_CATEGORIES:
+        cursor, _ = MediaSweepCursor.objects.get_or_create(root=root_key)
+        claimed = MediaSweepCursor.objects.filter(
+            pk=cursor.pk, updated_at__lt=now - timedelta(seconds=interval)
+        ).update(updated_at=now)
+        if claimed:
+            results.append(sweep_root(root_key, limit=limit))
+    return results
+
+
+def media_usage_report():
+    """
+    {root: {'categories': {category: {'files', 'bytes', 'reclaimed_files', 'reclaimed_bytes'}}, ...}}.
+    Usage comes from the last completed pass, or the pass in progress if none has completed.
+    """
+    report = {}
+    cursors = {cursor.root: cursor for cursor in MediaSweepCursor.objects.all()}
+    for root_key, categories in ROOT_CATEGORIES.items():
+        cursor = cursors.get(root_key) or MediaSweepCursor(root=root_key)
+        usage = cursor.last_usage if cursor.passes else cursor.pass_usage
+        names = list(dict.fromkeys(category.name for category in categories))
+        report[root_key] = {
+            'path': sweep_roots()[root_key],
+            'passes': cursor.passes,
+            'last_pass_finished_at': cursor.last_pass_finished_at,
+            'position': cursor.position,
+            'categories': {
+                name: {
+                    'files': usage.get(name, {}).get('files', 0),
+                    'bytes': usage.get(name, {}).get('bytes', 0),
+                    'reclaimed_files': cursor.reclaimed.get(name, {}).get('files', 0),
+                    'reclaimed_bytes': cursor.reclaimed.get(name, {}).get('bytes', 0),
+                }
+                for name in names
+            },
+        }
+    return report
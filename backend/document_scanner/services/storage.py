@@ -0,0 +1,337 @@
+"""
+services/storage.py for document_scanner app
+Content-addressed media storage shared by scan uploads, form uploads and appointment QR codes.
+Each distinct file is stored once as blobs/ab/cd/<sha256><ext>, however many rows point at it.
+StoredBlob rows count the references, which model signals keep current. The gc_media command
+recounts them from the database and deletes blobs that nothing points at any more.
+"""
+import hashlib
+import os
+import tempfile
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db import models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.signals import post_delete, post_init, post_save
+from django.utils import timezone
+
+BLOB_PREFIX = 'blobs/'
+# Unreferenced blobs younger than this are kept: the row that will point at a just-saved blob may not be saved yet
+DEFAULT_GC_GRACE_SECONDS = 60 * 60
+
+
+def blob_name(digest, extension=''):
+    """Storage name of the blob with this SHA-256 hex digest."""
+    return f"{BLOB_PREFIX}{digest[:2]}/{digest[2:4]}/{digest}{extension.lower()}"
+
+
+def is_blob_name(name):
+    return bool(name) and name.startswith(BLOB_PREFIX)
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    FileSystemStorage that names files after their SHA-256, so identical content is written once.
+    The directory and name from a field's upload_to are dropped; only the extension is kept.
+    delete() leaves blobs in place because other rows may share them; collect_garbage() removes them.
+    Names outside blobs/ (files stored before this backend) are read and deleted as usual.
+    """
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is the content hash, chosen in _save(); an existing file there is the same file
+        return name
+
+    def _save(self, name, content):
+        from ..models import StoredBlob
+
+        # Hash first and write only new content; reading a duplicate again is cheaper than writing it
+        digest = hashlib.sha256()
+        size = 0
+        for chunk in content.chunks():
+            digest.update(chunk)
+            size += len(chunk)
+        name = blob_name(digest.hexdigest(), os.path.splitext(name)[1])
+        if not self.exists(name):
+            self._write_blob(name, content)
+
+        now = timezone.now()
+        blob, created = StoredBlob.objects.get_or_create(
+            name=name,
+            defaults={'content_hash': digest.hexdigest(), 'size': size, 'stored_count': 1, 'last_stored_at': now},
+        )
+        if not created:
+            # Touching last_stored_at keeps the garbage collector off a blob that is about to be referenced again
+            StoredBlob.objects.filter(pk=blob.pk).update(stored_count=F('stored_count') + 1, last_stored_at=now)
+        return name
+
+    def _write_blob(self, name, content):
+        """Write content under name via a temporary file and a rename, so a blob is never seen half-written."""
+        path = self.path(name)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in content.chunks():
+                    f.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            # Concurrent saves of the same content write the same bytes, so either rename may win
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def delete(self, name):
+        if not is_blob_name(name):
+            super().delete(name)
+
+    def delete_blob(self, name):
+        super().delete(name)
+
+
+content_store = ContentAddressedStorage()
+
+
+def get_content_store():
+    """Storage for FileField(storage=...); a callable, so migrations refer to it rather than copying its settings."""
+    return content_store
+
+
+# model -> attnames of its FileFields kept in the content store, filled by track_blob_references()
+TRACKED_FIELDS = {}
+
+
+def tracked_fields():
+    """[(model, attname)] of every file field stored in the content store."""
+    return [(model, attname) for model, attnames in TRACKED_FIELDS.items() for attname in attnames]
+
+
+def _loaded_names(instance):
+    """{attname: blob name or None} for the tracked fields loaded on instance; deferred fields are left out."""
+    names = {}
+    for attname in TRACKED_FIELDS.get(type(instance), ()):
+        if attname in instance.__dict__:
+            value = instance.__dict__[attname]
+            name = getattr(value, 'name', value)
+            names[attname] = name if is_blob_name(name) else None
+    return names
+
+
+def _add_reference(name, delta):
+    from ..models import StoredBlob
+
+    if not name:
+        return
+    blobs = StoredBlob.objects.filter(name=name)
+    if delta < 0:
+        blobs = blobs.filter(ref_count__gt=0)
+    blobs.update(ref_count=F('ref_count') + delta)
+
+
+def _remember_names(sender, instance, **kwargs):
+    instance._blob_names = _loaded_names(instance)
+
+
+def _count_saved_references(sender, instance, created, update_fields=None, **kwargs):
+    previous = {} if created else getattr(instance, '_blob_names', {})
+    current = _loaded_names(instance)
+    for attname, name in current.items():
+        if update_fields is not None and attname not in update_fields:
+            continue
+        # A field whose earlier value is unknown (deferred) only gains a reference; the next recount fixes the excess
+        old = previous.get(attname)
+        if old != name:
+            _add_reference(name, 1)
+            _add_reference(old, -1)
+    instance._blob_names = current
+
+
+def _count_deleted_references(sender, instance, **kwargs):
+    for name in getattr(instance, '_blob_names', {}).values():
+        _add_reference(name, -1)
+
+
+def track_blob_references():
+    """
+    Keep StoredBlob.ref_count in step with every model FileField whose storage is the content store.
+    Called from AppConfig.ready(). QuerySet.update() bypasses the signals; collect_garbage() recounts first.
+    """
+    for model in apps.get_models():
+        attnames = [
+            field.attname for field in model._meta.concrete_fields
+            if isinstance(field, models.FileField) and isinstance(field.storage, ContentAddressedStorage)
+        ]
+        if not attnames:
+            continue
+        TRACKED_FIELDS[model] = attnames
+        post_init.connect(_remember_names, sender=model, dispatch_uid=f'blob-names-{model._meta.label}')
+        post_save.connect(_count_saved_references, sender=model, dispatch_uid=f'blob-save-{model._meta.label}')
+        post_delete.connect(_count_deleted_references, sender=model, dispatch_uid=f'blob-delete-{model._meta.label}')
+
+
+def count_references():
+    """Counter of blob name -> rows pointing at it, counted in the database across all tracked fields."""
+    counts = Counter()
+    for model, attname in tracked_fields():
+        rows = (
+            model._default_manager.filter(**{f'{attname}__startswith': BLOB_PREFIX})
+            .values_list(attname).annotate(rows=Count('pk')).order_by()
+        )
+        counts.update(dict(rows))
+    return counts
+
+
+def reconcile_references(storage=None):
+    """Reset every StoredBlob.ref_count to the database count; returns how many were wrong."""
+    from ..models import StoredBlob
+
+    storage = storage or content_store
+    counts = count_references()
+    stale = []
+    for blob in StoredBlob.objects.only('pk', 'name', 'ref_count').iterator():
+        actual = counts.pop(blob.name, 0)
+        if blob.ref_count != actual:
+            blob.ref_count = actual
+            stale.append(blob)
+    StoredBlob.objects.bulk_update(stale, ['ref_count'], batch_size=500)
+
+    # Referenced blobs without a row (e.g. copied in by hand) are recorded so they are counted and kept
+    now = timezone.now()
+    for name, refs in counts.items():
+        if storage.exists(name):
+            digest = os.path.splitext(os.path.basename(name))[0]
+            StoredBlob.objects.get_or_create(name=name, defaults={
+                'content_hash': digest, 'size': storage.size(name), 'ref_count': refs, 'last_stored_at': now,
+            })
+    return len(stale) + len(counts)
+
+
+def _gc_grace():
+    return timedelta(seconds=getattr(settings, 'MEDIA_BLOB_GC_GRACE_SECONDS', DEFAULT_GC_GRACE_SECONDS))
+
+
+def collect_garbage(grace=None, dry_run=False, storage=None):
+    """
+    Delete blobs no row points at that were last stored more than grace ago, and stray files under
+    blobs/ with no StoredBlob row (left by a save whose transaction rolled back).
+    Returns {'blobs': n, 'bytes': n, 'orphans': n, 'orphan_bytes': n, 'recounted': n}.
+    """
+    from ..models import StoredBlob
+
+    storage = storage or content_store
+    grace = _gc_grace() if grace is None else grace
+    cutoff = timezone.now() - grace
+    result = {'blobs': 0, 'bytes': 0, 'orphans': 0, 'orphan_bytes': 0, 'recounted': reconcile_references(storage)}
+
+    for blob in StoredBlob.objects.filter(ref_count=0, last_stored_at__lt=cutoff).iterator():
+        if not dry_run:
+            # Conditional delete: a save since the recount has touched last_stored_at or added a reference
+            with transaction.atomic():
+                deleted, _ = StoredBlob.objects.filter(pk=blob.pk, ref_count=0, last_stored_at__lt=cutoff).delete()
+            if not deleted:
+                continue
+            storage.delete_blob(blob.name)
+        result['blobs'] += 1
+        result['bytes'] += blob.size
+
+    root = storage.path(BLOB_PREFIX)
+    known = set(StoredBlob.objects.values_list('name', flat=True))
+    cutoff_mtime = time.time() - grace.total_seconds()
+    for directory, _, files in os.walk(root):
+        for filename in files:
+            path = os.path.join(directory, filename)
+            name = BLOB_PREFIX + os.path.relpath(path, root).replace(os.sep, '/')
+            if name in known:
+                continue
+            try:
+                stat = os.stat(path)
+                if stat.st_mtime >= cutoff_mtime:
+                    continue
+                if not dry_run:
+                    os.remove(path)
+            except FileNotFoundError:
+                continue
+            result['orphans'] += 1
+            result['orphan_bytes'] += stat.st_size
+    if not dry_run:
+        # Shard directories emptied above
+        for directory, _, _ in os.walk(root, topdown=False):
+            if directory != root and not os.listdir(directory):
+                try:
+                    os.rmdir(directory)
+                except OSError:
+                    pass
+    return result
+
+
+def adopt_legacy_files(dry_run=False, storage=None):
+    """
+    Move files stored before the content store (names outside blobs/) into it and repoint their rows.
+    Rows sharing a legacy name are repointed together. Returns {'files': n, 'bytes': n, 'missing': n}.
+    """
+    storage = storage or content_store
+    result = {'files': 0, 'bytes': 0, 'missing': 0}
+    for model, attname in tracked_fields():
+        legacy = (
+            model._default_manager.exclude(**{f'{attname}__startswith': BLOB_PREFIX})
+            .exclude(**{attname: ''}).exclude(**{f'{attname}__isnull': True})
+            .values_list(attname, flat=True).distinct()
+        )
+        for old_name in list(legacy):
+            if not storage.exists(old_name):
+                result['missing'] += 1
+                continue
+            result['files'] += 1
+            result['bytes'] += storage.size(old_name)
+            if dry_run:
+                continue
+            with storage.open(old_name, 'rb') as f:
+                new_name = storage.save(old_name, File(f))
+            model._default_manager.filter(**{attname: old_name}).update(**{attname: new_name})
+            storage.delete(old_name)
+    if not dry_run:
+        reconcile_references(storage)
+    return result
+
+
+def storage_report():
+    """
+    Space used by the content store against what one copy per reference would take.
+    logical_bytes counts every reference; saved_bytes is what deduplication spares on disk.
+    written_bytes_avoided counts saves that found their content already stored.
+    """
+    from ..models import StoredBlob
+
+    totals = StoredBlob.objects.aggregate(
+        blobs=Count('pk'),
+        stored_bytes=Sum('size'),
+        references=Sum('ref_count'),
+        logical_bytes=Sum(F('size') * F('ref_count')),
+        saves=Sum('stored_count'),
+        saved_write_bytes=Sum(F('size') * (F('stored_count') - 1), filter=Q(stored_count__gt=1)),
+        unreferenced_blobs=Count('pk', filter=Q(ref_count=0)),
+        unreferenced_bytes=Sum('size', filter=Q(ref_count=0)),
+    )
+    totals = {key: value or 0 for key, value in totals.items()}
+    referenced_bytes = totals['stored_bytes'] - totals['unreferenced_bytes']
+    saved = max(0, totals['logical_bytes'] - referenced_bytes)
+    return {
+        'blobs': totals['blobs'],
+        'references': totals['references'],
+        'stored_bytes': totals['stored_bytes'],
+        'logical_bytes': totals['logical_bytes'],
+        'saved_bytes': saved,
+        'saved_ratio': round(saved / totals['logical_bytes'], 3) if totals['logical_bytes'] else 0.0,
+        'saves': totals['saves'],
+        'written_bytes_avoided': totals['saved_write_bytes'],
+        'unreferenced_blobs': totals['unreferenced_blobs'],
+        'unreferenced_bytes': totals['unreferenced_bytes'],
+    }
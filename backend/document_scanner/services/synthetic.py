@@ -0,0 +1,214 @@
+"""
+services/synthetic.py for document_scanner app
+Synthetic OCR output with ground truth, for benchmarking the parsers: mixed Nepali/English
+labels, Devanagari digits, filler and broken lines, and passport MRZs with OCR errors.
+"""
+import random
+from datetime import date, timedelta
+
+from .mrz import check_digit
+
+PEOPLE = [
+    ("RAM BAHADUR THAPA", "राम बहादुर थापा"),
+    ("SITA KUMARI SHRESTHA", "सीता कुमारी श्रेष्ठ"),
+    ("HARI PRASAD SHARMA", "हरि प्रसाद शर्मा"),
+    ("GITA DEVI KHADKA", "गीता देवी खड्का"),
+    ("BIKASH GURUNG", "विकास गुरुङ"),
+    ("ANITA TAMANG", "अनिता तामाङ"),
+    ("KRISHNA BAHADUR KC", "कृष्ण बहादुर केसी"),
+]
+DISTRICTS = [
+    ("KATHMANDU", "काठमाडौं"),
+    ("LALITPUR", "ललितपुर"),
+    ("KASKI", "कास्की"),
+    ("CHITWAN", "चितवन"),
+    ("MORANG", "मोरङ"),
+]
+FILLER = [
+    "नेपाल सरकार", "GOVERNMENT OF NEPAL", "गृह मन्त्रालय", "Ministry of Home Affairs",
+    "हस्ताक्षर", "Signature", "Photo", "Seal", "|||", "l1I", "0O0", "..", "—",
+]
+MONTHS = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+
+DEVANAGARI_DIGITS = str.maketrans("0123456789", "०१२३४५६७८९")
+# Misreadings applied to labels and MRZ characters
+CONFUSIONS = {"O": "0", "0": "O", "I": "1", "1": "I", "S": "5", "5": "S", "B": "8", "8": "B", "m": "rn", "l": "1"}
+
+
+def _date(rng, start_year, end_year):
+    start = date(start_year, 1, 1)
+    return start + timedelta(days=rng.randrange((date(end_year, 12, 31) - start).days))
+
+
+def _digits(rng, n):
+    return "".join(rng.choice("0123456789") for _ in range(n))
+
+
+def _garble(text, rng, rate):
+    """Apply OCR character confusions to text at the given per-character rate."""
+    return "".join(CONFUSIONS[ch] if ch in CONFUSIONS and rng.random() < rate else ch for ch in text)
+
+
+class _Document:
+    """Accumulates labelled lines, each in English or Nepali, and the ground truth behind them."""
+
+    def __init__(self, rng, noise):
+        self.rng = rng
+        self.noise = noise
+        self.lines = []
+        self.truth = {}
+
+    def header(self, *lines):
+        self.lines.extend(lines)
+
+    def field(self, name, value, english, nepali=None, nepali_value=None, separate_lines=False):
+        """Print value under its English label, or under the Nepali label with Devanagari digits."""
+        rng = self.rng
+        if nepali and rng.random() < 0.5:
+            label, printed = nepali, nepali_value if nepali_value is not None else value.translate(DEVANAGARI_DIGITS)
+            self.truth[name] = printed
+        else:
+            label, printed = english, value
+            self.truth[name] = value
+        if rng.random() < self.noise / 4:
+            label = _garble(label, rng, 0.3)
+        if separate_lines or rng.random() < self.noise / 2:
+            self.lines.extend([label if separate_lines else f"{label}:", printed])
+        else:
+            self.lines.append(f"{label}{rng.choice([': ', ':', ' ', ' : '])}{printed}")
+
+    def text(self):
+        rng = self.rng
+        lines = []
+        for line in self.lines:
+            if rng.random() < self.noise:
+                lines.append(" ".join(rng.choice(FILLER) for _ in range(rng.randint(1, 3))))
+            if lines and rng.random() < self.noise / 8:
+                # Two printed lines merged into one by the OCR engine
+                lines[-1] = f"{lines[-1]} {line}"
+            else:
+                lines.append(line)
+        return "\n".join(lines)
+
+
+def _iso(value):
+    return value.strftime("%Y-%m-%d")
+
+
+def _printed(value):
+    """Passport data-page style: 12 APR 1985."""
+    return f"{value.day:02d} {MONTHS[value.month - 1]} {value.year}"
+
+
+def citizenship_document(rng, noise):
+    doc = _Document(rng, noise)
+    english, nepali = rng.choice(PEOPLE)
+    district, district_np = rng.choice(DISTRICTS)
+    doc.header("नेपाल सरकार", "नागरिकता प्रमाणपत्र", "CITIZENSHIP CERTIFICATE")
+    doc.field("citizenship_number", f"{_digits(rng, 2)}-{_digits(rng, 2)}-{_digits(rng, 2)}-{_digits(rng, 5)}", "Citizenship No", "नागरिकता नं")
+    doc.field("name", english, "Name", "नाम", nepali)
+    doc.field("date_of_birth", _iso(_date(rng, 1950, 2005)), "Date of Birth", "जन्म मिति")
+    doc.field("district", district, "District", "जिल्ला", district_np)
+    return doc.text(), doc.truth
+
+
+def _mrz_lines(surname, given_names, number, birth, sex, expiry):
+    names = f"{surname.replace(' ', '<')}<<{given_names.replace(' ', '<')}"
+    line1 = f"P<NPL{names}".ljust(44, "<")[:44]
+    number = number.ljust(9, "<")
+    dob, exp = birth.strftime("%y%m%d"), expiry.strftime("%y%m%d")
+    personal, personal_check = "<" * 14, "<"
+    body = f"{number}{check_digit(number)}NPL{dob}{check_digit(dob)}{sex}{exp}{check_digit(exp)}{personal}{personal_check}"
+    composite = check_digit(body[0:10] + body[13:20] + body[21:43])
+    return line1, body + composite
+
+
+def passport_document(rng, noise):
+    doc = _Document(rng, noise)
+    english, _ = rng.choice(PEOPLE)
+    *given, surname = english.split()
+    number = rng.choice(["PA", "P", "NP"]) + _digits(rng, 7)
+    birth = _date(rng, 1950, 2005)
+    issue = _date(rng, 2015, 2024)
+    expiry = issue + timedelta(days=365 * 10 - 1)
+    sex = rng.choice("MF")
+    place, _ = rng.choice(DISTRICTS)
+
+    doc.header("PASSPORT", "राहदानी")
+    doc.field("country_code", "NPL", "Country Code", separate_lines=True)
+    doc.field("passport_number", number, "Passport No", separate_lines=True)
+    doc.field("surname", surname, "Surname", separate_lines=True)
+    doc.field("given_names", " ".join(given), "Given Names", separate_lines=True)
+    doc.field("nationality", "NPL", "Nationality", separate_lines=True)
+    doc.field("date_of_birth", _printed(birth), "Date of Birth", separate_lines=True)
+    doc.field("sex", sex, "Sex", separate_lines=True)
+    doc.field("place_of_birth", place, "Place of Birth", separate_lines=True)
+    doc.field("date_of_issue", _printed(issue), "Date of Issue", separate_lines=True)
+    doc.field("date_of_expiry", _printed(expiry), "Date of Expiry", separate_lines=True)
+    doc.field("issuing_authority", "MOFA DEPARTMENT OF PASSPORTS", "Issuing Authority", separate_lines=True)
+    doc.truth.update(date_of_birth=_iso(birth), date_of_issue=_iso(issue), date_of_expiry=_iso(expiry))
+
+    line1, line2 = _mrz_lines(surname, " ".join(given), number, birth, sex, expiry)
+    if rng.random() < noise:
+        line2 = _garble(line2, rng, 0.05)
+    if rng.random() < noise / 4:
+        line2 = line2[:-rng.randint(1, 3)]
+    doc.lines.extend([line1, line2])
+    return doc.text(), doc.truth
+
+
+def driving_license_document(rng, noise):
+    doc = _Document(rng, noise)
+    english, nepali = rng.choice(PEOPLE)
+    district, _ = rng.choice(DISTRICTS)
+    issued = _date(rng, 2010, 2024)
+    doc.header("GOVERNMENT OF NEPAL", "सवारी चालक अनुमतिपत्र", "DRIVING LICENSE")
+    doc.field("license_number", f"{_digits(rng, 2)}-{_digits(rng, 2)}-{_digits(rng, 8)}", "License No", "लाइसेन्स नं")
+    doc.field("full_name", english, "Name", "नाम", nepali)
+    doc.field("date_of_birth", _iso(_date(rng, 1950, 2005)), "Date of Birth", "जन्म मिति")
+    doc.field("gender", rng.choice(["Male", "Female"]), "Gender")
+    doc.field("license_class", rng.choice(["A", "B", "K", "B/K"]), "Class")
+    doc.field("issued_date", _iso(issued), "Issued Date", "जारी मिति")
+    doc.field("validity_date", _iso(issued + timedelta(days=365 * 5)), "Validity", "वैधता")
+    doc.field("issuing_authority", f"DOTM {district}", "Issued By")
+    doc.field("address", f"{district}-{rng.randint(1, 32)}", "Address")
+    return doc.text(), doc.truth
+
+
+def nid_document(rng, noise):
+    doc = _Document(rng, noise)
+    english, _ = rng.choice(PEOPLE)
+    doc.header("नेपाल सरकार", "राष्ट्रिय परिचयपत्र", "NATIONAL IDENTITY CARD")
+    doc.field("nid_number", _digits(rng, 10), "NID")
+    doc.field("name", english, "Name")
+    doc.field("date_of_birth", _iso(_date(rng, 1950, 2005)), "Date of Birth")
+    return doc.text(), doc.truth
+
+
+def birth_certificate_document(rng, noise):
+    doc = _Document(rng, noise)
+    english, _ = rng.choice(PEOPLE)
+    doc.header("नेपाल सरकार", "जन्म दर्ता प्रमाणपत्र", "BIRTH CERTIFICATE")
+    doc.field("registration_number", f"{_digits(rng, 3)}-{_digits(rng, 4)}", "Registration No")
+    doc.field("name", english, "Name")
+    doc.field("date_of_birth", _iso(_date(rng, 1990, 2024)), "Date of Birth")
+    return doc.text(), doc.truth
+
+
+# document type -> generator(rng, noise) returning (OCR text, {field: expected value})
+GENERATORS = {
+    "citizenship": citizenship_document,
+    "passport": passport_document,
+    "driving_license": driving_license_document,
+    "nid": nid_document,
+    "birth_certificate": birth_certificate_document,
+}
+
+
+def generate_corpus(document_type, count, seed=0, noise=0.2):
+    """Return count (text, truth) pairs for document_type; the same seed gives the same corpus."""
+    if document_type not in GENERATORS:
+        raise ValueError(f"No synthetic generator for document type '{document_type}'.")
+    rng = random.Random(seed)
+    generator = GENERATORS[document_type]
+    return [generator(rng, noise) for _ in range(count)]
@@ -0,0 +1,163 @@
+"""
+services/timing.py for document_scanner app
+Per-stage timing of document scans. A scan collects its stage durations in a thread-local
+ScanTimings, so the OCR pipeline can record stages without having it passed in; finished
+scans are logged and aggregated into per-stage latency histograms.
+"""
+import functools
+import logging
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is unbounded
+HISTOGRAM_BUCKETS_MS = (5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000)
+
+_local = threading.local()
+
+
+class ScanTimings:
+    """
+    Accumulated seconds per stage of one scan, plus facts about the input (size, pages).
+    Pool threads working on the scan add to it too (see in_scan()), so a stage's time is
+    summed over threads and can exceed the scan's wall-clock total.
+    """
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.info = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add(name, time.perf_counter() - started)
+
+    def add(self, name, seconds):
+        with self._lock:
+            self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def annotate(self, **info):
+        with self._lock:
+            self.info.update(info)
+
+    def total(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        """Value for a Server-Timing response header."""
+        entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in self.stages.items()]
+        entries.append(f"total;dur={self.total() * 1000:.1f}")
+        return ", ".join(entries)
+
+
+@contextmanager
+def collect_timings():
+    """Make a fresh ScanTimings current for this thread while the block runs."""
+    previous = getattr(_local, "timings", None)
+    _local.timings = timings = ScanTimings()
+    try:
+        yield timings
+    finally:
+        _local.timings = previous
+
+
+def in_scan(fn):
+    """
+    Wrap fn so it records into the calling thread's current scan wherever it runs; use it when
+    handing scan work to a thread pool, whose threads would otherwise have no current scan.
+    """
+    timings = getattr(_local, "timings", None)
+    if timings is None:
+        return fn
+
+    @functools.wraps(fn)
+    def run(*args, **kwargs):
+        previous = getattr(_local, "timings", None)
+        _local.timings = timings
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.timings = previous
+    return run
+
+
+def timed(name):
+    """Time a stage of the current scan; a no-op outside collect_timings()."""
+    timings = getattr(_local, "timings", None)
+    return timings.stage(name) if timings is not None else nullcontext()
+
+
+def record_stage(name, seconds):
+    """Add a stage timed elsewhere (e.g. in an OCR worker process) to the current scan, if any."""
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        timings.add(name, seconds)
+
+
+def annotate(**info):
+    """Attach input facts (width, height, pages) to the current scan, if any."""
+    timings = getattr(_local, "timings", None)
+    if timings is not None:
+        timings.annotate(**info)
+
+
+class StageHistograms:
+    """Thread-safe per-stage latency histograms with fixed millisecond buckets."""
+
+    def __init__(self, buckets=HISTOGRAM_BUCKETS_MS):
+        self.buckets = tuple(buckets)
+        self._stages = {}
+        self._lock = threading.Lock()
+
+    def observe(self, stage, seconds):
+        ms = seconds * 1000
+        index = next((i for i, bound in enumerate(self.buckets) if ms <= bound), len(self.buckets))
+        with self._lock:
+            entry = self._stages.setdefault(stage, {"counts": [0] * (len(self.buckets) + 1), "count": 0, "sum_ms": 0.0})
+            entry["counts"][index] += 1
+            entry["count"] += 1
+            entry["sum_ms"] += ms
+
+    def snapshot(self):
+        """{stage: {"buckets": {"<=5": n, ..., "+Inf": n}, "count": n, "sum_ms": x}}, counts not cumulative."""
+        labels = [f"<={bound}" for bound in self.buckets] + ["+Inf"]
+        with self._lock:
+            return {
+                stage: {
+                    "buckets": dict(zip(labels, entry["counts"])),
+                    "count": entry["count"],
+                    "sum_ms": round(entry["sum_ms"], 1),
+                }
+                for stage, entry in self._stages.items()
+            }
+
+    def clear(self):
+        with self._lock:
+            self._stages.clear()
+
+
+scan_histograms = StageHistograms()
+
+
+def record_scan(timings, **context):
+    """Log a finished scan's stage timings and add them to the process-wide histograms."""
+    total = timings.total()
+    for stage, seconds in timings.stages.items():
+        scan_histograms.observe(stage, seconds)
+    scan_histograms.observe("total", total)
+    stages_ms = {stage: round(seconds * 1000, 1) for stage, seconds in timings.stages.items()}
+    fields = {**context, **timings.info}
+    logger.info(
+        "scan %s total=%.1fms %s",
+        " ".join(f"{key}={value}" for key, value in fields.items()),
+        total * 1000,
+        " ".join(f"{stage}={ms}ms" for stage, ms in stages_ms.items()),
+        extra={"scan": {**fields, "total_ms": round(total * 1000, 1), "stages_ms": stages_ms}},
+    )
@@ -0,0 +1,144 @@
+"""
+services/uploads.py for document_scanner app
+Inspects scan uploads chunk by chunk while they stream in: SHA-256 content hash, magic-byte
+sniffing and size/pixel limits. A bad upload is skipped on its first offending chunk, before
+it is written anywhere or reaches OCR.
+"""
+import hashlib
+import io
+
+from django.conf import settings
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+
+try:
+    from PIL import Image
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# (magic prefix, kind, extension) of the image formats OCR can decode; WebP is checked separately
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'jpeg', '.jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png', '.png'),
+    (b'II*\x00', 'tiff', '.tif'),
+    (b'MM\x00*', 'tiff', '.tif'),
+    (b'BM', 'bmp', '.bmp'),
+)
+# Image headers are looked for in this many leading bytes; JPEG EXIF blocks can push them back a way
+HEADER_BYTES = 256 * 1024
+
+
+def sniff_image(header):
+    """Return (kind, extension) for an image header, None for anything else, or '' if too short to tell."""
+    if len(header) >= 12 and header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'webp', '.webp'
+    for magic, kind, extension in IMAGE_SIGNATURES:
+        if header.startswith(magic):
+            return kind, extension
+    return '' if len(header) < 12 else None
+
+
+class UploadInspection:
+    """What was learnt about one uploaded file while it streamed in."""
+
+    def __init__(self, field_name, file_name):
+        self.field_name = field_name
+        self.file_name = file_name
+        self.size = 0
+        self.kind = None
+        self.extension = ''
+        self.width = None
+        self.height = None
+        self.error = None
+        self.status_code = None
+        # True when the file was left out of request.FILES
+        self.skipped = False
+        self._digest = hashlib.sha256()
+        self._header = b''
+
+    @property
+    def content_hash(self):
+        return self._digest.hexdigest()
+
+    @property
+    def accepted(self):
+        return self.error is None
+
+
+class ScanUploadHandler(FileUploadHandler):
+    """
+    Upload handler that inspects every file as its chunks arrive and passes them on unchanged
+    to the handlers after it, which store the file as usual. It must come first.
+    Rejected files are skipped (left out of request.FILES) with the reason on their inspection.
+    """
+
+    def __init__(self, request=None, max_bytes=None, max_pixels=None):
+        super().__init__(request)
+        self.max_bytes = max_bytes or getattr(settings, 'OCR_UPLOAD_MAX_BYTES', 20 * 1024 * 1024)
+        self.max_pixels = max_pixels or getattr(settings, 'OCR_UPLOAD_MAX_PIXELS', 40_000_000)
+        self.inspections = []
+
+    def new_file(self, field_name, file_name, content_type, content_length, charset=None, content_type_extra=None):
+        super().new_file(field_name, file_name, content_type, content_length, charset, content_type_extra)
+        self.current = UploadInspection(field_name, file_name)
+        self.inspections.append(self.current)
+        if content_length and content_length > self.max_bytes:
+            self._reject(413, f"File is larger than {self.max_bytes} bytes.")
+
+    def receive_data_chunk(self, raw_data, start):
+        inspection = self.current
+        inspection.size += len(raw_data)
+        if inspection.size > self.max_bytes:
+            self._reject(413, f"File is larger than {self.max_bytes} bytes.")
+        inspection._digest.update(raw_data)
+        if inspection.width is None and len(inspection._header) < HEADER_BYTES:
+            inspection._header += raw_data[:HEADER_BYTES - len(inspection._header)]
+            self._inspect_header(inspection)
+        return raw_data
+
+    def file_complete(self, file_size):
+        inspection = self.current
+        if inspection.kind is None:
+            # Shorter than any image header
+            inspection.error, inspection.status_code = "Unsupported file type; upload a JPEG, PNG, TIFF, BMP or WebP image.", 415
+        inspection._header = b''
+        return None
+
+    def _inspect_header(self, inspection):
+        if inspection.kind is None:
+            sniffed = sniff_image(inspection._header)
+            if sniffed is None:
+                self._reject(415, "Unsupported file type; upload a JPEG, PNG, TIFF, BMP or WebP image.")
+            if not sniffed:
+                return
+            inspection.kind, inspection.extension = sniffed
+        if not PIL_AVAILABLE:
+            return
+        try:
+            # Image.open only parses the header; it fails until enough of it has arrived
+            width, height = Image.open(io.BytesIO(inspection._header)).size
+        except Image.DecompressionBombError:
+            self._reject(413, f"Image has more than {self.max_pixels} pixels.")
+        except Exception:
+            return
+        inspection.width, inspection.height = width, height
+        inspection._header = b''
+        if width * height > self.max_pixels:
+            self._reject(413, f"Image has more than {self.max_pixels} pixels.")
+
+    def _reject(self, status_code, error):
+        self.current.error, self.current.status_code = error, status_code
+        self.current.skipped = True
+        self.current._header = b''
+        raise SkipFile(error)
+
+    def for_field(self, field_name):
+        """Inspections of the files sent under field_name, in upload order, rejected ones included."""
+        return [inspection for inspection in self.inspections if inspection.field_name == field_name]
+
+
+def install_upload_handler(request):
+    """Put a ScanUploadHandler in front of the request's upload handlers; call before touching request.FILES."""
+    handler = ScanUploadHandler(request)
+    request.upload_handlers.insert(0, handler)
+    return handler
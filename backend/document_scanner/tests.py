@@ -0,0 +1,930 @@
+import hashlib
+import io
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from multiprocessing import connection
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .services.mrz import _repair, check_digit, decode_td3
+from .models import MediaSweepCursor, StoredBlob, UploadedDocument
+from . import views
+from .services import ocr, ocr_workers
+from .services import jobs
+from .services.cache import ScanResultCache, get_scan_cache
+from .services.ocr import DocumentTypeMismatch, check_document_type
+from .services.ocr_results import OCRResult
+from .services.ocr_workers import OCRServiceUnavailable
+from .services.parsers import (
+    PASSPORT_LABELS,
+    VISUAL_ONLY_FIELDS,
+    _clean_passport_value,
+    _parse_passport_date,
+    _passport_label_data,
+    parse_mrz,
+    parse_passport,
+)
+from .services.retention import sweep_root
+from .services.storage import collect_garbage, content_store
+from .services.synthetic import generate_corpus
+from .services.timing import collect_timings, in_scan, timed
+
+
+class CheckDocumentTypeTests(SimpleTestCase):
+    def test_matching_type_passes(self):
+        self.assertIsNone(check_document_type("Government of Nepal\nCitizenship Certificate", 'citizenship'))
+
+    def test_other_keywords_do_not_overrule_declared_type(self):
+        # A licence quoting the holder's citizenship and passport numbers ties three ways
+        text = "DRIVING LICENSE\nCitizenship No: 12-34\nPassport No: PA123456"
+        self.assertIsNone(check_document_type(text, 'driving_license'))
+
+    def test_stronger_other_type_is_a_warning(self):
+        text = "Driving Licence\nLicense No: 01-02\nCitizenship No: 12-34"
+        self.assertEqual(check_document_type(text, 'citizenship'), 'driving_license')
+
+    def test_clear_mismatch_is_rejected(self):
+        with self.assertRaises(DocumentTypeMismatch) as raised:
+            check_document_type("PASSPORT\nPassport No PA123456", 'citizenship')
+        self.assertEqual(raised.exception.detected_type, 'passport')
+
+    def test_weak_evidence_is_not_rejected(self):
+        # 'nid' alone scores below MISMATCH_MIN_SCORE
+        self.assertEqual(check_document_type("NID 1234", 'citizenship'), 'nid')
+
+
+
+class ReadDocumentScreeningTests(SimpleTestCase):
+    def setUp(self):
+        self.image = np.full((40, 60), 255, dtype=np.uint8)
+        self.ocr_result = mock.Mock(return_value=OCRResult.from_text("Citizenship Certificate\nName: RAM THAPA"))
+        for patcher in (
+            mock.patch.object(ocr, '_require_ocr'),
+            mock.patch.object(ocr, 'ocr_result', self.ocr_result),
+            mock.patch.object(ocr, 'refine_weak_fields', lambda result, *args: result),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def thumbnail_reads(self, text):
+        return mock.patch.object(ocr, '_readtext', return_value=[([[0, 0]] * 4, line, 0.9) for line in text.split('\n')])
+
+    def test_clear_mismatch_is_rejected_before_full_resolution_ocr(self):
+        with self.thumbnail_reads("PASSPORT\nPassport No PA123456"), self.assertRaises(DocumentTypeMismatch) as raised:
+            ocr.read_document(self.image, 'citizenship')
+        self.assertEqual(raised.exception.detected_type, 'passport')
+        self.ocr_result.assert_not_called()
+
+    def test_matching_or_unreadable_thumbnail_goes_on_to_full_ocr(self):
+        for thumbnail_text in ("Citizenship Certificate", ""):
+            with self.thumbnail_reads(thumbnail_text):
+                self.assertEqual(ocr.read_document(self.image, 'citizenship').texts[0], "Citizenship Certificate")
+        self.assertEqual(self.ocr_result.call_count, 2)
+
+    def test_full_text_is_still_checked(self):
+        self.ocr_result.return_value = OCRResult.from_text("PASSPORT\nPassport No PA123456")
+        with self.thumbnail_reads(""), self.assertRaises(DocumentTypeMismatch):
+            ocr.read_document(self.image, 'citizenship')
+
+    def test_passport_with_valid_mrz_skips_the_thumbnail(self):
+        with mock.patch.object(ocr, '_valid_mrz_text', return_value=SPECIMEN_LINE1 + '\n' + SPECIMEN_LINE2), \
+                mock.patch.object(ocr, '_readtext', side_effect=AssertionError("read a thumbnail")):
+            self.assertEqual(ocr.read_document(self.image, 'passport').texts, [SPECIMEN_LINE1, SPECIMEN_LINE2])
+        self.ocr_result.assert_not_called()
+
+
+class ScanResultCacheTests(SimpleTestCase):
+    def test_hit_returns_text_fields_and_confidence_by_type(self):
+        cache = ScanResultCache(1024)
+        self.assertIsNone(cache.get('hash', 'v1'))
+        cache.set('hash', 'v1', 'text')
+        self.assertEqual(cache.get('hash', 'v1'), ('text', {}, {}))
+        cache.set('hash', 'v1', 'text', 'pan', {'pan_number': '1'}, {'pan_number': 0.9})
+        cache.set('hash', 'v1', 'text', 'citizenship', {'full_name': 'RAM'})
+        text, parsed, confidence = cache.get('hash', 'v1')
+        self.assertEqual(parsed, {'pan': {'pan_number': '1'}, 'citizenship': {'full_name': 'RAM'}})
+        self.assertEqual(confidence, {'pan': {'pan_number': 0.9}, 'citizenship': {}})
+        # Callers get copies, not the cached dicts
+        parsed.clear()
+        self.assertIn('pan', cache.get('hash', 'v1')[1])
+
+    def test_entries_are_keyed_by_pipeline_version(self):
+        cache = ScanResultCache(1024)
+        cache.set('hash', 'v1', 'old pipeline')
+        self.assertIsNone(cache.get('hash', 'v2'))
+        cache.set('hash', 'v2', 'new pipeline')
+        self.assertEqual(cache.get('hash', 'v1')[0], 'old pipeline')
+        self.assertEqual(cache.get('hash', 'v2')[0], 'new pipeline')
+        self.assertEqual(len(cache), 2)
+
+    def test_new_text_drops_fields_parsed_from_the_old(self):
+        cache = ScanResultCache(1024)
+        cache.set('hash', 'v1', 'old', 'pan', {'pan_number': '1'})
+        cache.set('hash', 'v1', 'new')
+        self.assertEqual(cache.get('hash', 'v1'), ('new', {}, {}))
+
+    def test_least_recently_used_entries_are_evicted_past_the_byte_budget(self):
+        cache = ScanResultCache(25)
+        cache.set('a', 'v1', 'a' * 10)
+        cache.set('b', 'v1', 'b' * 10)
+        cache.get('a', 'v1')
+        cache.set('c', 'v1', 'c' * 10)
+        self.assertIsNone(cache.get('b', 'v1'))
+        self.assertIsNotNone(cache.get('a', 'v1'))
+        self.assertIsNotNone(cache.get('c', 'v1'))
+        self.assertEqual(cache.current_bytes, 20)
+
+    def test_fields_count_towards_the_budget(self):
+        cache = ScanResultCache(40)
+        cache.set('a', 'v1', 'a' * 10)
+        cache.set('b', 'v1', 'b' * 10)
+        cache.set('a', 'v1', 'a' * 10, 'pan', {'pan_number': '1234'})
+        self.assertIsNone(cache.get('b', 'v1'))
+        self.assertEqual(cache.current_bytes, 10 + len('{"pan_number": "1234"}') + len('{}'))
+
+    def test_entry_larger_than_the_budget_is_not_stored(self):
+        cache = ScanResultCache(25)
+        cache.set('a', 'v1', 'a' * 10)
+        cache.set('big', 'v1', 'x' * 26)
+        self.assertIsNone(cache.get('big', 'v1'))
+        self.assertEqual(cache.get('a', 'v1')[0], 'a' * 10)
+        self.assertEqual(cache.current_bytes, 10)
+
+
+
+def reference_passport_labels(lines):
+    """The label scan parse_passport() used before the prefix trie, kept as the regression oracle."""
+    label_data = {}
+    for idx, line in enumerate(lines):
+        for field, labels in PASSPORT_LABELS.items():
+            for label in labels:
+                if line.upper().startswith(label):
+                    next_val = None
+                    for j in range(idx + 1, len(lines)):
+                        candidate = lines[j]
+                        if candidate and not any(candidate.upper().startswith(l) for l in sum(PASSPORT_LABELS.values(), [])):
+                            next_val = candidate
+                            break
+                    if next_val:
+                        if 'date' in field:
+                            label_data[field] = _parse_passport_date(next_val)
+                        elif field == 'sex':
+                            label_data[field] = next_val if next_val in ['M', 'F'] else None
+                        elif field == 'country_code':
+                            label_data[field] = next_val if re.match(r'^[A-Z]{3}$', next_val) else None
+                        elif field == 'passport_number':
+                            label_data[field] = next_val if re.match(r'\b[A-Z]{1,2}\d{6,8}\b', next_val) else None
+                        elif field == 'personal_number':
+                            label_data[field] = next_val if next_val.isdigit() else None
+                        else:
+                            label_data[field] = _clean_passport_value(next_val)
+    return label_data
+
+
+def _lines(text):
+    return [line.strip() for line in text.splitlines() if line.strip()]
+
+
+class PassportLabelScanTests(SimpleTestCase):
+    def assertMatchesReference(self, text):
+        lines = _lines(text)
+        self.assertEqual(_passport_label_data(lines), reference_passport_labels(lines), text)
+
+    def test_synthetic_corpus_matches_reference(self):
+        for noise in (0.0, 0.2, 0.5):
+            for text, _ in generate_corpus('passport', 300, seed=12, noise=noise):
+                self.assertMatchesReference(text)
+
+    def test_shuffled_lines_match_reference(self):
+        # Labels out of order, consecutive labels and labels with no value after them
+        rng = random.Random(12)
+        for text, _ in generate_corpus('passport', 300, seed=13, noise=0.2):
+            lines = _lines(text)
+            rng.shuffle(lines)
+            self.assertMatchesReference('\n'.join(lines))
+
+    def test_overlapping_labels_match_reference(self):
+        self.assertMatchesReference("DOB\nDATE OF BIRTH\n01 JAN 1990\nAUTHORITY\nISSUING AUTHORITY\nMOFA\nPASSPORT NO\nPA1234567\nPASSPORT NUMBER")
+        self.assertMatchesReference("\n".join(label for labels in PASSPORT_LABELS.values() for label in labels))
+
+    def test_valid_mrz_keeps_only_visual_fields_from_labels(self):
+        for text, truth in generate_corpus('passport', 200, seed=14, noise=0.0):
+            if not parse_mrz(text).get('valid'):
+                continue
+            lines = _lines(text)
+            expected = {k: v for k, v in reference_passport_labels(lines).items() if k in VISUAL_ONLY_FIELDS}
+            self.assertEqual(_passport_label_data(lines, VISUAL_ONLY_FIELDS), expected)
+            self.assertEqual(parse_passport(text)['passport_number'], truth['passport_number'])
+
+
+# The ICAO 9303 part 4 TD3 specimen
+SPECIMEN_LINE1 = "P<UTOERIKSSON<<ANNA<MARIA<<<<<<<<<<<<<<<<<<<"
+SPECIMEN_LINE2 = "L898902C36UTO7408122F1204159ZE184226B<<<<<10"
+
+
+class MRZTests(SimpleTestCase):
+    def test_check_digit(self):
+        self.assertEqual(check_digit("L898902C3"), "6")
+        self.assertEqual(check_digit("740812"), "2")
+        self.assertEqual(check_digit("ZE184226B<<<<<"), "1")
+
+    def test_specimen(self):
+        fields, valid = decode_td3(SPECIMEN_LINE1, SPECIMEN_LINE2)
+        self.assertTrue(valid)
+        self.assertEqual(fields, {
+            "country_code": "UTO",
+            "surname": "ERIKSSON",
+            "given_names": "ANNA MARIA",
+            "passport_number": "L898902C3",
+            "nationality": "UTO",
+            "date_of_birth": "1974-08-12",
+            "sex": "F",
+            "date_of_expiry": "2012-04-15",
+            "personal_number": "ZE184226B",
+        })
+
+    def test_single_misread_is_repaired(self):
+        # 0 read as O in the document number; only one swap satisfies its check digit
+        self.assertEqual(_repair("L8989O2C3", "6"), "L898902C3")
+        fields, valid = decode_td3(SPECIMEN_LINE1, SPECIMEN_LINE2.replace("L898902C3", "L8989O2C3"))
+        self.assertTrue(valid)
+        self.assertEqual(fields["passport_number"], "L898902C3")
+
+    def test_letters_in_numeric_fields_are_read_as_digits(self):
+        # 1 read as I in the birth date
+        fields, valid = decode_td3(SPECIMEN_LINE1, SPECIMEN_LINE2.replace("7408122", "7408I22"))
+        self.assertTrue(valid)
+        self.assertEqual(fields["date_of_birth"], "1974-08-12")
+
+    def test_ambiguous_repair_is_refused(self):
+        # Both 2->Z and 8->B give check digit 7, so neither reading can be trusted
+        self.assertEqual(check_digit("L89890ZC3"), "7")
+        self.assertEqual(check_digit("L89B902C3"), "7")
+        self.assertIsNone(_repair("L898902C3", "7"))
+        fields, valid = decode_td3(SPECIMEN_LINE1, SPECIMEN_LINE2.replace("L898902C36", "L898902C37"))
+        self.assertFalse(valid)
+        self.assertIsNone(fields["passport_number"])
+
+    def test_bad_composite_check_digit_is_rejected(self):
+        fields, valid = decode_td3(SPECIMEN_LINE1, SPECIMEN_LINE2[:-1] + "1")
+        self.assertFalse(valid)
+        self.assertFalse(parse_mrz(SPECIMEN_LINE1 + "\n" + SPECIMEN_LINE2[:-1] + "1").get("valid"))
+        # Each field's own check digit still passes
+        self.assertEqual(fields["passport_number"], "L898902C3")
+
+
+class PoolTimingTests(SimpleTestCase):
+    def test_pool_threads_record_into_the_submitting_scan(self):
+        def work(n):
+            with timed("work"):
+                return n
+
+        with collect_timings() as timings:
+            with ThreadPoolExecutor(max_workers=3) as pool:
+                self.assertEqual(list(pool.map(in_scan(work), range(6))), list(range(6)))
+        self.assertIn("work", timings.stages)
+
+    def test_outside_a_scan_fn_is_unchanged(self):
+        def work():
+            pass
+        self.assertIs(in_scan(work), work)
+
+    def test_batch_preprocessing_is_timed(self):
+        reader = mock.Mock()
+        reader.readtext_batched.side_effect = lambda batch, batch_size: [[] for _ in batch]
+        images = [np.full((60, 80), 255, dtype=np.uint8) for _ in range(3)]
+        with mock.patch.object(ocr, '_require_ocr'), mock.patch.object(ocr, 'use_service', return_value=False), \
+                mock.patch.object(ocr, 'get_reader', return_value=reader):
+            with collect_timings() as timings:
+                self.assertEqual(ocr.extract_text_batch(images, max_workers=3), ['', '', ''])
+        self.assertIn("preprocess", timings.stages)
+        self.assertIn("recognition", timings.stages)
+
+
+class ContentStoreTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def upload(self, content, name='scan.png'):
+        return UploadedDocument.objects.create(document_type='passport', file=ContentFile(content, name=name))
+
+    def blob(self, document):
+        return StoredBlob.objects.get(name=document.file.name)
+
+    def test_identical_content_is_stored_once(self):
+        first = self.upload(b'same bytes')
+        second = self.upload(b'same bytes', name='other.PNG')
+        self.assertTrue(first.file.name.startswith('blobs/'))
+        self.assertEqual(first.file.name, second.file.name)
+        blob = self.blob(first)
+        self.assertEqual((blob.ref_count, blob.stored_count, blob.size), (2, 2, 10))
+        with content_store.open(first.file.name) as f:
+            self.assertEqual(f.read(), b'same bytes')
+
+    def test_replacing_a_file_moves_the_reference(self):
+        document = self.upload(b'old')
+        old_name = document.file.name
+        document.file = ContentFile(b'new', name='scan.png')
+        document.save()
+        self.assertNotEqual(document.file.name, old_name)
+        self.assertEqual(StoredBlob.objects.get(name=old_name).ref_count, 0)
+        self.assertEqual(self.blob(document).ref_count, 1)
+        # Reloaded rows know their file, so the next change is counted too
+        reloaded = UploadedDocument.objects.get(pk=document.pk)
+        reloaded.file = ContentFile(b'old', name='scan.png')
+        reloaded.save()
+        self.assertEqual(StoredBlob.objects.get(name=old_name).ref_count, 1)
+        self.assertEqual(StoredBlob.objects.get(name=document.file.name).ref_count, 0)
+
+    def test_deleting_a_row_keeps_shared_blobs(self):
+        first = self.upload(b'shared')
+        second = self.upload(b'shared')
+        first.delete()
+        self.assertEqual(self.blob(second).ref_count, 1)
+        self.assertTrue(content_store.exists(second.file.name))
+        second.delete()
+        self.assertEqual(StoredBlob.objects.get(name=second.file.name).ref_count, 0)
+        # Deleting a row never deletes the blob; collect_garbage() does
+        self.assertTrue(content_store.exists(second.file.name))
+
+    def test_collect_garbage_deletes_only_unreferenced_blobs(self):
+        kept = self.upload(b'kept')
+        dropped = self.upload(b'dropped')
+        dropped_name = dropped.file.name
+        dropped.delete()
+
+        # Within the grace period nothing goes
+        self.assertEqual(collect_garbage(grace=timedelta(hours=1))['blobs'], 0)
+        self.assertTrue(content_store.exists(dropped_name))
+
+        result = collect_garbage(grace=timedelta(0))
+        self.assertEqual((result['blobs'], result['bytes']), (1, len(b'dropped')))
+        self.assertFalse(content_store.exists(dropped_name))
+        self.assertFalse(StoredBlob.objects.filter(name=dropped_name).exists())
+        self.assertFalse(os.path.exists(os.path.dirname(content_store.path(dropped_name))))
+        self.assertTrue(content_store.exists(kept.file.name))
+
+    def test_collect_garbage_recounts_references_and_removes_strays(self):
+        document = self.upload(b'counted')
+        # QuerySet.update() bypasses the signals that keep ref_count current
+        StoredBlob.objects.filter(name=document.file.name).update(ref_count=0)
+        stray = content_store.path('blobs/00/00/stray.png')
+        os.makedirs(os.path.dirname(stray))
+        with open(stray, 'wb') as f:
+            f.write(b'stray')
+        os.utime(stray, (time.time() - 60, time.time() - 60))
+
+        result = collect_garbage(grace=timedelta(seconds=1))
+        self.assertEqual((result['recounted'], result['blobs'], result['orphans']), (1, 0, 1))
+        self.assertEqual(self.blob(document).ref_count, 1)
+        self.assertTrue(content_store.exists(document.file.name))
+        self.assertFalse(os.path.exists(stray))
+
+    def test_dry_run_deletes_nothing(self):
+        document = self.upload(b'gone')
+        name = document.file.name
+        document.delete()
+        self.assertEqual(collect_garbage(grace=timedelta(0), dry_run=True)['blobs'], 1)
+        self.assertTrue(content_store.exists(name))
+        self.assertTrue(StoredBlob.objects.filter(name=name).exists())
+
+
+
+class RetentionSweepTests(TestCase):
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.base_dir, ignore_errors=True)
+        self.media_root = os.path.join(self.base_dir, 'media')
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, BASE_DIR=self.base_dir)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def make(self, name, days_old=30, root=None):
+        path = os.path.join(root or self.media_root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(b'x' * 10)
+        modified = time.time() - days_old * 86400
+        os.utime(path, (modified, modified))
+        return path
+
+    def form_answer(self, name):
+        from guided_forms.models import Answer, FormSubmission, FormTemplate, Question
+        from services.models import Service
+        from user.models import User
+
+        template = FormTemplate.objects.create(service=Service.objects.create(name='Passport', description=''), name='Apply')
+        question = Question.objects.create(form_template=template, text='ID', question_type='file')
+        submission = FormSubmission.objects.create(form_template=template, user=User.objects.create_user('ram', '9800000000'))
+        return Answer.objects.create(submission=submission, question=question, file=name)
+
+    def test_referenced_files_are_kept_whatever_their_name(self):
+        referenced = [self.make('form_uploads/id_page_1.png'), self.make('documents/scan.jpg'), self.make('documents/scan_processed.png')]
+        self.form_answer('form_uploads/id_page_1.png')
+        for name in ('documents/scan.jpg', 'documents/scan_processed.png'):
+            UploadedDocument.objects.create(document_type='citizenship', file=name)
+        orphans = [self.make('form_uploads/old.png'), self.make('documents/gone_page_2.png')]
+
+        result = sweep_root('media')
+        self.assertTrue(all(os.path.exists(path) for path in referenced))
+        self.assertFalse(any(os.path.exists(path) for path in orphans))
+        self.assertEqual(result['reclaimed'], {
+            'form_uploads': {'files': 1, 'bytes': 10},
+            'ocr_intermediates': {'files': 1, 'bytes': 10},
+        })
+        self.assertEqual(result['usage']['ocr_intermediates']['files'], 2)
+
+    def test_files_within_retention_are_kept(self):
+        recent = [self.make('documents/new_page_1.png', days_old=0), self.make('qr_codes/new.png', days_old=3)]
+        expired = self.make('documents/old_page_1.png', days_old=2)
+        sweep_root('media')
+        self.assertTrue(all(os.path.exists(path) for path in recent))
+        self.assertFalse(os.path.exists(expired))
+
+    def test_dry_run_deletes_nothing(self):
+        path = self.make('documents/gone.jpg')
+        result = sweep_root('media', dry_run=True)
+        self.assertEqual(result['reclaimed']['scan_uploads']['files'], 1)
+        self.assertTrue(os.path.exists(path))
+        self.assertEqual(MediaSweepCursor.objects.get(root='media').position, '')
+
+    def test_cursor_resumes_where_the_last_step_stopped(self):
+        for name in ('a.txt', 'documents/a.jpg', 'documents/b.jpg', 'qr_codes/a.png', 'z.txt'):
+            self.make(name, days_old=0)
+        swept = []
+        for _ in range(3):
+            result = sweep_root('media', limit=2)
+            swept.append((result['swept'], result['finished_pass']))
+            cursor = MediaSweepCursor.objects.get(root='media')
+            if not result['finished_pass']:
+                self.assertEqual(cursor.position, ['documents/a.jpg', 'qr_codes/a.png'][len(swept) - 1])
+        self.assertEqual(swept, [(2, False), (2, False), (1, True)])
+        self.assertEqual(cursor.position, '')
+        self.assertEqual(cursor.passes, 1)
+        self.assertEqual(sum(entry['files'] for entry in cursor.last_usage.values()), 5)
+
+    def test_blobs_are_left_to_the_content_store(self):
+        document = UploadedDocument.objects.create(document_type='passport', file=ContentFile(b'blob', name='scan_page_1.png'))
+        blob = content_store.path(document.file.name)
+        modified = time.time() - 30 * 86400
+        os.utime(blob, (modified, modified))
+        stray = self.make('blobs/00/00/stray_processed.png')
+        self.make('z.txt', days_old=0)
+
+        # A step that does not finish the pass never deletes under blobs/, even names like intermediates
+        result = sweep_root('media', limit=2)
+        self.assertFalse(result['finished_pass'])
+        self.assertEqual(result['usage']['blobs']['files'], 2)
+        self.assertTrue(os.path.exists(stray))
+        # The end of the pass collects unreferenced blobs only
+        result = sweep_root('media')
+        self.assertTrue(result['finished_pass'])
+        self.assertFalse(os.path.exists(stray))
+        self.assertTrue(os.path.exists(blob))
+
+    def test_scan_output_intermediates_expire(self):
+        scan_output = os.path.join(self.base_dir, 'documents')
+        expired = [self.make('a.png_processed.png', root=scan_output), self.make('a_scan.json', days_old=2, root=scan_output)]
+        kept = self.make('a.png', root=scan_output)
+        sweep_root('scan_output')
+        self.assertFalse(any(os.path.exists(path) for path in expired))
+        self.assertTrue(os.path.exists(kept))
+
+def fake_easyocr():
+    """
+    A stand-in easyocr module shaped like 1.7.2: only Reader(detector=True) sets up get_textbox,
+    get_detector and detect_network (in getDetectorPath()), and detect()/readtext() rely on them.
+    """
+    module = types.ModuleType('easyocr')
+    module.detectors_built = 0
+
+    class Reader:
+        def __init__(self, lang_list, gpu=True, download_enabled=True, detector=True, **kwargs):
+            self.lang_list = lang_list
+            if detector:
+                self.getDetectorPath('craft')
+                module.detectors_built += 1
+                self.detector = object()
+
+        def getDetectorPath(self, detect_network):
+            self.detect_network = detect_network
+            self.get_textbox = lambda detector, img, **kwargs: [[[0, img.shape[1], 0, img.shape[0]]]]
+            self.get_detector = lambda path, **kwargs: object()
+
+        def detect(self, img, **kwargs):
+            horizontal = self.get_textbox(self.detector, img)
+            return horizontal, [[]]
+
+        def recognize(self, img, horizontal_list, free_list, **kwargs):
+            x0, x1, y0, y1 = horizontal_list[0]
+            box = [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+            return [(box, '+'.join(self.lang_list), 0.9)]
+
+        def readtext(self, img, **kwargs):
+            horizontal, free = self.detect(img)
+            return self.recognize(img, horizontal[0], free[0])
+
+    module.Reader = Reader
+    return module
+
+
+class ReaderPoolTests(SimpleTestCase):
+    def setUp(self):
+        self.easyocr = fake_easyocr()
+        for patcher in (
+            mock.patch.dict(sys.modules, {'easyocr': self.easyocr}),
+            mock.patch.object(ocr, 'EASYOCR_AVAILABLE', True),
+            mock.patch.object(ocr, '_reader_pool', None),
+            mock.patch.object(ocr, 'use_service', return_value=False),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_later_language_sets_share_a_working_detector(self):
+        image = np.zeros((20, 40), dtype=np.uint8)
+        for languages in (['ne', 'en'], ['en'], ['ne', 'en']):
+            reader = ocr.get_reader(languages)
+            self.assertEqual(reader.readtext(image)[0][1], '+'.join(ocr.resolve_languages(languages)))
+            self.assertEqual(ocr._readtext(image, languages)[0][1], '+'.join(ocr.resolve_languages(languages)))
+        self.assertEqual(self.easyocr.detectors_built, 1)
+        self.assertIs(ocr.get_reader(['en']).detector, ocr.get_reader(['ne', 'en']).detector)
+
+    def test_evicted_reader_is_not_kept_for_its_detector(self):
+        pool = ocr.get_reader_pool()
+        pool.capacity = 1
+        first = ocr.get_reader(['en'])
+        ocr.get_reader(['ne', 'en'])
+        self.assertEqual(pool.loaded(), [('ne', 'en')])
+        self.assertNotIn(first, vars(pool).values())
+        self.assertIs(pool.detector['detector'], first.detector)
+
+
+class OCRServiceTimeoutTests(SimpleTestCase):
+    TIMEOUT = 0.2
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.address = os.path.join(directory, 'ocr.sock')
+        settings_override = override_settings(OCR_SERVICE_ADDRESS=self.address, OCR_SERVICE_TIMEOUT=self.TIMEOUT)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.listener = connection.Listener(self.address, authkey=ocr_workers._authkey())
+        self.addCleanup(self.listener.close)
+        self.release = threading.Event()
+        self.addCleanup(self.release.set)
+
+    def worker(self, reply):
+        """Accept one connection and send `reply` to its request, or hold it open if reply is None."""
+        def run():
+            with self.listener.accept() as conn:
+                request = conn.recv()
+                if reply is None:
+                    self.release.wait()
+                else:
+                    conn.send(reply(request))
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+
+    def assertUnavailableInTime(self, message):
+        started = time.monotonic()
+        with self.assertRaisesRegex(OCRServiceUnavailable, message):
+            ocr_workers.call({'op': 'ping'})
+        self.assertLess(time.monotonic() - started, self.TIMEOUT * 10)
+
+    def test_no_worker_taking_the_request(self):
+        # Every worker busy: the connection waits in the listen backlog, never accepted
+        self.assertUnavailableInTime('did not take the request')
+
+    def test_worker_not_answering(self):
+        self.worker(None)
+        self.assertUnavailableInTime('did not answer')
+
+    def test_readiness_ping_uses_its_own_short_timeout(self):
+        self.worker(None)
+        started = time.monotonic()
+        with override_settings(OCR_SERVICE_TIMEOUT=60, OCR_SERVICE_PING_TIMEOUT=self.TIMEOUT):
+            self.assertIsNone(ocr_workers.remote_loaded())
+        self.assertLess(time.monotonic() - started, self.TIMEOUT * 10)
+
+    def test_answer_in_time(self):
+        self.worker(lambda request: {'loaded': [], 'op': request['op']})
+        self.assertEqual(ocr_workers.call({'op': 'ping'}), {'loaded': [], 'op': 'ping'})
+
+
+def png_upload(shade, name='scan.png'):
+    buffer = io.BytesIO()
+    Image.new('L', (20, 20), shade).save(buffer, 'PNG')
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/png')
+
+
+class ScanViewTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_scan_cache().clear()
+        self.addCleanup(get_scan_cache().clear)
+        self.client = APIClient()
+
+    def scan(self, read_document, shade=1, document_type='citizenship'):
+        with mock.patch.object(views, 'read_document', read_document):
+            return self.client.post(
+                reverse('document-scan'),
+                {'file': png_upload(shade), 'document_type': document_type},
+                format='multipart',
+            )
+
+    def test_field_confidence_is_returned_and_stored_beside_the_data(self):
+        result = OCRResult(
+            [[0, 0, 100, 10], [0, 20, 100, 30]],
+            ['Citizenship No: 12-34-5678', 'Name: RAM THAPA'],
+            [0.95, 0.5],
+        )
+        response = self.scan(lambda path, document_type, languages=None: result)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertNotIn('field_confidence', body['extracted_data'])
+        self.assertEqual(body['field_confidence'], {'citizenship_number': 0.95, 'full_name': 0.5})
+        document = UploadedDocument.objects.get(job_id=body['job_id'])
+        self.assertEqual(document.field_confidence, body['field_confidence'])
+        self.assertNotIn('field_confidence', document.extracted_data)
+
+        # The same bytes again come from the cache, confidence included
+        again = self.scan(mock.Mock(side_effect=AssertionError("OCR'd a cached upload")))
+        self.assertTrue(again.json()['cached'])
+        self.assertEqual(again.json()['field_confidence'], body['field_confidence'])
+
+    def test_mismatch_on_a_cached_upload_is_422(self):
+        result = OCRResult.from_text("Citizenship Certificate\nCitizenship No: 12-34-5678\nName: RAM THAPA")
+        self.assertEqual(self.scan(lambda path, document_type, languages=None: result).status_code, 200)
+        # Same bytes and pipeline version (both read in Nepali and English), so the text comes from the cache
+        response = self.scan(mock.Mock(side_effect=AssertionError("OCR'd a cached upload")), document_type='driving_license')
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json()['detected_document_type'], 'citizenship')
+        failed = UploadedDocument.objects.get(document_type='driving_license')
+        self.assertEqual(failed.status, UploadedDocument.STATUS_FAILED)
+        self.assertEqual(failed.file.name, UploadedDocument.objects.get(document_type='citizenship').file.name)
+
+    def test_batch_checks_each_file_against_its_declared_type(self):
+        texts = [
+            "Citizenship Certificate\nCitizenship No: 12-34-5678",
+            "PASSPORT\nPassport No PA123456",
+            "Driving Licence\nLicense No: 01-02\nCitizenship No: 12-34",
+        ]
+        with mock.patch.object(views, 'extract_text_batch', return_value=texts):
+            response = self.client.post(
+                reverse('document-scan-batch'),
+                {'files': [png_upload(shade) for shade in (1, 2, 3)], 'document_types': ['citizenship'] * 3},
+                format='multipart',
+            )
+        self.assertEqual(response.status_code, 200)
+        ok, mismatch, warned = response.json()['results']
+        self.assertEqual(ok['status'], 'success')
+        self.assertNotIn('warning', ok)
+        self.assertEqual((mismatch['status'], mismatch['detected_document_type']), ('error', 'passport'))
+        self.assertNotIn('extracted_data', mismatch)
+        self.assertEqual((warned['status'], warned['detected_document_type']), ('success', 'driving_license'))
+        self.assertIn('warning', warned)
+
+    def test_unavailable_ocr_service_is_503(self):
+        response = self.scan(mock.Mock(side_effect=OCRServiceUnavailable("OCR service did not answer")))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(UploadedDocument.objects.get().status, UploadedDocument.STATUS_FAILED)
+
+
+
+class UploadInspectionTests(TestCase):
+    PDF = b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n1 0 obj\n<<>>\nendobj\n'
+
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_scan_cache().clear()
+        self.addCleanup(get_scan_cache().clear)
+        self.client = APIClient()
+        self.read_document = mock.Mock(return_value=OCRResult.from_text("Citizenship Certificate"))
+        patcher = mock.patch.object(views, 'read_document', self.read_document)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def scan(self, upload):
+        return self.client.post(reverse('document-scan'), {'file': upload, 'document_type': 'citizenship'}, format='multipart')
+
+    def assertNothingStored(self):
+        self.read_document.assert_not_called()
+        self.assertFalse(UploadedDocument.objects.exists())
+        self.assertEqual([files for _, _, files in os.walk(self.media_root) if files], [])
+
+    def test_image_is_stored_by_content_under_its_sniffed_extension(self):
+        upload = png_upload(1, name='scan.pdf')
+        content = upload.read()
+        upload.seek(0)
+        self.assertEqual(self.scan(upload).status_code, 200)
+        document = UploadedDocument.objects.get()
+        self.assertEqual(document.content_hash, hashlib.sha256(content).hexdigest())
+        self.assertTrue(document.file.name.endswith('.png'))
+
+    def test_other_file_types_are_rejected_unstored(self):
+        for content in (self.PDF, b'GIF89a' + b'\x00' * 20, b'tiny'):
+            response = self.scan(SimpleUploadedFile('scan.png', content, content_type='image/png'))
+            self.assertEqual(response.status_code, 415, content)
+            self.assertIn('Unsupported file type', response.json()['detail'])
+        self.assertNothingStored()
+
+    def test_oversized_files_are_rejected_unstored(self):
+        with override_settings(OCR_UPLOAD_MAX_BYTES=50):
+            response = self.scan(png_upload(1))
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('larger than 50 bytes', response.json()['detail'])
+        # 20x20 pixels, well within the byte limit
+        with override_settings(OCR_UPLOAD_MAX_PIXELS=399):
+            response = self.scan(png_upload(1))
+        self.assertEqual(response.status_code, 413)
+        self.assertIn('more than 399 pixels', response.json()['detail'])
+        self.assertNothingStored()
+
+    def test_batch_keeps_upload_order_around_a_rejected_file(self):
+        uploads = [png_upload(1, 'first.png'), SimpleUploadedFile('second.png', self.PDF), png_upload(3, 'third.png')]
+        expected = [uploads[0].read(), uploads[2].read()]
+        for upload in uploads:
+            upload.seek(0)
+        batch = mock.Mock(return_value=["Citizenship Certificate\nName: RAM THAPA", "Citizenship Certificate\nName: SITA RAI"])
+        with mock.patch.object(views, 'extract_text_batch', batch):
+            response = self.client.post(
+                reverse('document-scan-batch'),
+                {'files': uploads, 'document_types': ['citizenship'] * 3},
+                format='multipart',
+            )
+        self.assertEqual(response.status_code, 200)
+        # Only the accepted files reach OCR, in upload order
+        self.assertEqual(batch.call_args.args[0], expected)
+        first, second, third = response.json()['results']
+        self.assertEqual((first['index'], first['filename'], first['status']), (0, 'first.png', 'success'))
+        self.assertEqual(first['extracted_data']['full_name'], 'RAM THAPA')
+        self.assertEqual((second['index'], second['filename'], second['status']), (1, 'second.png', 'error'))
+        self.assertIn('Unsupported file type', second['detail'])
+        self.assertEqual((third['index'], third['filename'], third['status']), (2, 'third.png', 'success'))
+        self.assertEqual(third['extracted_data']['full_name'], 'SITA RAI')
+
+
+class StopServing(Exception):
+    pass
+
+
+class OCRWorkerLoopTests(SimpleTestCase):
+    def test_failed_accepts_do_not_stop_the_worker(self):
+        listener = mock.Mock()
+        listener.accept.side_effect = [
+            EOFError(),
+            ConnectionResetError(),
+            connection.AuthenticationError('digest received was wrong'),
+            StopServing(),
+        ]
+        with mock.patch.object(ocr_workers, 'SERVING', False), mock.patch.object(ocr_workers.signal, 'signal'):
+            with self.assertRaises(StopServing), self.assertLogs(ocr_workers.logger, 'WARNING') as logs:
+                ocr_workers._serve_forever(listener, warm_languages=())
+        self.assertEqual(len(logs.records), 3)
+
+
+
+class ScanJobTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        get_scan_cache().clear()
+        self.addCleanup(get_scan_cache().clear)
+
+    def queue(self, content=b'scan', document_type='passport', **fields):
+        return UploadedDocument.objects.create(
+            document_type=document_type, file=ContentFile(content, name='scan.png'), **fields
+        )
+
+    def read_document(self, **kwargs):
+        return mock.patch.object(jobs, 'read_document', **kwargs)
+
+    def test_jobs_are_claimed_oldest_first_and_only_once(self):
+        first, second = self.queue(b'one'), self.queue(b'two')
+        self.queue(b'three', status=UploadedDocument.STATUS_DONE)
+        claimed = jobs.claim_next_job()
+        self.assertEqual(claimed.pk, first.pk)
+        self.assertEqual(claimed.status, UploadedDocument.STATUS_RUNNING)
+        self.assertIsNotNone(claimed.started_at)
+        self.assertEqual(jobs.claim_next_job().pk, second.pk)
+        self.assertIsNone(jobs.claim_next_job())
+
+    def test_completed_job_records_its_result(self):
+        document = self.queue(content_hash=hashlib.sha256(b'scan').hexdigest())
+        result = OCRResult([[0, 0, 50, 10], [0, 12, 50, 22]], ['Passport No', 'PA123456'], [0.95, 0.8])
+        with self.read_document(return_value=result):
+            jobs.process_job(jobs.claim_next_job())
+        document.refresh_from_db()
+        self.assertEqual(document.status, UploadedDocument.STATUS_DONE)
+        self.assertEqual(document.extracted_text, 'Passport No\nPA123456')
+        self.assertEqual((document.extracted_data['passport_number'], document.passport_number), ('PA123456', 'PA123456'))
+        self.assertEqual(document.field_confidence, {'passport_number': 0.8})
+        self.assertIsNotNone(document.finished_at)
+
+        # A second job for the same bytes is answered from the cache
+        again = self.queue(content_hash=document.content_hash)
+        with self.read_document(side_effect=AssertionError("OCR'd a cached upload")):
+            jobs.process_job(jobs.claim_next_job())
+        again.refresh_from_db()
+        self.assertEqual((again.status, again.field_confidence), (UploadedDocument.STATUS_DONE, {'passport_number': 0.8}))
+
+    def test_failed_job_records_the_error(self):
+        document = self.queue()
+        with self.read_document(side_effect=ValueError("Failed to process image: truncated")):
+            with self.assertLogs(jobs.logger, 'ERROR'):
+                jobs.process_job(jobs.claim_next_job())
+        document.refresh_from_db()
+        self.assertEqual(document.status, UploadedDocument.STATUS_FAILED)
+        self.assertEqual(document.error, "Failed to process image: truncated")
+        self.assertIsNotNone(document.finished_at)
+        self.assertIsNone(jobs.claim_next_job())
+
+    def test_stale_running_jobs_are_requeued(self):
+        stale = self.queue(status=UploadedDocument.STATUS_RUNNING, started_at=timezone.now() - timedelta(hours=1))
+        fresh = self.queue(status=UploadedDocument.STATUS_RUNNING, started_at=timezone.now())
+        self.assertEqual(jobs.requeue_stale_jobs(timedelta(minutes=15)), 1)
+        stale.refresh_from_db()
+        fresh.refresh_from_db()
+        self.assertEqual((stale.status, stale.started_at), (UploadedDocument.STATUS_QUEUED, None))
+        self.assertEqual(fresh.status, UploadedDocument.STATUS_RUNNING)
+
+    def test_async_scan_is_queued_and_polled_to_completion(self):
+        client = APIClient()
+        response = client.post(
+            reverse('document-scan'),
+            {'file': png_upload(1), 'document_type': 'passport', 'mode': 'async'},
+            format='multipart',
+        )
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()['status_url']
+        self.assertEqual(client.get(status_url).json()['status'], UploadedDocument.STATUS_QUEUED)
+        with self.read_document(return_value=OCRResult.from_text('Passport No\nPA123456')):
+            jobs.run_worker(stop_when_idle=True)
+        polled = client.get(status_url).json()
+        self.assertEqual(polled['status'], UploadedDocument.STATUS_DONE)
+        self.assertEqual(polled['extracted_data']['passport_number'], 'PA123456')
+
+    def test_only_the_owner_or_staff_can_poll_a_users_job(self):
+        from user.models import User
+
+        owner = User.objects.create_user('ram', '9800000000')
+        other = User.objects.create_user('sita', '9800000001')
+        staff = User.objects.create_user('admin', '9800000002', is_staff=True)
+        url = reverse('document-scan-job', kwargs={'job_id': self.queue(user=owner).job_id})
+        client = APIClient()
+        self.assertEqual(client.get(url).status_code, 404)
+        for user, status_code in ((other, 404), (owner, 200), (staff, 200)):
+            client.force_authenticate(user)
+            self.assertEqual(client.get(url).status_code, status_code, user.username)
+        # Anonymous jobs are found by their unguessable id alone
+        client.force_authenticate(None)
+        self.assertEqual(client.get(reverse('document-scan-job', kwargs={'job_id': self.queue().job_id})).status_code, 200)
+
+    def test_unavailable_ocr_service_requeues_the_job(self):
+        document = self.queue()
+        with self.read_document(side_effect=OCRServiceUnavailable("OCR service did not answer")) as read_document:
+            with self.assertLogs(jobs.logger, 'WARNING'):
+                jobs.process_job(jobs.claim_next_job())
+            document.refresh_from_db()
+            self.assertEqual((document.status, document.started_at, document.error), (UploadedDocument.STATUS_QUEUED, None, ''))
+
+            # A worker told to stop when idle gives up on a job it cannot run instead of spinning on it
+            with self.assertLogs(jobs.logger, 'WARNING'):
+                jobs.run_worker(stop_when_idle=True)
+            self.assertEqual(read_document.call_count, 2)
+        self.assertEqual(UploadedDocument.objects.get().status, UploadedDocument.STATUS_QUEUED)
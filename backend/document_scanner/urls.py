@@ -1,10 +1,13 @@
 """
 urls.py for document_scanner app
-Defines API endpoint for document scanning.
+Defines API endpoints for document scanning, scan job status and scan timing metrics.
 """
 from django.urls import path
-from .views import DocumentScanView
+from .views import DocumentScanView, ScanJobView, BatchScanView, ScanMetricsView
 
 urlpatterns = [
     path('scan/', DocumentScanView.as_view(), name='document-scan'),
+    path('scan/batch/', BatchScanView.as_view(), name='document-scan-batch'),
+    path('scan/metrics/', ScanMetricsView.as_view(), name='document-scan-metrics'),
+    path('scan/<uuid:job_id>/', ScanJobView.as_view(), name='document-scan-job'),
 ]
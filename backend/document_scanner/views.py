@@ -5,84 +5,295 @@ Implements the document scanning API endpoint.
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status, permissions
-from django.core.files.storage import default_storage
 from django.conf import settings
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils import timezone
 from .models import UploadedDocument
-from .serializers import UploadedDocumentSerializer
-from .services.ocr import extract_text_from_image
-from .services.parsers import (
-    parse_citizenship,
-    parse_passport,
-    parse_pan,
-    parse_driving_license
-)
-import os
+from .serializers import UploadedDocumentSerializer, ScanJobSerializer
+from .services.cache import get_scan_cache, hash_upload
+from .services.ocr import DocumentTypeMismatch, OCRServiceUnavailable, check_document_type, extract_text_batch, is_reader_ready, pipeline_version, read_document, resolve_languages
+from .services.parsers import DOCUMENT_PARSERS, parse_result
+from .services.results import save_scan_failure, save_scan_result
+from .services.timing import collect_timings, record_scan, scan_histograms
+from .services.uploads import install_upload_handler
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def type_warning(document_type, detected_type):
+    """Response keys for a scan that reads more like another type: not clear enough to reject, but worth a second look."""
+    return {
+        'detected_document_type': detected_type,
+        'warning': f"Uploaded document reads more like {detected_type} than {document_type}.",
+    }
 
 class DocumentScanView(APIView):
     """
     API endpoint for scanning documents. Accepts file upload and document_type, runs OCR, parses fields, returns structured JSON.
+    Every scan is stored as an UploadedDocument (and a CitizenshipCard for citizenship scans); its job_id is returned.
+    With mode=async the upload is queued for a scan_worker process and 202 is returned with a job id to poll.
+    An optional `languages` (e.g. "ne,en") picks the OCR language set; by default it follows the document type.
     """
     permission_classes = []
 
     def get(self, request, *args, **kwargs):
         """
         GET endpoint for /api/documents/scan/.
-        Returns usage information or a simple message.
+        Returns usage information and whether the OCR model is loaded in this worker.
         """
         return Response({
-            'detail': 'Use POST to scan a document. Send file and document_type.'
+            'detail': 'Use POST to scan a document. Send file and document_type (and languages, or mode=async to queue it).',
+            'ocr_ready': is_reader_ready()
         }, status=status.HTTP_200_OK)
 
     def post(self, request, *args, **kwargs):
-        file = request.FILES.get('file')
+        with collect_timings() as timings:
+            response = self._scan(request, timings)
+        response['Server-Timing'] = timings.server_timing()
+        record_scan(timings, document_type=request.data.get('document_type'), status=response.status_code)
+        return response
+
+    def _scan(self, request, timings):
+        # Uploads are hashed, sniffed and size-checked as they stream in; bad ones are never stored
+        upload_handler = install_upload_handler(request)
+        with timings.stage('upload_receive'):
+            file = request.FILES.get('file')
+        inspection = next(iter(upload_handler.for_field('file')), None)
+        if inspection is not None and not inspection.accepted:
+            return Response({'detail': inspection.error}, status=inspection.status_code)
         document_type = request.data.get('document_type')
         if not file or not document_type:
             return Response({'detail': 'File and document_type are required.'}, status=status.HTTP_400_BAD_REQUEST)
 
-        # Save file temporarily
-        file_path = default_storage.save(f"documents/{file.name}", file)
-        abs_path = os.path.join(settings.MEDIA_ROOT, file_path)
+        parser = DOCUMENT_PARSERS.get(document_type)
+        if parser is None:
+            return Response({'detail': 'Invalid document_type.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            languages = resolve_languages(request.data.get('languages'), document_type)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Identical uploads (same bytes, same pipeline) reuse the earlier OCR result
+        content_hash = inspection.content_hash if inspection else hash_upload(file)
+        if inspection:
+            timings.annotate(upload_bytes=inspection.size)
+            # Stored under its hash with the sniffed extension, never the client's file name
+            file.name = f"upload{inspection.extension}"
+        scan_cache = get_scan_cache()
+        version = pipeline_version(document_type, languages)
+        cached = scan_cache.get(content_hash, version)
+
+        if request.data.get('mode') == 'async':
+            return self._enqueue(request, file, document_type, languages, content_hash, cached)
+
+        document = UploadedDocument(
+            user=request.user if request.user.is_authenticated else None,
+            content_hash=content_hash,
+            document_type=document_type,
+            ocr_languages=','.join(languages),
+            status=UploadedDocument.STATUS_RUNNING,
+            started_at=timezone.now(),
+        )
+        if cached is not None:
+            text, parsed, confidence = cached
+            extracted_data = parsed.get(document_type)
+            field_confidence = confidence.get(document_type, {})
+            # The same bytes were stored by the scan that filled the cache
+            document.file.name = (
+                UploadedDocument.objects.filter(content_hash=content_hash)
+                .exclude(file='')
+                .values_list('file', flat=True)
+                .first()
+            )
+        if not document.file:
+            with timings.stage('upload_save'):
+                document.file = file
+                document.save()
+        else:
+            # Saved now so a failed type check below is recorded on the row
+            document.save()
 
         try:
-            # Use Google Vision OCR
-            text = extract_text_from_image(abs_path)
+            if cached is None:
+                result = read_document(document.file.path, document_type, languages)
+                text = result.text
+                extracted_data = None
+            # Cached text may come from a scan declared as another type
+            detected_type = check_document_type(text, document_type)
+        except DocumentTypeMismatch as e:
+            save_scan_failure(document, e)
+            return Response({
+                'detail': str(e),
+                'document_type': document_type,
+                'detected_document_type': e.detected_type
+            }, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+        except OCRServiceUnavailable as e:
+            # Nothing wrong with the upload: the client may retry, or use mode=async to queue it
+            save_scan_failure(document, e)
+            return Response({'detail': str(e)}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
         except Exception as e:
+            save_scan_failure(document, e)
             return Response({'detail': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
 
-        # Log OCR text and document_type for debugging
-        print("OCR TEXT:\n", text)
-        print("DOCUMENT TYPE:", document_type)
+        logger.debug("OCR text for %s scan:\n%s", document_type, text)
 
         # Call parser based on document_type
-        extracted_data = {}
-        if document_type == 'passport':
-            extracted_data = parse_passport(text)
-            print("PARSED DATA:", extracted_data)
-        elif document_type == 'citizenship':
-            extracted_data = parse_citizenship(text)
-            print("PARSED DATA:", extracted_data)
-        elif document_type == 'pan':
-            extracted_data = parse_pan(text)
-            print("PARSED DATA:", extracted_data)
-        elif document_type == 'driving_license':
-            extracted_data = parse_driving_license(text)
-        else:
-            return Response({'detail': 'Invalid document_type.'}, status=status.HTTP_400_BAD_REQUEST)
+        if extracted_data is None:
+            with timings.stage('parse'):
+                # Fresh OCR carries per-field confidence; cached text of another scan only has its text
+                if cached is not None:
+                    extracted_data, field_confidence = parser(text), {}
+                else:
+                    extracted_data, field_confidence = parse_result(document_type, result)
+            scan_cache.set(content_hash, version, text, document_type, extracted_data, field_confidence)
+        logger.debug("Parsed %s data: %s", document_type, extracted_data)
+
+        with timings.stage('persist'):
+            save_scan_result(document, text, extracted_data, field_confidence)
 
         # Always return document_type and extracted_data
         response = {
             'status': 'success',
+            'job_id': document.job_id,
             'document_type': document_type,
-            'extracted_data': extracted_data or {}
+            'languages': list(languages),
+            'extracted_data': extracted_data or {},
+            'field_confidence': field_confidence,
+            'cached': cached is not None
         }
+        if detected_type:
+            response.update(type_warning(document_type, detected_type))
+        return Response(response, status=status.HTTP_200_OK)
+
+    def _enqueue(self, request, file, document_type, languages, content_hash, cached):
+        """Store the upload as a queued UploadedDocument and return 202 with its job id."""
+        document = UploadedDocument(
+            user=request.user if request.user.is_authenticated else None,
+            file=file,
+            content_hash=content_hash,
+            document_type=document_type,
+            ocr_languages=','.join(languages),
+        )
+        if cached is not None and document_type in cached[1]:
+            # Nothing left for a worker to do
+            text, parsed, confidence = cached
+            save_scan_result(document, text, parsed[document_type], confidence.get(document_type))
+        else:
+            document.save()
+        return Response({
+            'job_id': document.job_id,
+            'status': document.status,
+            'status_url': reverse('document-scan-job', kwargs={'job_id': document.job_id}),
+        }, status=status.HTTP_202_ACCEPTED)
 
-        # Save scan result to a .json file
-        import json
-        json_filename = os.path.splitext(os.path.basename(file.name))[0] + "_scan.json"
-        documents_dir = os.path.join(settings.BASE_DIR, "documents")
-        os.makedirs(documents_dir, exist_ok=True)
-        json_path = os.path.join(documents_dir, json_filename)
-        with open(json_path, "w", encoding="utf-8") as jf:
-            json.dump(response, jf, ensure_ascii=False, indent=2)
 
-        return Response(response, status=status.HTTP_200_OK)
+class ScanJobView(APIView):
+    """
+    API endpoint for polling an asynchronous scan job. Returns status and, once done, OCR text and parsed fields.
+    """
+    permission_classes = []
+
+    def get(self, request, job_id, *args, **kwargs):
+        document = get_object_or_404(UploadedDocument, job_id=job_id)
+        if document.user_id is not None and document.user_id != request.user.pk and not request.user.is_staff:
+            return Response({'detail': 'Not found.'}, status=status.HTTP_404_NOT_FOUND)
+        return Response(ScanJobSerializer(document).data, status=status.HTTP_200_OK)
+
+
+class BatchScanView(APIView):
+    """
+    API endpoint for scanning a citizen's whole document set in one request.
+    Accepts parallel lists `files` and `document_types`; all images go through one batched OCR pass.
+    Returns one result per file, in upload order, with per-file errors instead of failing the batch.
+    Each file's text is checked against its declared type like a single scan: an error if it clearly
+    reads as another type, a warning if it only reads more like one.
+    An optional `languages` applies to every file; otherwise each is read in its document type's languages.
+    """
+    permission_classes = []
+
+    def post(self, request, *args, **kwargs):
+        upload_handler = install_upload_handler(request)
+        received = iter(request.FILES.getlist('files'))
+        # Rejected uploads are left out of request.FILES; keep their place so results stay in upload order
+        inspections = upload_handler.for_field('files')
+        files = [None if inspection.skipped else next(received) for inspection in inspections]
+        document_types = request.data.getlist('document_types')
+        if not files or len(files) != len(document_types):
+            return Response({'detail': 'files and document_types are required and must have the same length.'}, status=status.HTTP_400_BAD_REQUEST)
+        max_files = getattr(settings, 'OCR_BATCH_MAX_FILES', 10)
+        if len(files) > max_files:
+            return Response({'detail': f'At most {max_files} files can be scanned in one batch.'}, status=status.HTTP_400_BAD_REQUEST)
+
+        requested_languages = request.data.get('languages')
+        try:
+            resolve_languages(requested_languages)
+        except ValueError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        scan_cache = get_scan_cache()
+        results = []
+        scans = {}  # index -> (content_hash, document_type, version, text, parsed fields by type)
+        to_ocr = {}  # language set -> indexes of uncached files read in it
+        for index, (file, document_type) in enumerate(zip(files, document_types)):
+            inspection = inspections[index]
+            results.append({'index': index, 'filename': inspection.file_name, 'document_type': document_type})
+            if not inspection.accepted:
+                results[index].update({'status': 'error', 'detail': inspection.error})
+                continue
+            if document_type not in DOCUMENT_PARSERS:
+                results[index].update({'status': 'error', 'detail': 'Invalid document_type.'})
+                continue
+            content_hash = inspection.content_hash
+            languages = resolve_languages(requested_languages, document_type)
+            # Batch text is always full-page OCR, never the passport MRZ strip
+            version = pipeline_version(None, languages)
+            cached = scan_cache.get(content_hash, version)
+            results[index].update({'languages': list(languages), 'cached': cached is not None})
+            if cached is not None:
+                scans[index] = (content_hash, document_type, version) + cached[:2]
+            else:
+                scans[index] = (content_hash, document_type, version, None, {})
+                to_ocr.setdefault(languages, []).append(index)
+
+        # Decoding, preprocessing and recognition happen in one batched pass per language set
+        for languages, indexes in to_ocr.items():
+            texts = extract_text_batch([files[index].read() for index in indexes], languages=languages)
+            for index, text in zip(indexes, texts):
+                if isinstance(text, Exception):
+                    results[index].update({'status': 'error', 'detail': f'Failed to process image: {text}'})
+                    del scans[index]
+                else:
+                    content_hash, document_type, version, _, parsed = scans[index]
+                    scans[index] = (content_hash, document_type, version, text, parsed)
+
+        for index, (content_hash, document_type, version, text, parsed) in scans.items():
+            try:
+                detected_type = check_document_type(text, document_type)
+            except DocumentTypeMismatch as e:
+                # The text is still worth keeping for a retry with the right type
+                if not results[index]['cached']:
+                    scan_cache.set(content_hash, version, text)
+                results[index].update({'status': 'error', 'detail': str(e), 'detected_document_type': e.detected_type})
+                continue
+            extracted_data = parsed.get(document_type)
+            if extracted_data is None:
+                extracted_data = DOCUMENT_PARSERS[document_type](text)
+                scan_cache.set(content_hash, version, text, document_type, extracted_data)
+            results[index].update({'status': 'success', 'extracted_data': extracted_data or {}})
+            if detected_type:
+                results[index].update(type_warning(document_type, detected_type))
+
+        return Response({'status': 'success', 'results': results}, status=status.HTTP_200_OK)
+
+
+class ScanMetricsView(APIView):
+    """
+    API endpoint for staff: per-stage scan latency histograms (upload_save, decode, preprocess,
+    detection, recognition, parse, persist, total) aggregated since this worker process started.
+    """
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request, *args, **kwargs):
+        return Response({'stages': scan_histograms.snapshot()}, status=status.HTTP_200_OK)
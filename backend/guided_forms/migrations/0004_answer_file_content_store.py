@@ -0,0 +1,19 @@
+# Generated by Django 6.0.2 on 2026-10-18 10:05
+
+import document_scanner.services.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('guided_forms', '0003_alter_formsubmission_id'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='answer',
+            name='file',
+            field=models.FileField(blank=True, null=True, storage=document_scanner.services.storage.get_content_store, upload_to='form_uploads/'),
+        ),
+    ]
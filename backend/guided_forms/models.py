@@ -1,6 +1,7 @@
 from django.db import models
 from services.models import Service
 from user.models import User
+from document_scanner.services.storage import get_content_store
 
 class FormTemplate(models.Model):
 	service = models.ForeignKey(Service, on_delete=models.CASCADE, related_name='form_templates')
@@ -37,7 +38,7 @@ class Answer(models.Model):
 	submission = models.ForeignKey(FormSubmission, on_delete=models.CASCADE, related_name='answers')
 	question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name='answers')
 	value = models.TextField(blank=True, null=True)
-	file = models.FileField(upload_to='form_uploads/', blank=True, null=True)
+	file = models.FileField(upload_to='form_uploads/', storage=get_content_store, blank=True, null=True)
 
 	def __str__(self):
 		return f"Answer to '{self.question.text}' in submission {self.submission.id}"
@@ -161,3 +161,68 @@ SIMPLE_JWT = {
 
 # CORS settings
 CORS_ALLOW_ALL_ORIGINS = True
+
+# Document scanner
+# Load the EasyOCR model in a background thread when the app starts. Leave off
+# for manage.py commands and workers that never scan; use `warm_ocr` to preload.
+OCR_WARM_ON_STARTUP = False
+
+# Byte budget for the in-process cache of OCR text/parsed fields keyed by upload hash
+OCR_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# OCR models (one per language set, e.g. English or Nepali+English) kept loaded per process,
+# least recently used evicted first; each takes a few hundred MB
+OCR_READER_POOL_SIZE = 2
+
+# Run OCR in the processes started by `manage.py ocr_server` instead of in every web worker:
+# a Unix socket path (or "host:port") they listen on. Requests are authenticated with a key
+# derived from OCR_SERVICE_AUTHKEY, or SECRET_KEY if that is unset.
+OCR_SERVICE_ADDRESS = None
+# Model-holding processes `ocr_server` starts; each loads up to OCR_READER_POOL_SIZE models
+OCR_SERVICE_WORKERS = 2
+# Seconds a web process waits for a worker to take a request, and again for its answer, before
+# failing the scan with 503; None waits for ever
+OCR_SERVICE_TIMEOUT = 60
+# The same for the readiness ping of GET /api/documents/scan/, which reports busy workers as not ready
+OCR_SERVICE_PING_TIMEOUT = 1
+
+# Detections of a required field read with less confidence than this are cropped and read
+# again at higher resolution, at most OCR_REOCR_MAX_REGIONS per page; 0 turns this off
+OCR_REOCR_CONFIDENCE = 0.6
+OCR_REOCR_MAX_REGIONS = 8
+
+# Maximum number of files accepted by the batch scan endpoint
+OCR_BATCH_MAX_FILES = 10
+
+# Scan uploads above either limit are rejected while streaming in, before being stored
+OCR_UPLOAD_MAX_BYTES = 20 * 1024 * 1024
+OCR_UPLOAD_MAX_PIXELS = 40_000_000
+
+# Scan uploads, form uploads and QR codes are stored once per distinct content under
+# MEDIA_ROOT/blobs/. `gc_media` deletes blobs nothing has pointed at for this long.
+MEDIA_BLOB_GC_GRACE_SECONDS = 60 * 60
+
+# Retention sweeps (`sweep_media`, and idle scan workers every MEDIA_SWEEP_INTERVAL_SECONDS,
+# MEDIA_SWEEP_BATCH_FILES files at a time) delete orphaned or expired media artefacts older
+# than this many days per category; None keeps a category forever
+MEDIA_RETENTION_DAYS = {
+    'ocr_intermediates': 1,
+    'scan_json': 1,
+    'qr_codes': 7,
+    'form_uploads': 7,
+    'scan_uploads': 7,
+}
+MEDIA_SWEEP_INTERVAL_SECONDS = 15 * 60
+MEDIA_SWEEP_BATCH_FILES = 5000
+
+# Scan stage timings and other document scanner logs go to the console at INFO
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler'},
+    },
+    'loggers': {
+        'document_scanner': {'handlers': ['console'], 'level': 'INFO'},
+    },
+}